@@ -1,3 +1,7 @@
+import time
+
+
 def classFactory(iface):
+    start = time.perf_counter()
     from .plugin_coordinate_picker import CoordinatePickZoomGUI
-    return CoordinatePickZoomGUI(iface)
+    return CoordinatePickZoomGUI(iface, importSeconds=time.perf_counter() - start)
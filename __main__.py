@@ -0,0 +1,5 @@
+import sys
+
+from .coord_cli import main
+
+sys.exit(main())
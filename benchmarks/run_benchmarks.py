@@ -0,0 +1,511 @@
+""" benchmarks and accuracy checks of the transformer, parser, formatter, pick history and pick path
+
+    python benchmarks/run_benchmarks.py                     compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline   record the current timings as the baseline
+    python benchmarks/run_benchmarks.py --output results.json --threshold 0.75
+
+Every timing is divided by the median time of a fixed pure python calibration loop run several times before and
+after it, so a baseline recorded on one machine stays meaningful on another and a short burst of load on either
+side does not move the ratio. The sqlite and numpy benchmarks follow the machine less closely than the loop, an
+unchanged tree swings by up to about 40% on a shared machine, so the default threshold is 50%. Raise --threshold
+on throttled machines rather than recording a new baseline. A benchmark regresses when its normalized time
+exceeds the baseline by more than the threshold. The accuracy checks compare against
+benchmarks/reference_points.json.
+
+The QGIS benchmarks run on an offscreen QgsApplication and are skipped when qgis can not be imported. The exit
+status is 1 when a benchmark regressed or an accuracy check failed.
+"""
+import argparse
+import gc
+import importlib
+import importlib.util
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+REFERENCE_PATH = os.path.join(BENCHMARK_DIR, 'reference_points.json')
+PACKAGE = 'coordinate_picker'
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_REPEAT = 5
+CALIBRATION_RUNS = 5
+
+METERS_PER_DEGREE = 111320.0
+HISTORY_RECORDS = 200000
+
+
+def loadPackage():
+    """ import the plugin folder as a package whatever the folder is called """
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(PLUGIN_DIR, '__init__.py'),
+                                                      submodule_search_locations=[PLUGIN_DIR])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = package
+        spec.loader.exec_module(package)
+
+
+def module(name):
+    loadPackage()
+    return importlib.import_module('{}.{}'.format(PACKAGE, name))
+
+
+def _calibrationLoop():
+    total = 0.0
+    values = []
+    for i in range(20000):
+        total += math.sin(i * 0.001) * 1.5
+        values.append((i, total))
+    return len(values)
+
+
+def calibrate(runs=CALIBRATION_RUNS):
+    """ seconds of every run of a fixed mix of float math and small object work
+
+    Runs before and after every benchmark, so the normalized timings follow the speed the machine has around it.
+    """
+    _calibrationLoop()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        _calibrationLoop()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def timeIt(function, ops, repeat):
+    """ best seconds per operation over repeat runs, after one warm up run, with the garbage collector off """
+    function()
+    best = float('inf')
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if collecting:
+            gc.enable()
+    return best / ops
+
+
+def randomChinaPoints(count, seed=1):
+    random = np.random.default_rng(seed)
+    return random.uniform(73.0, 135.0, count), random.uniform(18.0, 53.0, count)
+
+
+def transformerBenchmarks():
+    ct = module('coord_transformer')
+    lons, lats = randomChinaPoints(20000)
+    points = list(zip(lons.tolist(), lats.tolist()))
+    gcjPoints = [ct.wgs2gcj(lon, lat) for lon, lat in points]
+    bdPoints = [ct.wgs2bd(lon, lat) for lon, lat in points]
+    niPoints = [ct.lonlat_to_nipoint(lon, lat) for lon, lat in points]
+
+    arrayLons, arrayLats = randomChinaPoints(200000, seed=2)
+    gcjLons, gcjLats = ct.wgs2gcj_array(arrayLons, arrayLats)
+    count = len(points)
+    arrayCount = len(arrayLons)
+
+    return [
+        ('transformer.wgs2gcj', count, lambda: [ct.Transform.wgs2gcj(lon, lat) for lon, lat in points]),
+        ('transformer.gcj2wgs', count, lambda: [ct.Transform.gcj2wgs(lon, lat) for lon, lat in gcjPoints]),
+        ('transformer.wgs2bd', count, lambda: [ct.Transform.wgs2bd(lon, lat) for lon, lat in points]),
+        ('transformer.bd2wgs', count, lambda: [ct.Transform.bd2wgs(lon, lat) for lon, lat in bdPoints]),
+        ('transformer.lonlat2nipoint', count, lambda: [ct.Transform.lonlat2nipoint(lon, lat) for lon, lat in points]),
+        ('transformer.nipoint2lonlat', count, lambda: [ct.Transform.nipoint2lonlat(x, y) for x, y in niPoints]),
+        ('transformer.lonlat2ndstile', count,
+         lambda: [ct.Transform.lonlat2ndstile(lon, lat, 13) for lon, lat in points]),
+        ('transformer.wgs2gcj_array', arrayCount, lambda: ct.wgs2gcj_array(arrayLons, arrayLats)),
+        ('transformer.gcj2wgs_array', arrayCount, lambda: ct.gcj2wgs_array(gcjLons, gcjLats)),
+        ('transformer.gcj2wgs_solve_newton', arrayCount,
+         lambda: ct.gcj2wgs_solve(gcjLons, gcjLats, method='newton')),
+        ('transformer.lonlat2nipoint_array', arrayCount, lambda: ct.lonlat_to_nipoint_array(arrayLons, arrayLats)),
+        ('transformer.ndstile_array', arrayCount, lambda: ct.nds_tile_id_array(arrayLons, arrayLats, 13)),
+        ('transformer.convert_array_bd09_to_ni', arrayCount,
+         lambda: ct.convert_array(arrayLons, arrayLats, ct.BD09, ct.NI_ITE)),
+    ]
+
+
+def gridBenchmarks(gridDirectory):
+    ct = module('coord_transformer')
+    grid = module('gcj_grid').GcjOffsetGrid(gridDirectory)
+    grid.load()
+    lons, lats = randomChinaPoints(200000, seed=3)
+    gcjLons, gcjLats = ct.wgs2gcj_array(lons, lats)
+    return [
+        ('grid.wgs2gcj', len(lons), lambda: grid.wgs2gcj(lons, lats)),
+        ('grid.gcj2wgs', len(lons), lambda: grid.gcj2wgs(gcjLons, gcjLats)),
+    ]
+
+
+def historyBenchmarks(directory):
+    """ pick history lookups on HISTORY_RECORDS stored points """
+    history = module('pick_history').PickHistory(os.path.join(directory, 'pick_history.sqlite'))
+    lons, lats = randomChinaPoints(HISTORY_RECORDS, seed=7)
+    for start in range(0, HISTORY_RECORDS, 50000):
+        history.addMany('zoom', lons[start:start + 50000].tolist(), lats[start:start + 50000].tolist())
+    history.flush()
+    queries = 100
+    return [
+        ('history.nearest', queries,
+         lambda: [history.nearest(116.39, 39.9, 0.01, 10) for _ in range(queries)]),
+        ('history.inExtent_city', queries,
+         lambda: [history.inExtent(116.2, 39.7, 116.6, 40.1, 20) for _ in range(queries)]),
+        ('history.inExtent_province', queries,
+         lambda: [history.inExtent(113.5, 36.0, 119.8, 42.6, 20) for _ in range(queries)]),
+        ('history.inExtent_country', queries,
+         lambda: [history.inExtent(73.0, 18.0, 135.0, 53.0, 20) for _ in range(queries)]),
+        ('history.recent', queries, lambda: [history.recent(20) for _ in range(queries)]),
+    ]
+
+
+def parserBenchmarks():
+    parser = module('coord_parser')
+    lons, lats = randomChinaPoints(20000, seed=4)
+    plain = '\n'.join('{}, {}'.format(lon, lat) for lon, lat in zip(lons.tolist(), lats.tolist()))
+    wkt = '\n'.join('POINT({} {})'.format(lon, lat) for lon, lat in zip(lons.tolist(), lats.tolist()))
+    dms = '\n'.join('{}°{}\'{}"N {}°{}\'{}"E'.format(int(lat), int(lat * 60) % 60, round(lat * 3600 % 60, 2),
+                                                     int(lon), int(lon * 60) % 60, round(lon * 3600 % 60, 2))
+                    for lon, lat in zip(lons[:5000].tolist(), lats[:5000].tolist()))
+    single = '(116.391305, 39.907333)'
+    return [
+        ('parser.parseCoordinate', 2000, lambda: [parser.parseCoordinate(single) for _ in range(2000)]),
+        ('parser.parseCoordinates_plain', len(lons), lambda: parser.parseCoordinates(plain)),
+        ('parser.parseCoordinates_wkt', len(lons), lambda: parser.parseCoordinates(wkt)),
+        ('parser.parseCoordinates_dms', 5000, lambda: parser.parseCoordinates(dms)),
+    ]
+
+
+def formatterBenchmarks():
+    formatter = module('coord_formatter')
+    Coordinate = formatter.CoordFormater
+    lons, lats = randomChinaPoints(20000, seed=5)
+    kinds = [Coordinate.MapCoord, Coordinate.WGS84Coord, Coordinate.NI_ITE, Coordinate.RasterPixelCord]
+    coordinates = [Coordinate(kinds[i % len(kinds)], lon, lat, 'layer')
+                   for i, (lon, lat) in enumerate(zip(lons.tolist(), lats.tolist()))]
+
+    # a pick session with distinct layer, map and WGS84 values, so no column is formatted from another
+    buffer = module('pick_buffer').PickBuffer()
+    bufferLons, bufferLats = randomChinaPoints(100000, seed=8)
+    for i, (lon, lat) in enumerate(zip(bufferLons.tolist(), bufferLats.tolist())):
+        buffer.append({
+            Coordinate.WGS84Coord: (lon, lat),
+            Coordinate.MapCoord: (lon * 111319.49, lat * 111319.49),
+            Coordinate.LayerCoord: (lon + 0.5, lat - 0.25),
+            Coordinate.NI_ITE: (int(lon * 100000), int(lat * 100000)),
+            Coordinate.RasterPixelCord: (i % 4096, i // 4096),
+        }, 'layer {}'.format(i % 3))
+    return [
+        ('formatter.coordinate_str', len(coordinates), lambda: [c.coordinate_str() for c in coordinates]),
+        ('formatter.repr', len(coordinates), lambda: [repr(c) for c in coordinates]),
+        ('formatter.formatCoordinates', len(coordinates), lambda: formatter.formatCoordinates(coordinates)),
+        ('formatter.pickBuffer_delimited', len(buffer), lambda: buffer.toDelimited()),
+        ('formatter.pickBuffer_geojson', len(buffer), lambda: buffer.toGeoJSON()),
+    ]
+
+
+def wkbBenchmarks():
+    import struct
+    wkbCoords = module('wkb_coords')
+    lines = [struct.pack('<BII', 1, 2, 20) + np.random.default_rng(i).uniform(100, 120, 40).tobytes()
+             for i in range(5000)]
+
+    def roundTrip():
+        coords = wkbCoords.WkbCoordinates(lines)
+        x, y = coords.xy()
+        coords.setXY(x, y)
+        return coords.geometries()
+
+    return [('wkb.round_trip_vertices', 5000 * 20, roundTrip)]
+
+
+class _StubMessageBar:
+    def pushMessage(self, *args, **kwargs):
+        pass
+
+
+class _StubStatusBar:
+    def addPermanentWidget(self, *args):
+        pass
+
+    def removeWidget(self, *args):
+        pass
+
+
+class _StubIface:
+    """ the parts of QgisInterface the pick and zoom tools touch """
+
+    def __init__(self, canvas, layer):
+        self._canvas = canvas
+        self._layer = layer
+        self._messageBar = _StubMessageBar()
+        self._statusBar = _StubStatusBar()
+
+    def mapCanvas(self):
+        return self._canvas
+
+    def activeLayer(self):
+        return self._layer
+
+    def messageBar(self):
+        return self._messageBar
+
+    def statusBarIface(self):
+        return self._statusBar
+
+    def mainWindow(self):
+        return None
+
+
+def qgisBenchmarks():
+    """ pick, zoom and shifted layer benchmarks on an offscreen QgsApplication, None when QGIS is not installed """
+    try:
+        from qgis.core import QgsApplication
+    except ImportError:
+        return None
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.PyQt.QtCore import QPoint
+    from qgis.core import (QgsCoordinateReferenceSystem, QgsFeature, QgsFeatureRequest, QgsGeometry, QgsPointXY,
+                           QgsProject, QgsRectangle, QgsVectorLayer)
+    from qgis.gui import QgsMapCanvas
+
+    application = QgsApplication.instance()
+    if application is None:
+        application = QgsApplication([], True)
+        application.initQgis()
+
+    canvas = QgsMapCanvas()
+    canvas.resize(800, 600)
+    canvas.setDestinationCrs(QgsCoordinateReferenceSystem('EPSG:3857'))
+    canvas.setExtent(QgsRectangle(12950000, 4820000, 12980000, 4850000))
+    layer = QgsVectorLayer('Point?crs=EPSG:4326', 'points', 'memory')
+    iface = _StubIface(canvas, layer)
+
+    picker = module('coord_picker').CoordinatePicker(iface)
+    CoordinateZoom = module('coordinate_zoom').CoordinateZoom
+    screenPoints = [QPoint(4 * i % 800, 3 * i % 600) for i in range(200)]
+    lons, lats = randomChinaPoints(20000, seed=6)
+    clipboard = '\n'.join('{}, {}'.format(lon, lat) for lon, lat in zip(lons.tolist(), lats.tolist()))
+
+    def pick():
+        # clear the memoized pick points, every pick computes from scratch
+        picker._pickPoints.clear()
+        for screenPoint in screenPoints:
+            picker.updateCoordinates(screenPoint)
+            [c.coordinate_str() for c in picker.coordinates if c.isAvailable()]
+
+    def pickCached():
+        for screenPoint in screenPoints:
+            picker.updateCoordinates(screenPoint)
+            [c.coordinate_str() for c in picker.coordinates if c.isAvailable()]
+
+    # 40 layers in 8 utm zones
+    layers = [QgsVectorLayer('Point?crs=EPSG:{}'.format(32645 + i % 8), 'layer {}'.format(i), 'memory')
+              for i in range(40)]
+
+    def pickAllLayers():
+        picker._pickPoints.clear()
+        for screenPoint in screenPoints:
+            [c.coordinate_str() for c in picker.computeLayerCoordinates(screenPoint, layers)]
+
+    # 5000 polygons of 20 vertices around Beijing, read like a render of a quarter of them does
+    source = QgsVectorLayer('Polygon?crs=EPSG:4326', 'polygons', 'memory')
+    rng = np.random.default_rng(7)
+    angles = np.linspace(0, 2 * np.pi, 20)
+    polygons = []
+    for lon, lat in zip(rng.uniform(116.0, 117.0, 5000).tolist(), rng.uniform(39.5, 40.5, 5000).tolist()):
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPolygonXY([[QgsPointXY(lon + 0.005 * np.cos(a), lat + 0.005 * np.sin(a))
+                                                        for a in angles.tolist()]]))
+        polygons.append(feature)
+    source.dataProvider().addFeatures(polygons)
+    source.updateExtents()
+    QgsProject.instance().addMapLayer(source, False)
+    shifted = module('shifted_layer').createShiftedLayer(source, 'GCJ02')
+    renderRequest = QgsFeatureRequest(QgsRectangle(116.0, 39.5, 116.5, 40.0))
+    rendered = sum(1 for _ in source.getFeatures(renderRequest))
+
+    def readShiftedCold():
+        shifted.dataProvider().cache.clear()
+        return list(shifted.getFeatures(renderRequest))
+
+    return [
+        ('qgis.shiftedLayer_source', rendered, lambda: list(source.getFeatures(renderRequest))),
+        ('qgis.shiftedLayer_cold', rendered, readShiftedCold),
+        ('qgis.shiftedLayer_cached', rendered, lambda: list(shifted.getFeatures(renderRequest))),
+        ('qgis.updateCoordinates', len(screenPoints), pick),
+        ('qgis.updateCoordinates_cached', len(screenPoints), pickCached),
+        ('qgis.computeLayerCoordinates_40_layers', len(screenPoints), pickAllLayers),
+        ('qgis.parseCoordinateStr', 1000,
+         lambda: [CoordinateZoom.parseCoordinateStr('116.391305, 39.907333') for _ in range(1000)]),
+        ('qgis.parseCoordinateText', len(lons), lambda: CoordinateZoom.parseCoordinateText(clipboard)),
+    ]
+
+
+def accuracyChecks(gridDirectory):
+    """ (name, passed, detail) of every check against the reference points """
+    ct = module('coord_transformer')
+    parser = module('coord_parser')
+    with open(REFERENCE_PATH) as f:
+        points = json.load(f)['points']
+    wgs = np.array([p['wgs84'] for p in points])
+    gcj = np.array([p['gcj02'] for p in points])
+    bd = np.array([p['bd09'] for p in points])
+    ni = np.array([p['ni_ite'] for p in points])
+    niMars = np.array([p['ni_ite_mars'] for p in points])
+
+    def maxError(actual, expected):
+        return float(np.max(np.abs(np.asarray(actual, dtype=np.float64) - expected)))
+
+    checks = []
+
+    def check(name, error, limit, unit='deg'):
+        checks.append((name, error <= limit, '{:.3g} {} (limit {:.3g})'.format(error, unit, limit)))
+
+    check('scalar wgs2gcj', maxError([ct.wgs2gcj(*p) for p in wgs], gcj), 1e-9)
+    check('scalar wgs2bd', maxError([ct.wgs2bd(*p) for p in wgs], bd), 1e-9)
+    check('scalar gcj2wgs', maxError([ct.gcj2wgs(*p) for p in gcj], wgs), 1e-6)
+    check('scalar bd2wgs', maxError([ct.bd2wgs(*p) for p in bd], wgs), 2e-6)
+    check('scalar lonlat2nipoint', maxError([ct.lonlat_to_nipoint(*p) for p in wgs], ni), 0, 'ni')
+    check('scalar nipoint2lonlat', maxError([ct.nipoint_to_lonlat(*p) for p in ni], wgs), 1e-5)
+    check('array wgs2gcj', maxError(np.column_stack(ct.wgs2gcj_array(wgs[:, 0], wgs[:, 1])), gcj), 1e-9)
+    check('array gcj2wgs', maxError(np.column_stack(ct.gcj2wgs_array(gcj[:, 0], gcj[:, 1])), wgs), 1e-6)
+    check('array gcj2wgs newton',
+          maxError(np.column_stack(ct.gcj2wgs_solve(gcj[:, 0], gcj[:, 1], method='newton')[:2]), wgs), 1e-6)
+    check('array bd2wgs', maxError(np.column_stack(ct.bd2wgs_array(bd[:, 0], bd[:, 1])), wgs), 2e-6)
+    check('array lonlat2nipoint', maxError(np.column_stack(ct.lonlat_to_nipoint_array(wgs[:, 0], wgs[:, 1])), ni),
+          0, 'ni')
+    check('convert_array wgs84 to ni_ite_mars',
+          maxError(np.column_stack(ct.convert_array(wgs[:, 0], wgs[:, 1], ct.WGS84, ct.NI_ITE_MARS)), niMars), 0, 'ni')
+
+    grid = module('gcj_grid').GcjOffsetGrid(gridDirectory)
+    check('grid wgs2gcj', maxError(np.column_stack(grid.wgs2gcj(wgs[:, 0], wgs[:, 1])), gcj) * METERS_PER_DEGREE,
+          0.15, 'm')
+    check('grid gcj2wgs', maxError(np.column_stack(grid.gcj2wgs(gcj[:, 0], gcj[:, 1])), wgs) * METERS_PER_DEGREE,
+          0.15, 'm')
+
+    expected = [[116.391305, 39.907333]]
+    check('parser plain', maxError(parser.parseCoordinates('(116.391305, 39.907333)').coords, expected), 0)
+    check('parser wkt', maxError(parser.parseCoordinates('POINT(116.391305 39.907333)').coords, expected), 0)
+    check('parser dms', maxError(parser.parseCoordinates('39°54\'26.3988"N 116°23\'28.698"E').coords, expected),
+          1e-9)
+    return checks
+
+
+def isSelected(prefix, selected):
+    """ whether any benchmark named prefix... can match one of the selected name prefixes """
+    return not selected or any(prefix.startswith(name) or name.startswith(prefix) for name in selected)
+
+
+def runBenchmarks(repeat, selected=None):
+    calibrations = []
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='gcj_grid_') as gridDirectory:
+        factories = [
+            ('transformer.', transformerBenchmarks),
+            ('grid.', lambda: gridBenchmarks(gridDirectory)),
+            ('parser.', parserBenchmarks),
+            ('formatter.', formatterBenchmarks),
+            ('wkb.', wkbBenchmarks),
+            ('history.', lambda: historyBenchmarks(gridDirectory)),
+        ]
+        groups = [factory() for prefix, factory in factories if isSelected(prefix, selected)]
+        if isSelected('qgis.', selected):
+            qgis = qgisBenchmarks()
+            if qgis is None:
+                print('qgis is not available, skipping the pick and zoom benchmarks', file=sys.stderr)
+            else:
+                groups.append(qgis)
+
+        for benchmarks in groups:
+            for name, ops, function in benchmarks:
+                if selected and not any(name.startswith(prefix) for prefix in selected):
+                    continue
+                samples = calibrate()
+                perOp = timeIt(function, ops, repeat)
+                samples += calibrate()
+                # the median ignores the runs slowed or sped up by a burst, unlike the best run
+                calibration = statistics.median(samples)
+                calibrations.extend(samples)
+                results[name] = {'perOp': perOp, 'normalized': perOp / calibration, 'ops': ops}
+                print('{:<42} {:>12.3f} us/op {:>12.4g} x calibration'.format(name, perOp * 1e6,
+                                                                             perOp / calibration))
+        checks = accuracyChecks(gridDirectory)
+    calibration = statistics.median(calibrations or calibrate())
+    return calibration, results, checks
+
+
+def compare(results, baseline, threshold):
+    """ names of the benchmarks slower than baseline * (1 + threshold), with their ratio """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result['normalized'] / reference['normalized']
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline json file')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--output', default=None, help='write the results to this json file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown against the baseline, 0.5 for 50%% (default)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timed runs per benchmark')
+    parser.add_argument('benchmarks', nargs='*', help='only run benchmarks whose name starts with one of these')
+    args = parser.parse_args(argv)
+
+    calibration, results, checks = runBenchmarks(args.repeat, args.benchmarks)
+
+    failed = [check for check in checks if not check[1]]
+    for name, passed, detail in checks:
+        print('{:<42} {:<6} {}'.format(name, 'ok' if passed else 'FAILED', detail))
+
+    regressions = []
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'calibration': calibration, 'results': baseline}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline written to {}'.format(args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for name, ratio in regressions:
+            print('REGRESSION {} is {:.0%} of the baseline'.format(name, ratio))
+    else:
+        print('no baseline at {}, run with --update-baseline to record one'.format(args.baseline))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'calibration': calibration,
+                'results': results,
+                'accuracy': [{'name': name, 'passed': passed, 'detail': detail} for name, passed, detail in checks],
+                'regressions': [{'name': name, 'ratio': ratio} for name, ratio in regressions],
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+""" startup time report of the plugin
+
+    python benchmarks/startup_report.py             median of 5 fresh interpreters
+    python benchmarks/startup_report.py --runs 10 --json report.json
+
+Every run starts a new interpreter with an offscreen QgsApplication and times what QGIS pays when it loads the
+plugin: importing the plugin through classFactory and initGui. It then times the work moved to first use, the
+first activation of the pick tool and the creation of the zoom tool, and lists the heavy modules loaded at each
+point. The exit status is 1 when numpy or the transformer are imported by the plugin at startup, 2 when qgis is
+not available.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARK_DIR)
+PACKAGE = 'coordinate_picker'
+
+# modules the plugin should only import on first use
+DEFERRED_MODULES = ['numpy'] + ['{}.{}'.format(PACKAGE, name) for name in (
+    'coord_transformer', 'coord_parser', 'coordinate_zoom', 'gcj_grid', 'pick_buffer', 'raster_geotransform',
+    'wkb_coords')]
+
+
+class _StubIface:
+    """ the parts of QgisInterface initGui and the tools touch, on a real main window and canvas """
+
+    def __init__(self):
+        from qgis.PyQt.QtWidgets import QMainWindow, QStatusBar
+        from qgis.gui import QgsMapCanvas, QgsMessageBar
+        self._mainWindow = QMainWindow()
+        self._canvas = QgsMapCanvas(self._mainWindow)
+        self._messageBar = QgsMessageBar()
+        self._statusBar = QStatusBar()
+        self._menus = {}
+
+    def mainWindow(self):
+        return self._mainWindow
+
+    def mapCanvas(self):
+        return self._canvas
+
+    def messageBar(self):
+        return self._messageBar
+
+    def statusBarIface(self):
+        return self._statusBar
+
+    def activeLayer(self):
+        return None
+
+    def addToolBar(self, name):
+        return self._mainWindow.addToolBar(name)
+
+    def addPluginToMenu(self, name, action):
+        self._menus.setdefault(name, []).append(action)
+
+    def removePluginMenu(self, name, action):
+        actions = self._menus.get(name, [])
+        if action in actions:
+            actions.remove(action)
+
+    def removeToolBarIcon(self, action):
+        pass
+
+
+def _loaded():
+    return [name for name in DEFERRED_MODULES if name in sys.modules]
+
+
+def child():
+    """ one measurement, printed as json """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+    application = QgsApplication([], True)
+    application.initQgis()
+    iface = _StubIface()
+    loadedByQgis = _loaded()
+
+    spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(PLUGIN_DIR, '__init__.py'),
+                                                  submodule_search_locations=[PLUGIN_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+
+    start = time.perf_counter()
+    spec.loader.exec_module(package)
+    gui = package.classFactory(iface)
+    importSeconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    gui.initGui()
+    initGuiSeconds = time.perf_counter() - start
+    loadedAtStartup = [name for name in _loaded() if name not in loadedByQgis]
+
+    start = time.perf_counter()
+    gui.enablePickTool()
+    pickToolSeconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    gui.zoomToolInstance()
+    zoomToolSeconds = time.perf_counter() - start
+    loadedOnFirstUse = [name for name in _loaded() if name not in loadedByQgis and name not in loadedAtStartup]
+
+    gui.unload()
+    application.exitQgis()
+    print(json.dumps({
+        'import': importSeconds * 1000,
+        'initGui': initGuiSeconds * 1000,
+        'firstPickTool': pickToolSeconds * 1000,
+        'firstZoomTool': zoomToolSeconds * 1000,
+        'loadedByQgis': loadedByQgis,
+        'loadedAtStartup': loadedAtStartup,
+        'loadedOnFirstUse': loadedOnFirstUse,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to measure (default 5)')
+    parser.add_argument('--json', default=None, help='write the medians and the module lists to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    try:
+        available = importlib.util.find_spec('qgis.core') is not None
+    except ImportError:
+        available = False
+    if not available:
+        print('qgis is not available, no startup to measure', file=sys.stderr)
+        return 2
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {name: statistics.median(run[name] for run in runs)
+              for name in ('import', 'initGui', 'firstPickTool', 'firstZoomTool')}
+    report['startup'] = report['import'] + report['initGui']
+    for name in ('loadedByQgis', 'loadedAtStartup', 'loadedOnFirstUse'):
+        report[name] = runs[-1][name]
+
+    print('median of {} runs'.format(len(runs)))
+    for name in ('import', 'initGui', 'startup', 'firstPickTool', 'firstZoomTool'):
+        print('{:<16} {:>9.1f} ms'.format(name, report[name]))
+    for name in ('loadedByQgis', 'loadedAtStartup', 'loadedOnFirstUse'):
+        print('{:<16} {}'.format(name, ', '.join(report[name]) or '-'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    return 1 if report['loadedAtStartup'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
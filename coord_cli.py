@@ -0,0 +1,264 @@
+""" headless conversion of coordinate columns in csv or delimited text files
+
+Only coord_transformer and numpy are needed, QGIS is never imported:
+
+    python -m <plugin folder> --from GCJ02 --to WGS84 --columns lon,lat input.csv output.csv
+
+The input is read in chunks of --chunk-lines lines, every chunk is converted on a process pool and written as
+soon as it and all chunks before it are done, so memory use only depends on the chunk size and the number of
+jobs, never on the file size.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from .coord_transformer import COORD_SYSTEMS, NI_ITE, NI_ITE_MARS, convert_array
+
+DELIMITER_ALIASES = {'tab': '\t', 'space': ' ', 'comma': ',', 'semicolon': ';'}
+DEFAULT_CHUNK_LINES = 100000
+
+# grids opened by this process, keyed by directory
+_grids = {}
+
+
+def _grid(directory):
+    if directory is None:
+        return None
+    if directory not in _grids:
+        from .gcj_grid import offsetGrid
+        _grids[directory] = offsetGrid(directory)
+    return _grids[directory]
+
+
+def _parseColumn(values):
+    """ float array of a text column, NaN where a value is not a number """
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        pass
+    column = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            column[i] = float(value)
+        except ValueError:
+            column[i] = np.nan
+    return column
+
+
+def _formatColumn(values, integral, precision):
+    if integral:
+        return [str(v) for v in values.astype(np.int64).tolist()]
+    if precision is None:
+        return [repr(v) for v in values.tolist()]
+    template = '{{:.{}f}}'.format(precision)
+    return [template.format(v) for v in values.tolist()]
+
+
+def _splitRows(lines, delimiter, quoted):
+    if delimiter == ' ':
+        return [line.split() for line in lines]
+    if quoted:
+        return list(csv.reader(lines, delimiter=delimiter))
+    return [line.split(delimiter) for line in lines]
+
+
+def _joinRows(rows, delimiter, quoted):
+    if quoted:
+        out = io.StringIO()
+        csv.writer(out, delimiter=delimiter, lineterminator='\n').writerows(rows)
+        return out.getvalue()
+    return ''.join(delimiter.join(row) + '\n' for row in rows)
+
+
+def convertLines(lines, options):
+    """ convert the coordinate columns of a chunk of lines
+
+    Lines without valid coordinates are written unchanged.
+
+    Arguments:
+        lines {list} -- text lines without line endings
+        options {dict} -- source, target, xColumn, yColumn, delimiter, precision and gridDirectory
+
+    Returns:
+        tuple -- converted text, number of converted lines, number of lines left unchanged
+    """
+    delimiter = options['delimiter']
+    xColumn = options['xColumn']
+    yColumn = options['yColumn']
+    # the csv module is only needed for chunks with quoted fields
+    quoted = delimiter != ' ' and any('"' in line for line in lines)
+    rows = _splitRows(lines, delimiter, quoted)
+    width = max(xColumn, yColumn) + 1
+    usable = [i for i, row in enumerate(rows) if len(row) >= width]
+    if len(usable) != len(rows):
+        usableRows = [rows[i] for i in usable]
+    else:
+        usableRows = rows
+
+    x = _parseColumn([row[xColumn] for row in usableRows])
+    y = _parseColumn([row[yColumn] for row in usableRows])
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = convert_array(x[valid], y[valid], options['source'], options['target'], _grid(options['gridDirectory']))
+
+    integral = options['target'] in (NI_ITE, NI_ITE_MARS)
+    xs = _formatColumn(x, integral, options['precision'])
+    ys = _formatColumn(y, integral, options['precision'])
+    converted = 0
+    for row, isValid in zip(usableRows, valid.tolist()):
+        if isValid:
+            row[xColumn] = xs[converted]
+            row[yColumn] = ys[converted]
+            converted += 1
+    return _joinRows(rows, delimiter, quoted), converted, len(rows) - converted
+
+
+def _convertChunk(args):
+    lines, options = args
+    return convertLines(lines, options)
+
+
+def _readChunks(stream, chunkLines, quoting=True):
+    """ lists of up to chunkLines records without line endings, blank lines are dropped
+
+    With quoting a line with an odd number of quotes opens a quoted field, it is joined with the following lines
+    up to the one closing the field, so a record never ends up split between two chunks.
+    """
+    chunk = []
+    record = None
+    for line in stream:
+        if record is not None:
+            line = record + line
+            record = None
+        if quoting and line.count('"') % 2:
+            record = line
+            continue
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        chunk.append(line)
+        if len(chunk) >= chunkLines:
+            yield chunk
+            chunk = []
+    if record is not None:
+        # an unterminated quoted field, the csv module reads it up to the end
+        chunk.append(record.rstrip('\r\n'))
+    if chunk:
+        yield chunk
+
+
+def _resolveColumn(column, header):
+    if column.isdigit():
+        return int(column)
+    if header is None or column not in header:
+        raise SystemExit('column {} not found{}'.format(column, '' if header is None else ' in the header'))
+    return header.index(column)
+
+
+def convertStream(inStream, outStream, options, jobs=1, chunkLines=DEFAULT_CHUNK_LINES):
+    """ convert all lines of inStream into outStream
+
+    At most two chunks per job are queued on the pool, the results are written in input order.
+
+    Returns:
+        tuple -- number of converted lines, number of lines left unchanged
+    """
+    chunks = _readChunks(inStream, chunkLines, options['delimiter'] != ' ')
+    converted = skipped = 0
+    if jobs <= 1:
+        for lines in chunks:
+            text, done, left = convertLines(lines, options)
+            outStream.write(text)
+            converted += done
+            skipped += left
+        return converted, skipped
+
+    with multiprocessing.Pool(jobs) as pool:
+        pending = deque()
+        for lines in chunks:
+            pending.append(pool.apply_async(_convertChunk, ((lines, options),)))
+            while len(pending) >= 2 * jobs:
+                text, done, left = pending.popleft().get()
+                outStream.write(text)
+                converted += done
+                skipped += left
+        while pending:
+            text, done, left = pending.popleft().get()
+            outStream.write(text)
+            converted += done
+            skipped += left
+    return converted, skipped
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(
+        prog='coord_cli', description='Convert coordinate columns between WGS84, GCJ-02, BD-09 and NI_ITE.')
+    parser.add_argument('input', help='input file, - for stdin')
+    parser.add_argument('output', help='output file, - for stdout')
+    parser.add_argument('--from', dest='source', required=True, choices=COORD_SYSTEMS)
+    parser.add_argument('--to', dest='target', required=True, choices=COORD_SYSTEMS)
+    parser.add_argument('--columns', default='0,1', help='x and y column names or 0-based indices (default: 0,1)')
+    parser.add_argument('--delimiter', default=',', help="field delimiter, or one of tab, space, comma, semicolon")
+    parser.add_argument('--no-header', dest='header', action='store_false', help='the first line holds data')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='decimals of converted lon/lat, shortest exact representation by default')
+    parser.add_argument('--chunk-lines', type=int, default=DEFAULT_CHUNK_LINES, help='lines per chunk')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='worker processes')
+    parser.add_argument('--grid', metavar='DIR', default=None,
+                        help='interpolate GCJ-02 offsets from the offset grid cached in DIR')
+    return parser
+
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    delimiter = DELIMITER_ALIASES.get(args.delimiter, args.delimiter)
+    columns = args.columns.split(',')
+    if len(columns) != 2:
+        raise SystemExit('--columns needs exactly two columns')
+    if args.chunk_lines < 1:
+        raise SystemExit('--chunk-lines must be positive')
+
+    inStream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    outStream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        header = None
+        if args.header:
+            headerLine = inStream.readline()
+            if headerLine:
+                outStream.write(headerLine.rstrip('\r\n') + '\n')
+                header = _splitRows([headerLine.rstrip('\r\n')], delimiter, '"' in headerLine)[0]
+        options = {
+            'source': args.source,
+            'target': args.target,
+            'xColumn': _resolveColumn(columns[0].strip(), header),
+            'yColumn': _resolveColumn(columns[1].strip(), header),
+            'delimiter': delimiter,
+            'precision': args.precision,
+            'gridDirectory': args.grid,
+        }
+        if args.grid is not None:
+            # build the grid file once before the workers map it
+            _grid(args.grid).load()
+
+        start = time.perf_counter()
+        try:
+            converted, skipped = convertStream(inStream, outStream, options, args.jobs, args.chunk_lines)
+        except BrokenPipeError:
+            # the reader of stdout went away, e.g. piped into head
+            sys.stdout = None
+            return 1
+        seconds = time.perf_counter() - start
+    finally:
+        if inStream is not sys.stdin:
+            inStream.close()
+        if outStream is not sys.stdout:
+            outStream.close()
+
+    print('converted {} lines, left {} unchanged in {:.2f} s ({:.0f} lines/s)'.format(
+        converted, skipped, seconds, (converted + skipped) / seconds if seconds > 0 else 0), file=sys.stderr)
+    return 0
@@ -1,43 +1,126 @@
-class CoordFormater:
-    """ A simple coordinate recorder """
-
-    LayerCoord = 1  # coordinate in layer crs
-    WGS84Coord = 2  # coordinate in WGS84
-    MapCoord = 3  # coordinate in project crs
-    RasterPixelCord = 4  # coordinate in raster grid
-    RasterPixelIndex = 5  # cell index in raster grid
-    NI_ITE = 6
-    NI_ITE_MARS = 7
-
-    def __init__(self, coordType, x, y, layerName=None):
-        self._type = coordType
-        self._x = x
-        self._y = y
-        self._layerName = layerName
-
-    def coordinate_str(self):
-        if self._type == CoordFormater.RasterPixelCord:
-            return '{y}, {x}'.format(x=self._x, y=self._y)
-        elif self._type == CoordFormater.RasterPixelIndex:
-            return '{index}'.format(index=self._x)
-        else:
-            return '{x}, {y}'.format(x=self._x, y=self._y)
-
-    def __repr__(self):
-        layerName = self._layerName if self._layerName is not None else 'Map'
-        if self._type == CoordFormater.LayerCoord:
-            return 'Layer CRS:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.WGS84Coord:
-            return 'WGS84:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.MapCoord:
-            return 'Project CRS:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.RasterPixelCord:
-            return 'Row, Col:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.RasterPixelIndex:
-            return 'Cell Index:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.NI_ITE:
-            return 'ITE:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-        elif self._type == CoordFormater.NI_ITE_MARS:
-            return 'ITE_MARS:\t{name}\t{coordinate_str}'.format(name=layerName, coordinate_str=self.coordinate_str())
-
-        return 'unknown coordinate type'
+class CoordFormater:
+    """ A simple coordinate recorder """
+
+    __slots__ = ('_type', '_x', '_y', '_layerName', '_resolver', '_available')
+
+    LayerCoord = 1  # coordinate in layer crs
+    WGS84Coord = 2  # coordinate in WGS84
+    MapCoord = 3  # coordinate in project crs
+    RasterPixelCord = 4  # coordinate in raster grid
+    RasterPixelIndex = 5  # cell index in raster grid
+    NI_ITE = 6
+    NI_ITE_MARS = 7
+    NDS_TILE = 8  # packed nds tile id of the WGS84 coordinate
+
+    TypeNames = {
+        LayerCoord: 'Layer CRS',
+        WGS84Coord: 'WGS84',
+        MapCoord: 'Project CRS',
+        RasterPixelCord: 'Row, Col',
+        RasterPixelIndex: 'Cell Index',
+        NI_ITE: 'ITE',
+        NI_ITE_MARS: 'ITE_MARS',
+        NDS_TILE: 'NDS Tile',
+    }
+
+    # coordinate_str layout of every type, {x} and {y} take the precision of the type
+    ValueLayouts = {
+        RasterPixelCord: '{y}, {x}',
+        RasterPixelIndex: '{x}',
+        NDS_TILE: '{x}',
+    }
+    DefaultValueLayout = '{x}, {y}'
+
+    # types holding float values, only these have a configurable precision
+    FloatTypes = (LayerCoord, WGS84Coord, MapCoord)
+
+    # number of decimals of a float type, types not listed print the shortest exact representation
+    _precision = {}
+
+    # prebuilt str.format templates of coordinate_str and __repr__, keyed by type
+    _valueTemplates = {}
+    _reprTemplates = {}
+
+    def __init__(self, coordType, x, y, layerName=None, resolver=None):
+        self._type = coordType
+        self._x = x
+        self._y = y
+        self._layerName = layerName
+        self._resolver = resolver
+        self._available = True
+
+    @classmethod
+    def lazy(cls, coordType, resolver, layerName=None):
+        """ a coordinate computed on first use, resolver returns (x, y) or None when it is not available """
+        return cls(coordType, None, None, layerName, resolver)
+
+    @classmethod
+    def precision(cls, coordType):
+        return cls._precision.get(coordType)
+
+    @classmethod
+    def setPrecision(cls, coordType, decimals):
+        """ set the number of decimals of a float type, None restores the shortest exact representation """
+        if coordType not in cls.FloatTypes:
+            raise ValueError('coordinate type {} has no decimals'.format(coordType))
+        if decimals is None:
+            cls._precision.pop(coordType, None)
+        else:
+            cls._precision[coordType] = int(decimals)
+        cls._buildTemplates()
+
+    @classmethod
+    def _buildTemplates(cls):
+        for coordType, name in cls.TypeNames.items():
+            decimals = cls._precision.get(coordType)
+            spec = ':.{}f'.format(decimals) if decimals is not None else ''
+            layout = cls.ValueLayouts.get(coordType, cls.DefaultValueLayout)
+            value = layout.replace('{x}', '{x' + spec + '}').replace('{y}', '{y' + spec + '}')
+            label = 'NDS Tile L{y}' if coordType == cls.NDS_TILE else name
+
+            cls._valueTemplates[coordType] = value
+            cls._reprTemplates[coordType] = label + ':\t{name}\t' + value
+
+    def _resolve(self):
+        if self._resolver is not None:
+            value = self._resolver()
+            self._resolver = None
+            if value is None:
+                self._available = False
+            else:
+                self._x, self._y = value
+
+    def isAvailable(self):
+        self._resolve()
+        return self._available
+
+    def typeName(self):
+        return CoordFormater.TypeNames.get(self._type, 'unknown')
+
+    def coordinate_str(self):
+        self._resolve()
+        return CoordFormater._valueTemplates.get(self._type, CoordFormater.DefaultValueLayout).format(
+            x=self._x, y=self._y)
+
+    def __repr__(self):
+        self._resolve()
+        template = CoordFormater._reprTemplates.get(self._type)
+        if template is None:
+            return 'unknown coordinate type'
+        layerName = self._layerName if self._layerName is not None else 'Map'
+        return template.format(name=layerName, x=self._x, y=self._y)
+
+
+CoordFormater._buildTemplates()
+
+
+def formatCoordinates(coordinates):
+    """ format a sequence of coordinates as TSV, one line per available coordinate
+
+    Arguments:
+        coordinates {iterable} -- CoordFormater objects
+
+    Returns:
+        str -- lines of type, layer name and value separated by tabs
+    """
+    return '\n'.join([repr(coord) for coord in coordinates if coord.isAvailable()])
@@ -0,0 +1,228 @@
+import math
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# coordinate kinds guessed from the value ranges
+WGS84 = 'wgs84'
+NI = 'ni'
+RASTER_INDEX = 'raster_index'
+PROJECTED = 'projected'
+
+# ni coordinates are in 1e-5 degrees
+NI_MAX_X = 180 * 100000
+NI_MAX_Y = 90 * 100000
+
+ParseResult = namedtuple('ParseResult', ['coords', 'kind', 'swapped'])
+
+
+class CoordinateParseError(ValueError):
+    """ raised with the offending line when coordinate text can not be parsed """
+
+    def __init__(self, message, lineNumber=None, line=None):
+        if lineNumber is not None:
+            message = '{} at line {}: {}'.format(message, lineNumber, line[:100])
+        super().__init__(message)
+        self.lineNumber = lineNumber
+        self.line = line
+
+
+# separators and wkt parentheses are all read as white space
+_SEPARATORS = str.maketrans(',;\t()', '     ')
+
+# text made of these bytes only takes the vectorized parser
+_PLAIN_BYTES = b'0123456789eE.+-,;()\t\r\n\x0b\x0c '
+_WHITE_SPACE_BYTES = np.array([ord(c) for c in ' \t\r\n\x0b\x0c'], dtype=np.uint8)
+# e and E are exponents only between a digit or point and a digit or sign, anywhere else they are east
+_NOT_EXPONENT = re.compile(r'(?<![\d.])[eE]|[eE](?![-+]?\d)')
+# a WKT point keeps its x and y, Z and M ordinates are dropped
+_WKT_POINT = re.compile(r'\bPOINT\s*(?:ZM|Z|M)?\s*\(\s*([^\s(),]+)[\s,]+([^\s(),]+)(?:[\s,]+[^\s(),]+){0,2}\s*\)',
+                        re.IGNORECASE)
+# a first line without any digit, like 'lon,lat'
+_HEADER = re.compile(r'\A(\s*)[^\d\r\n]+(?=[\r\n]|\Z)')
+# degrees, minutes and seconds are ended by their unit symbol or by white space
+_DMS = re.compile(r'''
+    (?P<sign>[-+])?\s*
+    (?P<deg>\d+(?:\.\d*)?)(?:\s*(?:°|º|deg|d)|\s+|(?=[NSEWnsew]|$))\s*
+    (?:(?P<min>\d+(?:\.\d*)?)(?:\s*(?:'|′|min|m)|\s+|(?=[NSEWnsew]|$))\s*)?
+    (?:(?P<sec>\d+(?:\.\d*)?)(?:\s*(?:"|″|''|sec|s))?\s*)?
+    (?P<hemi>[NSEWnsew])?
+    ''', re.VERBOSE)
+# the two values of a line are split at a separator or at the white space after a hemisphere or seconds mark
+_DMS_SEPARATOR = re.compile(r'\s*[,;\t]\s*|(?<=[NSEWnsew"″])\s+')
+
+
+def _parseDmsValue(text, lineNumber, line):
+    match = _DMS.fullmatch(text.strip())
+    if match is None:
+        raise CoordinateParseError('Invalid coordinate value "{}"'.format(text.strip()), lineNumber, line)
+    value = float(match.group('deg'))
+    if match.group('min') is not None:
+        value += float(match.group('min')) / 60
+    if match.group('sec') is not None:
+        value += float(match.group('sec')) / 3600
+    hemi = (match.group('hemi') or '').upper()
+    if match.group('sign') == '-' or hemi in ('S', 'W'):
+        value = -value
+    return value, hemi
+
+
+def _parseDmsLine(line, lineNumber):
+    """ one line of degrees-minutes-seconds, returns (x, y) in lon/lat order """
+    parts = [part for part in _DMS_SEPARATOR.split(line.strip()) if part]
+    if len(parts) != 2:
+        raise CoordinateParseError('Expected two degree values', lineNumber, line)
+    (first, firstHemi), (second, secondHemi) = (_parseDmsValue(part, lineNumber, line) for part in parts)
+    if firstHemi in ('N', 'S') or secondHemi in ('E', 'W'):
+        return second, first
+    return first, second
+
+
+def _isPlainNumbers(text):
+    try:
+        data = text.encode('ascii')
+    except UnicodeEncodeError:
+        return False
+    if data.translate(None, _PLAIN_BYTES):
+        return False
+    return not ((b'e' in data or b'E' in data) and _NOT_EXPONENT.search(text))
+
+
+def _parseLine(line, lineNumber):
+    """ one line of plain numbers or degrees-minutes-seconds, returns (x, y) in lon/lat order """
+    x = y = None
+    if _isPlainNumbers(line):
+        parts = line.translate(_SEPARATORS).split()
+        if len(parts) == 2:
+            try:
+                x, y = float(parts[0]), float(parts[1])
+            except ValueError:
+                raise CoordinateParseError('Invalid number', lineNumber, line)
+    if x is None:
+        x, y = _parseDmsLine(line.translate(str.maketrans('()', '  ')), lineNumber)
+    # exponents and digit runs out of the float range overflow to inf
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise CoordinateParseError('Invalid number', lineNumber, line)
+    return x, y
+
+
+def _parsePlainText(text):
+    """ vectorized parser of text holding only numbers and white space, returns an (n, k) array """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    data = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    if not data.size:
+        raise CoordinateParseError('No coordinates found')
+
+    # count the values of every line from the starts of the white space separated tokens
+    isSpace = np.isin(data, _WHITE_SPACE_BYTES)
+    tokenStart = ~isSpace
+    tokenStart[1:] &= isSpace[:-1]
+    lineIds = np.cumsum(data == 10)
+    counts = np.bincount(lineIds[tokenStart], minlength=int(lineIds[-1]) + 1)
+
+    nonEmpty = counts > 0
+    if not nonEmpty.any():
+        raise CoordinateParseError('No coordinates found')
+    width = counts[nonEmpty][0]
+    wrong = np.flatnonzero(nonEmpty & (counts != width))
+    if wrong.size or width > 2:
+        lineIndex = int(wrong[0] if wrong.size else np.flatnonzero(nonEmpty)[0])
+        raise CoordinateParseError('Expected one or two values per line', lineIndex + 1,
+                                   text.split('\n')[lineIndex])
+
+    tokens = text.split()
+    try:
+        values = np.array(tokens, dtype=np.float64)
+    except ValueError:
+        # find the offending line, only on the error path
+        for lineIndex, line in enumerate(text.split('\n')):
+            try:
+                [float(part) for part in line.split()]
+            except ValueError:
+                raise CoordinateParseError('Invalid number', lineIndex + 1, line)
+        raise
+    values = values.reshape(-1, width)
+    # exponents out of the float range overflow to inf
+    infinite = np.flatnonzero(~np.isfinite(values).all(axis=1))
+    if infinite.size:
+        lineIndex = int(np.flatnonzero(nonEmpty)[infinite[0]])
+        raise CoordinateParseError('Invalid number', lineIndex + 1, text.split('\n')[lineIndex])
+    return values
+
+
+def _isIntegral(values):
+    return bool(np.all(values == np.trunc(values)))
+
+
+def _detect(coords, hemisphereOrdered):
+    """ guess the coordinate kind and the axis order from the value ranges """
+    if coords.shape[1] == 1:
+        if not _isIntegral(coords):
+            raise CoordinateParseError('A single value per line must be an integer cell index')
+        return coords, RASTER_INDEX, False
+
+    absX = np.abs(coords[:, 0])
+    absY = np.abs(coords[:, 1])
+    swapped = False
+    if not hemisphereOrdered and absX.max() <= 90 < absY.max() <= 180:
+        # lat/lon order, only the second column can be a longitude
+        coords = coords[:, ::-1].copy()
+        absX, absY = absY, absX
+        swapped = True
+
+    if absX.max() <= 180 and absY.max() <= 90:
+        return coords, WGS84, swapped
+    if _isIntegral(coords) and absX.max() <= NI_MAX_X and absY.max() <= NI_MAX_Y:
+        return coords, NI, swapped
+    return coords, PROJECTED, swapped
+
+
+def parseCoordinates(text):
+    """ parse coordinate text with one coordinate per line
+
+    Every line holds a cell index or an x/y pair, pairs are separated by commas, semicolons, tabs or spaces and
+    may be wrapped in parentheses or a WKT POINT(...), the Z and M ordinates of POINT Z/M/ZM are dropped. Pairs in
+    degrees-minutes-seconds with or without N/S/E/W are accepted too, hemisphere letters decide the axis order,
+    and may be mixed with plain pairs. A first line without digits is a header and skipped. Text holding only
+    numbers takes a vectorized path that counts the values of every line with numpy and converts all values with
+    one numpy call.
+
+    The coordinate kind is guessed from the value ranges of all lines: integers are cell indices, pairs within
+    +-180/+-90 are WGS84 (lat/lon pairs are swapped to lon/lat when only the second column exceeds 90), integer
+    pairs within the NI range are NI coordinates and everything else is projected.
+
+    Arguments:
+        text {str} -- the coordinate text
+
+    Raises:
+        CoordinateParseError: with the offending line when a line can not be parsed
+
+    Returns:
+        ParseResult -- (n, 2) coordinates or (n, 1) cell indices, the detected kind and whether lat/lon order
+                       was swapped
+    """
+    if not _isPlainNumbers(text):
+        # the header line is blanked, not removed, to keep the line numbers of the errors
+        text = _WKT_POINT.sub(r' \1 \2 ', _HEADER.sub(r'\1', text, count=1))
+
+    if _isPlainNumbers(text):
+        coords = _parsePlainText(text.translate(_SEPARATORS))
+        return ParseResult(*_detect(coords, False))
+
+    lines = text.splitlines()
+    # degrees-minutes-seconds, possibly mixed with plain pairs, one line at a time
+    rows = [_parseLine(line, lineNumber) for lineNumber, line in enumerate(lines, 1) if line.strip()]
+    if not rows:
+        raise CoordinateParseError('No coordinates found')
+    return ParseResult(*_detect(np.array(rows, dtype=np.float64), True))
+
+
+def parseCoordinate(text):
+    """ parse a single coordinate, returns an (x, y) or (index,) tuple """
+    result = parseCoordinates(text)
+    if len(result.coords) != 1:
+        raise CoordinateParseError('Expected a single coordinate, got {}'.format(len(result.coords)))
+    if result.kind == RASTER_INDEX:
+        return (int(result.coords[0, 0]),)
+    return tuple(result.coords[0].tolist())
@@ -1,92 +1,649 @@
-from qgis.PyQt import QtGui, QtWidgets
-from qgis.core import Qgis, QgsRasterLayer, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject, \
-    QgsCsException
-from qgis.gui import QgsMapToolEmitPoint
-
-from .coord_formatter import CoordFormater as Coordinate
-from .coord_transformer import Transform
-
-epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
-
-
-class CoordinatePicker(QgsMapToolEmitPoint):
-
-    def __init__(self, iface):
-        self.iface = iface
-        self.mapCanvas = self.iface.mapCanvas()
-        self.coordinates = None
-
-        super().__init__(self.mapCanvas)
-
-    def canvasReleaseEvent(self, mouseEvent):
-        self.updateCoordinates(mouseEvent.originalPixelPoint())
-        self.showCoordinates()
-
-    def updateCoordinates(self, screenPoint):
-        activeLayer = self.iface.activeLayer()
-        activeLayerName = activeLayer.name() if activeLayer is not None else None
-
-        self.coordinates = []
-
-        mapCoord = super().toMapCoordinates(screenPoint)
-        self.coordinates.insert(0, Coordinate(Coordinate.MapCoord, mapCoord.x(), mapCoord.y(), activeLayerName))
-
-        wgs84Coord = None
-        canvasCRS = self.mapCanvas.mapSettings().destinationCrs()
-        if canvasCRS == epsg4326:
-            wgs84Coord = mapCoord
-        else:
-            sourceCRS = activeLayer.crs() if activeLayer else canvasCRS
-            transform = QgsCoordinateTransform(sourceCRS, epsg4326, QgsProject.instance())
-            try:
-                # transformation may throw an error, just ignore it
-                wgs84Coord = transform.transform(mapCoord.x(), mapCoord.y())
-            except QgsCsException:
-                pass
-        if wgs84Coord is not None:
-            self.coordinates.append(Coordinate(Coordinate.WGS84Coord, wgs84Coord.x(), wgs84Coord.y(), activeLayerName))
-
-            ni_point = Transform.lonlat2nipoint(wgs84Coord.x(), wgs84Coord.y())
-            self.coordinates.append(Coordinate(Coordinate.NI_ITE, ni_point[0], ni_point[1], activeLayerName))
-            mars_coord = Transform.wgs2gcj(wgs84Coord.x(), wgs84Coord.y())
-            ni_point_mars = Transform.lonlat2nipoint(mars_coord[0], mars_coord[1])
-            self.coordinates.append(
-                Coordinate(Coordinate.NI_ITE_MARS, ni_point_mars[0], ni_point_mars[1], activeLayerName))
-
-        if activeLayer:
-            layerCoord = super().toLayerCoordinates(activeLayer, screenPoint)
-            self.coordinates.insert(0,
-                                    Coordinate(Coordinate.LayerCoord, layerCoord.x(), layerCoord.y(), activeLayerName))
-
-            if isinstance(activeLayer, QgsRasterLayer):
-                rasterExtent = activeLayer.extent()
-                rasterWidth = activeLayer.width()
-                if rasterExtent.contains(layerCoord):
-                    rasterPixelX = int((layerCoord.x() - rasterExtent.xMinimum()) / activeLayer.rasterUnitsPerPixelX())
-                    rasterPixelY = int((rasterExtent.yMaximum() - layerCoord.y()) / activeLayer.rasterUnitsPerPixelY())
-                    self.coordinates.insert(0, Coordinate(Coordinate.RasterPixelCord, rasterPixelX, rasterPixelY,
-                                                          activeLayerName))
-                    self.coordinates.insert(0, Coordinate(Coordinate.RasterPixelIndex,
-                                                          rasterPixelY * rasterWidth + rasterPixelX, None,
-                                                          activeLayerName))
-
-    def showCoordinates(self):
-        if self.coordinates:
-            contextMenu = QtWidgets.QMenu()
-
-            for coord in self.coordinates:
-                action = contextMenu.addAction(str(coord))
-                action.triggered.connect(self.getCoordinateActionTriggeredHandler(coord))
-
-            contextMenu.exec_(QtGui.QCursor().pos())
-
-    def getCoordinateActionTriggeredHandler(self, coordinate):
-        iface = self.iface
-
-        def handler():
-            clipboard = QtWidgets.QApplication.clipboard()
-            clipboard.setText(coordinate.coordinate_str())
-            iface.messageBar().pushMessage("", "{} copied to the clipboard".format(coordinate.coordinate_str()),
-                                           level=Qgis.Info, duration=1)
-
-        return handler
+import time
+from collections import OrderedDict
+from functools import partial
+
+from qgis.PyQt import QtCore, QtGui, QtWidgets, sip
+from qgis.core import Qgis, QgsRasterLayer, QgsCoordinateReferenceSystem, QgsCsException, QgsSettings, QgsPointXY, \
+    QgsVectorLayer, QgsFields, QgsField, QgsFeature, QgsGeometry, QgsProject
+from qgis.gui import QgsMapToolEmitPoint
+
+from .coord_formatter import CoordFormater as Coordinate, formatCoordinates
+from .perf_stats import perfStats
+from .pick_history import pickHistory
+from .pick_stream import pickPublisher
+from .raster_sampler import RasterSample, rasterSampler
+from .transform_cache import CoordinateTransformCache, transformCache
+
+epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+
+class PickPoint:
+    """ The coordinates of one picked screen point, every value is computed once on first use
+
+    The transformer and the raster geotransforms pull in numpy, they are imported by the first value that needs
+    them rather than when QGIS loads the plugin.
+    """
+
+    # perf_stats stage of every coordinate kind, a stage includes the values it depends on
+    StageNames = {
+        Coordinate.MapCoord: 'pick.mapCoord',
+        Coordinate.LayerCoord: 'pick.layerTransform',
+        Coordinate.WGS84Coord: 'pick.wgs84Transform',
+        Coordinate.NI_ITE: 'pick.ni',
+        Coordinate.NI_ITE_MARS: 'pick.niGcj',
+        Coordinate.NDS_TILE: 'pick.ndsTile',
+        Coordinate.RasterPixelCord: 'pick.rasterPixel',
+        Coordinate.RasterPixelIndex: 'pick.rasterIndex',
+    }
+
+    def __init__(self, tool, screenPoint, layer, canvasCrs):
+        self._tool = tool
+        self.screenPoint = screenPoint
+        self.layer = layer
+        self.canvasCrs = canvasCrs
+        self._values = {}
+
+        self._resolvers = {
+            Coordinate.MapCoord: self._mapCoord,
+            Coordinate.LayerCoord: self._layerCoord,
+            Coordinate.WGS84Coord: self._wgs84Coord,
+            Coordinate.NI_ITE: self._niPoint,
+            Coordinate.NI_ITE_MARS: self._niPointMars,
+            Coordinate.NDS_TILE: self._ndsTile,
+            Coordinate.RasterPixelCord: self._rasterPixel,
+            Coordinate.RasterPixelIndex: self._rasterIndex,
+        }
+
+    def value(self, kind):
+        """ (x, y) of a coordinate kind, None when it is not available for this point """
+        if kind not in self._values:
+            with perfStats().stage(PickPoint.StageNames[kind]):
+                self._values[kind] = self._resolvers[kind]()
+        return self._values[kind]
+
+    def resolver(self, kind):
+        return partial(self.value, kind)
+
+    def _mapCoord(self):
+        mapCoord = self._tool.toMapCoordinates(self.screenPoint)
+        return mapCoord.x(), mapCoord.y()
+
+    def _layerCoord(self):
+        if self.layer is None:
+            return None
+        layerCoord = self._tool.toLayerCoordinates(self.layer, self.screenPoint)
+        return layerCoord.x(), layerCoord.y()
+
+    def _wgs84Coord(self):
+        return self._transformMapCoord(epsg4326)
+
+    def _transformMapCoord(self, crs):
+        """ the map coordinate in crs with the shared transform cache, None when it can not be transformed """
+        mapCoord = self.value(Coordinate.MapCoord)
+        if crs == self.canvasCrs:
+            return mapCoord
+        if not crs.isValid():
+            return None
+
+        transform = transformCache().transform(self.canvasCrs, crs)
+        try:
+            coord = transform.transform(mapCoord[0], mapCoord[1])
+        except QgsCsException:
+            # transformation may throw an error, just ignore it
+            return None
+        return coord.x(), coord.y()
+
+    def allLayerCoords(self, layers):
+        """ the point in the crs of every layer
+
+        Layers sharing a crs are grouped and the point is transformed once per group. Raster cells are only listed
+        for the rasters containing the point.
+
+        Returns:
+            tuple -- list of (crs, layers, (x, y) or None) groups, list of (layer, (col, row)) raster cells
+        """
+        key = ('allLayers',) + tuple(layer.id() for layer in layers)
+        if key not in self._values:
+            with perfStats().stage('pick.allLayers'):
+                self._values[key] = self._allLayerCoords(layers)
+        return self._values[key]
+
+    def _allLayerCoords(self, layers):
+        from .raster_geotransform import geoTransformCache
+
+        groups = OrderedDict()
+        for layer in layers:
+            crs = layer.crs()
+            key = CoordinateTransformCache.crsKey(crs)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = (crs, [])
+            group[1].append(layer)
+
+        crsGroups = []
+        rasterCells = []
+        for crs, groupLayers in groups.values():
+            coord = self._transformMapCoord(crs)
+            crsGroups.append((crs, groupLayers, coord))
+            if coord is None:
+                continue
+            for layer in groupLayers:
+                if isinstance(layer, QgsRasterLayer):
+                    cell = geoTransformCache().geoTransform(layer).cellAt(coord[0], coord[1])
+                    if cell is not None:
+                        rasterCells.append((layer, cell))
+        return crsGroups, rasterCells
+
+    def _niPoint(self):
+        wgs84Coord = self.value(Coordinate.WGS84Coord)
+        if wgs84Coord is None:
+            return None
+        from .coord_transformer import Transform
+        return Transform.lonlat2nipoint(wgs84Coord[0], wgs84Coord[1])
+
+    def _niPointMars(self):
+        wgs84Coord = self.value(Coordinate.WGS84Coord)
+        if wgs84Coord is None:
+            return None
+        from .coord_transformer import Transform
+        mars_coord = Transform.wgs2gcj(wgs84Coord[0], wgs84Coord[1])
+        return Transform.lonlat2nipoint(mars_coord[0], mars_coord[1])
+
+    def _ndsTile(self):
+        wgs84Coord = self.value(Coordinate.WGS84Coord)
+        if wgs84Coord is None:
+            return None
+        from .coord_transformer import NDS_MAX_LEVEL, Transform
+        ndsLevel = QgsSettings().value(CoordinatePicker.NdsTileLevelKey, CoordinatePicker.DefaultNdsTileLevel,
+                                       type=int)
+        # a hand edited setting out of range would raise in the pick menu
+        ndsLevel = min(max(ndsLevel, 0), NDS_MAX_LEVEL)
+        return Transform.lonlat2ndstile(wgs84Coord[0], wgs84Coord[1], ndsLevel), ndsLevel
+
+    def _rasterPixel(self):
+        if not isinstance(self.layer, QgsRasterLayer):
+            return None
+        layerCoord = self.value(Coordinate.LayerCoord)
+        from .raster_geotransform import geoTransformCache
+        # (col, row), None outside of the raster
+        return geoTransformCache().geoTransform(self.layer).cellAt(layerCoord[0], layerCoord[1])
+
+    def _rasterIndex(self):
+        rasterPixel = self.value(Coordinate.RasterPixelCord)
+        if rasterPixel is None:
+            return None
+        from .raster_geotransform import geoTransformCache
+        return rasterPixel[1] * geoTransformCache().geoTransform(self.layer).width + rasterPixel[0], None
+
+
+class CoordinatePicker(QgsMapToolEmitPoint):
+    NdsTileLevelKey = 'CoordinatePicker/NdsTileLevel'
+    DefaultNdsTileLevel = 13
+    HoverModeKey = 'CoordinatePicker/HoverMode'
+    HoverKindsKey = 'CoordinatePicker/HoverKinds'
+    DefaultHoverKinds = [Coordinate.WGS84Coord]
+    HoverInterval = 16  # ms, about one frame
+    PickKindsKey = 'CoordinatePicker/PickKinds'
+    PickPointCacheSize = 256
+    PrecisionKey = 'CoordinatePicker/Precision'
+    RasterValuesKey = 'CoordinatePicker/RasterValues'
+    AllLayersKey = 'CoordinatePicker/AllLayers'
+    # layer names listed in the entry of a crs group before the rest is counted
+    GroupLayerNames = 3
+    # earlier picks within this many pixels of a pick are listed in its menu
+    HistoryTolerance = 10
+    HistoryMenuSize = 10
+
+    # coordinate kinds in the order they appear in the menu
+    MenuKinds = [Coordinate.RasterPixelIndex, Coordinate.RasterPixelCord, Coordinate.LayerCoord, Coordinate.MapCoord,
+                 Coordinate.WGS84Coord, Coordinate.NI_ITE, Coordinate.NI_ITE_MARS, Coordinate.NDS_TILE]
+
+    def __init__(self, iface):
+        self.iface = iface
+        self.mapCanvas = self.iface.mapCanvas()
+        self.coordinates = None
+        self.layerCoordinates = []
+        self.screenPoint = None
+        self.rasterSample = None
+        self._pickPoints = OrderedDict()
+        self.collecting = False
+        self._pickBuffer = None
+
+        super().__init__(self.mapCanvas)
+
+        self.hoverEnabled = False
+        self.hoverEventsReceived = 0
+        self.hoverEventsComputed = 0
+        self._hoverPoint = None
+        self._hoverLabel = None
+        self._hoverTimer = QtCore.QTimer()
+        self._hoverTimer.setSingleShot(True)
+        self._hoverTimer.setInterval(CoordinatePicker.HoverInterval)
+        self._hoverTimer.timeout.connect(self._updateHover)
+        self.setHoverEnabled(QgsSettings().value(CoordinatePicker.HoverModeKey, False, type=bool))
+        self.loadPrecision()
+
+    @staticmethod
+    def loadPrecision():
+        """ apply the decimals of the float coordinate types stored under CoordinatePicker/Precision/<type> """
+        settings = QgsSettings()
+        for coordType in Coordinate.FloatTypes:
+            decimals = settings.value('{}/{}'.format(CoordinatePicker.PrecisionKey, coordType), None)
+            Coordinate.setPrecision(coordType, int(decimals) if decimals not in (None, '') else None)
+
+    @property
+    def pickBuffer(self):
+        """ the collected coordinates, the buffer is created by the first collected point """
+        if self._pickBuffer is None:
+            from .pick_buffer import PickBuffer
+            self._pickBuffer = PickBuffer()
+        return self._pickBuffer
+
+    def canvasReleaseEvent(self, mouseEvent):
+        if self.collecting:
+            if mouseEvent.button() == QtCore.Qt.RightButton:
+                self.showPickBufferMenu()
+            else:
+                self.collectCoordinates(mouseEvent.originalPixelPoint())
+            return
+
+        with perfStats().operation('pick'):
+            self.updateCoordinates(mouseEvent.originalPixelPoint())
+            contextMenu = self.coordinatesMenu()
+            with perfStats().stage('pick.history'):
+                self.recordPick()
+            with perfStats().stage('pick.stream'):
+                self.publishPick(self.screenPoint, 'pick')
+        if contextMenu is not None:
+            contextMenu.exec_(QtGui.QCursor().pos())
+
+    def setCollecting(self, collecting):
+        self.collecting = collecting
+
+    def collectCoordinates(self, screenPoint):
+        """ add the selected coordinate kinds of a screen point to the pick buffer """
+        pickPoint = self.pickPoint(screenPoint)
+        # the project coordinate is always kept, it places the point of the exported memory layer
+        kinds = self.pickKinds() | {Coordinate.MapCoord}
+        self.pickBuffer.append({kind: pickPoint.value(kind) for kind in kinds},
+                               pickPoint.layer.name() if pickPoint.layer is not None else None)
+        self.publishPick(screenPoint, 'collect')
+        self.iface.messageBar().pushMessage("", "{} coordinates collected, right click to export".format(
+            len(self.pickBuffer)), level=Qgis.Info, duration=1)
+
+    def showPickBufferMenu(self):
+        contextMenu = QtWidgets.QMenu()
+        empty = len(self.pickBuffer) == 0
+        for text, handler in (('Copy as TSV', partial(self.copyPickBuffer, '\t')),
+                              ('Copy as CSV', partial(self.copyPickBuffer, ',')),
+                              ('Save as GeoJSON...', self.savePickBufferGeoJSON),
+                              ('Add as memory layer', self.addPickBufferLayer),
+                              ('Clear collected coordinates', self.pickBuffer.clear)):
+            action = contextMenu.addAction(text)
+            action.setEnabled(not empty)
+            action.triggered.connect(handler)
+
+        contextMenu.exec_(QtGui.QCursor().pos())
+
+    def copyPickBuffer(self, delimiter):
+        QtWidgets.QApplication.clipboard().setText(self.pickBuffer.toDelimited(delimiter))
+        self.iface.messageBar().pushMessage("", "{} coordinates copied to the clipboard".format(len(self.pickBuffer)),
+                                            level=Qgis.Info, duration=1)
+
+    def savePickBufferGeoJSON(self):
+        fileName, _ = QtWidgets.QFileDialog.getSaveFileName(self.iface.mainWindow(), 'Save collected coordinates',
+                                                            '', 'GeoJSON (*.geojson *.json)')
+        if not fileName:
+            return
+        with open(fileName, 'w', encoding='utf-8') as f:
+            f.write(self.pickBuffer.toGeoJSON())
+
+    def addPickBufferLayer(self):
+        """ add the pick buffer as a point memory layer in the canvas crs, all features in one write """
+        names, columns = self.pickBuffer.records()
+        mapCoords, valid = self.pickBuffer.column(Coordinate.MapCoord)
+
+        layer = QgsVectorLayer('Point', 'Collected coordinates', 'memory')
+        layer.setCrs(self.mapCanvas.mapSettings().destinationCrs())
+        fields = QgsFields()
+        for name, column in zip(names, columns):
+            sample = next((value for value in column if value is not None), None)
+            if isinstance(sample, float):
+                fields.append(QgsField(name, QtCore.QVariant.Double))
+            elif isinstance(sample, int):
+                fields.append(QgsField(name, QtCore.QVariant.LongLong))
+            else:
+                fields.append(QgsField(name, QtCore.QVariant.String))
+        provider = layer.dataProvider()
+        provider.addAttributes(fields)
+        layer.updateFields()
+
+        features = []
+        for (x, y), hasCoord, attributes in zip(mapCoords.tolist(), valid.tolist(), zip(*columns)):
+            feature = QgsFeature(fields)
+            if hasCoord:
+                feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            feature.setAttributes(list(attributes))
+            features.append(feature)
+        provider.addFeatures(features)
+        layer.updateExtents()
+
+        QgsProject.instance().addMapLayer(layer)
+
+    def updateCoordinates(self, screenPoint):
+        self.screenPoint = screenPoint
+        with perfStats().stage('pick.coordinates'):
+            self.coordinates = self.computeCoordinates(screenPoint)
+        if QgsSettings().value(CoordinatePicker.AllLayersKey, False, type=bool):
+            self.layerCoordinates = self.computeLayerCoordinates(screenPoint, self.mapCanvas.layers())
+        else:
+            self.layerCoordinates = []
+        # start reading band values right away, the tiles are usually in by the time the menu is up
+        with perfStats().stage('pick.rasterSample'):
+            self.rasterSample = self.sampleRaster(screenPoint)
+
+    def sampleRaster(self, screenPoint):
+        """ RasterSample of all bands of the active raster layer at a screen point, None when not applicable """
+        if not QgsSettings().value(CoordinatePicker.RasterValuesKey, True, type=bool):
+            return None
+        pickPoint = self.pickPoint(screenPoint)
+        if not isinstance(pickPoint.layer, QgsRasterLayer):
+            return None
+        layerCoord = pickPoint.value(Coordinate.LayerCoord)
+        return rasterSampler().sample(pickPoint.layer, layerCoord[0], layerCoord[1])
+
+    def computeCoordinates(self, screenPoint, kinds=None):
+        """ coordinates of a screen point in menu order
+
+        The entries are lazy, a value is computed when the entry is displayed or copied. Only the coordinate
+        kinds listed in kinds get an entry, the kinds selected in the settings when kinds is None.
+        """
+        if kinds is None:
+            kinds = self.pickKinds()
+
+        pickPoint = self.pickPoint(screenPoint)
+        layerName = pickPoint.layer.name() if pickPoint.layer is not None else None
+        return [Coordinate.lazy(kind, pickPoint.resolver(kind), layerName)
+                for kind in CoordinatePicker.MenuKinds if kind in kinds]
+
+    def computeLayerCoordinates(self, screenPoint, layers):
+        """ coordinates of a screen point in the crs of every layer
+
+        There is one entry per distinct crs naming its layers, and one row, col entry per raster containing the point.
+        """
+        pickPoint = self.pickPoint(screenPoint)
+        crsGroups, rasterCells = pickPoint.allLayerCoords(layers)
+
+        coordinates = []
+        for crs, groupLayers, coord in crsGroups:
+            if coord is None:
+                continue
+            names = ', '.join(layer.name() for layer in groupLayers[:CoordinatePicker.GroupLayerNames])
+            if len(groupLayers) > CoordinatePicker.GroupLayerNames:
+                names += ' and {} more'.format(len(groupLayers) - CoordinatePicker.GroupLayerNames)
+            coordinates.append(Coordinate(Coordinate.LayerCoord, coord[0], coord[1],
+                                          '{} ({})'.format(names, crs.authid() or crs.description())))
+        for layer, (col, row) in rasterCells:
+            coordinates.append(Coordinate(Coordinate.RasterPixelCord, col, row, layer.name()))
+        return coordinates
+
+    def pickPoint(self, screenPoint):
+        """ the memoized PickPoint of a screen pixel for the active layer and the current canvas state """
+        activeLayer = self.iface.activeLayer()
+        mapSettings = self.mapCanvas.mapSettings()
+        extent = mapSettings.visibleExtent()
+        key = (screenPoint.x(), screenPoint.y(), activeLayer.id() if activeLayer is not None else None,
+               CoordinateTransformCache.crsKey(mapSettings.destinationCrs()), extent.xMinimum(), extent.yMaximum(),
+               mapSettings.mapUnitsPerPixel(), mapSettings.rotation())
+
+        pickPoint = self._pickPoints.get(key)
+        if pickPoint is None:
+            pickPoint = PickPoint(self, screenPoint, activeLayer, mapSettings.destinationCrs())
+            self._pickPoints[key] = pickPoint
+            if len(self._pickPoints) > CoordinatePicker.PickPointCacheSize:
+                self._pickPoints.popitem(last=False)
+        else:
+            self._pickPoints.move_to_end(key)
+        return pickPoint
+
+    def pickKinds(self):
+        return self._kindsSetting(CoordinatePicker.PickKindsKey, CoordinatePicker.MenuKinds)
+
+    def setPickKindSelected(self, kind, selected):
+        kinds = self.pickKinds()
+        if selected:
+            kinds.add(kind)
+        else:
+            kinds.discard(kind)
+        QgsSettings().setValue(CoordinatePicker.PickKindsKey, sorted(kinds))
+
+    @staticmethod
+    def _kindsSetting(key, default):
+        kinds = QgsSettings().value(key, default)
+        if kinds is None:
+            return set()
+        if not isinstance(kinds, (list, tuple)):
+            kinds = [kinds]
+        return {int(kind) for kind in kinds}
+
+    def setHoverEnabled(self, enabled):
+        self.hoverEnabled = enabled
+        if enabled:
+            if self._hoverLabel is None:
+                self._hoverLabel = QtWidgets.QLabel()
+                self.iface.statusBarIface().addPermanentWidget(self._hoverLabel)
+            self._hoverLabel.setVisible(self.isActive())
+        else:
+            self._hoverTimer.stop()
+            self._hoverPoint = None
+            if self._hoverLabel is not None:
+                self.iface.statusBarIface().removeWidget(self._hoverLabel)
+                self._hoverLabel.deleteLater()
+                self._hoverLabel = None
+
+    def hoverKinds(self):
+        return self._kindsSetting(CoordinatePicker.HoverKindsKey, CoordinatePicker.DefaultHoverKinds)
+
+    def hoverStats(self):
+        return {'received': self.hoverEventsReceived, 'computed': self.hoverEventsComputed}
+
+    def activate(self):
+        super().activate()
+        if self._hoverLabel is not None:
+            self._hoverLabel.setVisible(True)
+
+    def deactivate(self):
+        self._hoverTimer.stop()
+        self._hoverPoint = None
+        if self._hoverLabel is not None:
+            self._hoverLabel.setVisible(False)
+        super().deactivate()
+
+    def canvasMoveEvent(self, mouseEvent):
+        if not self.hoverEnabled:
+            return
+
+        # only remember the latest position, the timer computes at most once per frame
+        self.hoverEventsReceived += 1
+        self._hoverPoint = mouseEvent.originalPixelPoint()
+        if not self._hoverTimer.isActive():
+            self._hoverTimer.start()
+
+    def _updateHover(self):
+        if self._hoverPoint is None or self._hoverLabel is None:
+            return
+
+        screenPoint = self._hoverPoint
+        self._hoverPoint = None
+        self.hoverEventsComputed += 1
+
+        coordinates = self.computeCoordinates(screenPoint, self.hoverKinds())
+        self._hoverLabel.setText('  '.join(
+            '{}: {}'.format(coord.typeName(), coord.coordinate_str()) for coord in coordinates if coord.isAvailable()))
+        self._hoverLabel.setToolTip('{received} mouse events received, {computed} computed'.format(
+            **self.hoverStats()))
+
+    def showCoordinates(self):
+        contextMenu = self.coordinatesMenu()
+        if contextMenu is not None:
+            contextMenu.exec_(QtGui.QCursor().pos())
+
+    def coordinatesMenu(self):
+        """ the context menu of the last picked coordinates, None before the first pick """
+        if self.coordinates is None:
+            return None
+
+        with perfStats().stage('pick.menu'):
+            return self._coordinatesMenu()
+
+    def _coordinatesMenu(self):
+        contextMenu = QtWidgets.QMenu()
+
+        for coord in self.coordinates:
+            if not coord.isAvailable():
+                continue
+            action = contextMenu.addAction(str(coord))
+            action.triggered.connect(self.getCoordinateActionTriggeredHandler(coord))
+
+        if self.layerCoordinates:
+            contextMenu.addSection('All layers')
+            for coord in self.layerCoordinates:
+                action = contextMenu.addAction(str(coord))
+                action.triggered.connect(self.getCoordinateActionTriggeredHandler(coord))
+
+        if self.rasterSample is not None:
+            contextMenu.addSeparator()
+            self.addRasterSampleActions(contextMenu, self.rasterSample)
+
+        self.addHistoryMenu(contextMenu)
+
+        contextMenu.addSeparator()
+        copyAllAction = contextMenu.addAction('Copy all')
+        copyAllAction.triggered.connect(self.copyAllCoordinates)
+        kindsMenu = contextMenu.addMenu('Coordinate kinds')
+        selected = self.pickKinds()
+        for kind in CoordinatePicker.MenuKinds:
+            action = kindsMenu.addAction(Coordinate.TypeNames[kind])
+            action.setCheckable(True)
+            action.setChecked(kind in selected)
+            action.toggled.connect(partial(self.setPickKindSelected, kind))
+        kindsMenu.addSeparator()
+        rasterValuesAction = kindsMenu.addAction('Raster band values')
+        rasterValuesAction.setCheckable(True)
+        rasterValuesAction.setChecked(QgsSettings().value(CoordinatePicker.RasterValuesKey, True, type=bool))
+        rasterValuesAction.toggled.connect(partial(QgsSettings().setValue, CoordinatePicker.RasterValuesKey))
+        allLayersAction = kindsMenu.addAction('All visible layers')
+        allLayersAction.setCheckable(True)
+        allLayersAction.setChecked(QgsSettings().value(CoordinatePicker.AllLayersKey, False, type=bool))
+        allLayersAction.toggled.connect(partial(QgsSettings().setValue, CoordinatePicker.AllLayersKey))
+
+        return contextMenu
+
+    def addRasterSampleActions(self, menu, sample: RasterSample):
+        """ one action per band, filled in when the values arrive while the menu is open """
+        actions = []
+        for bandName in sample.bandNames:
+            action = menu.addAction('{}: reading...'.format(bandName))
+            action.setEnabled(False)
+            actions.append(action)
+
+        def update(sample):
+            for i, action in enumerate(actions):
+                # the menu may be gone by the time a slow read finishes
+                if sip.isdeleted(action):
+                    return
+                bandName = sample.bandNames[i]
+                if sample.values is None:
+                    action.setText('{}: {}'.format(bandName, sample.error))
+                    continue
+                value = RasterSample.formatValue(sample.values[i])
+                action.setText('{}: {}'.format(bandName, value))
+                action.setEnabled(sample.values[i] is not None)
+                action.triggered.connect(partial(self.copyText, value))
+
+        sample.onDone(update)
+
+    def recordPick(self):
+        """ queue the last pick for the pick history """
+        history = pickHistory()
+        if history is None or self.screenPoint is None:
+            return
+        pickPoint = self.pickPoint(self.screenPoint)
+        wgs84Coord = pickPoint.value(Coordinate.WGS84Coord)
+        if wgs84Coord is None:
+            return
+        layerName = pickPoint.layer.name() if pickPoint.layer is not None else None
+        history.add('pick', wgs84Coord[0], wgs84Coord[1], layerName,
+                    formatCoordinates(self.coordinates + self.layerCoordinates))
+
+    def publishPick(self, screenPoint, source):
+        """ send every coordinate kind of a screen point to the pick stream when it is on, None for unavailable ones
+
+        With all visible layers on the message also lists the point in the crs of every layer group and the
+        raster cells containing it.
+        """
+        try:
+            publisher = pickPublisher()
+        except ValueError as e:
+            self.iface.messageBar().pushMessage("", str(e), level=Qgis.Warning, duration=3)
+            return
+        if publisher is None or screenPoint is None:
+            return
+        pickPoint = self.pickPoint(screenPoint)
+        message = {
+            'type': source,
+            'time': time.time(),
+            'screen': [screenPoint.x(), screenPoint.y()],
+            'layer': pickPoint.layer.name() if pickPoint.layer is not None else None,
+            'coordinates': {Coordinate.TypeNames[kind]: pickPoint.value(kind)
+                            for kind in CoordinatePicker.MenuKinds},
+        }
+        if QgsSettings().value(CoordinatePicker.AllLayersKey, False, type=bool):
+            crsGroups, rasterCells = pickPoint.allLayerCoords(self.mapCanvas.layers())
+            message['layers'] = [{'crs': crs.authid() or crs.description(),
+                                  'layers': [layer.name() for layer in groupLayers], 'coordinate': coord}
+                                 for crs, groupLayers, coord in crsGroups]
+            message['cells'] = [{'layer': layer.name(), 'cell': cell} for layer, cell in rasterCells]
+        publisher.publish(message)
+
+    def addHistoryMenu(self, menu):
+        """ a submenu of the earlier picks and zoom targets near the last pick, a click zooms back to one """
+        history = pickHistory()
+        if history is None or self.screenPoint is None:
+            return
+        wgs84Coord = self.pickPoint(self.screenPoint).value(Coordinate.WGS84Coord)
+        edge = self.pickPoint(QtCore.QPoint(self.screenPoint.x() + CoordinatePicker.HistoryTolerance,
+                                            self.screenPoint.y())).value(Coordinate.WGS84Coord)
+        if wgs84Coord is None or edge is None:
+            return
+        radius = ((edge[0] - wgs84Coord[0]) ** 2 + (edge[1] - wgs84Coord[1]) ** 2) ** 0.5
+        records = history.nearest(wgs84Coord[0], wgs84Coord[1], radius, CoordinatePicker.HistoryMenuSize)
+        if not records:
+            return
+        historyMenu = menu.addMenu('Picked near here')
+        for record in records:
+            action = historyMenu.addAction(record.label())
+            action.triggered.connect(partial(self.replayHistory, record))
+
+    def replayHistory(self, record, *args):
+        from .coordinate_zoom import CoordinateZoom
+        CoordinateZoom(self.iface).replay(record)
+
+    def copyText(self, text):
+        QtWidgets.QApplication.clipboard().setText(text)
+        self.iface.messageBar().pushMessage("", "{} copied to the clipboard".format(text), level=Qgis.Info, duration=1)
+
+    def copyAllCoordinates(self):
+        QtWidgets.QApplication.clipboard().setText(formatCoordinates(self.coordinates + self.layerCoordinates))
+        self.iface.messageBar().pushMessage("", "Coordinates copied to the clipboard", level=Qgis.Info, duration=1)
+
+    def getCoordinateActionTriggeredHandler(self, coordinate):
+        iface = self.iface
+
+        def handler():
+            clipboard = QtWidgets.QApplication.clipboard()
+            clipboard.setText(coordinate.coordinate_str())
+            iface.messageBar().pushMessage("", "{} copied to the clipboard".format(coordinate.coordinate_str()),
+                                           level=Qgis.Info, duration=1)
+
+        return handler
@@ -0,0 +1,12 @@
+""" names of the coordinate systems of coord_transformer.convert_array
+
+They live apart from coord_transformer so the processing provider can list them without importing numpy.
+"""
+
+# ni points are passed as float arrays of their integer values
+WGS84 = 'WGS84'
+GCJ02 = 'GCJ02'
+BD09 = 'BD09'
+NI_ITE = 'NI_ITE'
+NI_ITE_MARS = 'NI_ITE_MARS'
+COORD_SYSTEMS = (WGS84, GCJ02, BD09, NI_ITE, NI_ITE_MARS)
@@ -1,173 +1,856 @@
-from math import pi
-from math import sin, cos, sqrt, fabs, atan2
-
-import numpy as np
-
-# define ellipsoid
-a = 6378245.0
-f = 1 / 298.3
-b = a * (1 - f)
-ee = 1 - (b * b) / (a * a)
-
-
-def outOfChina(lng, lat):
-    """check weather lng and lat out of china
-
-    Arguments:
-        lng {float} -- longitude
-        lat {float} -- latitude
-
-    Returns:
-        Bollen -- True or False
-    """
-    return not (72.004 <= lng <= 137.8347 and 0.8293 <= lat <= 55.8271)
-
-
-def transformLat(x, y):
-    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * sqrt(fabs(x))
-    ret = ret + (20.0 * sin(6.0 * x * pi) + 20.0 * sin(2.0 * x * pi)) * 2.0 / 3.0
-    ret = ret + (20.0 * sin(y * pi) + 40.0 * sin(y / 3.0 * pi)) * 2.0 / 3.0
-    ret = ret + (160.0 * sin(y / 12.0 * pi) + 320.0 * sin(y * pi / 30.0)) * 2.0 / 3.0
-    return ret
-
-
-def transformLon(x, y):
-    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * sqrt(fabs(x))
-    ret = ret + (20.0 * sin(6.0 * x * pi) + 20.0 * sin(2.0 * x * pi)) * 2.0 / 3.0
-    ret = ret + (20.0 * sin(x * pi) + 40.0 * sin(x / 3.0 * pi)) * 2.0 / 3.0
-    ret = ret + (150.0 * sin(x / 12.0 * pi) + 300.0 * sin(x * pi / 30.0)) * 2.0 / 3.0
-    return ret
-
-
-def wgs2gcj(wgsLon, wgsLat):
-    """wgs coord to gcj
-
-    Arguments:
-        wgsLon {float} -- lon
-        wgsLat {float} -- lat
-
-    Returns:
-        tuple -- gcj coords
-    """
-
-    if outOfChina(wgsLon, wgsLat):
-        return wgsLon, wgsLat
-    dLat = transformLat(wgsLon - 105.0, wgsLat - 35.0)
-    dLon = transformLon(wgsLon - 105.0, wgsLat - 35.0)
-    radLat = wgsLat / 180.0 * pi
-    magic = sin(radLat)
-    magic = 1 - ee * magic * magic
-    sqrtMagic = sqrt(magic)
-    dLat = (dLat * 180.0) / ((a * (1 - ee)) / (magic * sqrtMagic) * pi)
-    dLon = (dLon * 180.0) / (a / sqrtMagic * cos(radLat) * pi)
-    gcjLat = wgsLat + dLat
-    gcjLon = wgsLon + dLon
-    return gcjLon, gcjLat
-
-
-def gcj2wgs(gcjLon, gcjLat):
-    g0 = (gcjLon, gcjLat)
-    w0 = g0
-    g1 = wgs2gcj(w0[0], w0[1])
-    # w1 = w0 - (g1 - g0)
-    w1 = tuple(map(lambda x: x[0] - (x[1] - x[2]), zip(w0, g1, g0)))
-    # delta = w1 - w0
-    delta = tuple(map(lambda x: x[0] - x[1], zip(w1, w0)))
-    while abs(delta[0]) >= 1e-6 or abs(delta[1]) >= 1e-6:
-        w0 = w1
-        g1 = wgs2gcj(w0[0], w0[1])
-        # w1 = w0 - (g1 - g0)
-        w1 = tuple(map(lambda x: x[0] - (x[1] - x[2]), zip(w0, g1, g0)))
-        # delta = w1 - w0
-        delta = tuple(map(lambda x: x[0] - x[1], zip(w1, w0)))
-    return w1
-
-
-def gcj2bd(gcjLon, gcjLat):
-    z = sqrt(gcjLon * gcjLon + gcjLat * gcjLat) + 0.00002 * sin(gcjLat * pi * 3000.0 / 180.0)
-    theta = atan2(gcjLat, gcjLon) + 0.000003 * cos(gcjLon * pi * 3000.0 / 180.0)
-    bdLon = z * cos(theta) + 0.0065
-    bdLat = z * sin(theta) + 0.006
-    return bdLon, bdLat
-
-
-def bd2gcj(bdLon, bdLat):
-    x = bdLon - 0.0065
-    y = bdLat - 0.006
-    z = sqrt(x * x + y * y) - 0.00002 * sin(y * pi * 3000.0 / 180.0)
-    theta = atan2(y, x) - 0.000003 * cos(x * pi * 3000.0 / 180.0)
-    gcjLon = z * cos(theta)
-    gcjLat = z * sin(theta)
-    return gcjLon, gcjLat
-
-
-def wgs2bd(wgsLon, wgsLat):
-    gcj = wgs2gcj(wgsLon, wgsLat)
-    return gcj2bd(gcj[0], gcj[1])
-
-
-def bd2wgs(bdLon, bdLat):
-    gcj = bd2gcj(bdLon, bdLat)
-    return gcj2wgs(gcj[0], gcj[1])
-
-
-def lonlat_to_nipoint(lon, lat):
-    # to nds point
-    u = 90 / (2 ** 30)
-    x_coord = int(lon / u)
-    y_coord = int(lat / u)
-
-    x_coord = (np.int64(x_coord) * np.int64(90) * np.int64(100000)) >> 30
-    y_coord = (np.int64(y_coord) * np.int64(90) * np.int64(100000)) >> 30
-
-    return x_coord, y_coord
-
-
-def nipoint_to_lonlat(x, y):
-    u = 90 / (2 ** 30)
-    x = (np.int64(x) << 30) / (np.int64(90) * np.int64(100000)) * u
-    y = (np.int64(y) << 30) / (np.int64(90) * np.int64(100000)) * u
-
-    return x, y
-
-
-class Transform:
-    @staticmethod
-    def transformLat(x, y):
-        return transformLat(x, y)
-
-    @staticmethod
-    def transformLon(x, y):
-        return transformLon(x, y)
-
-    @staticmethod
-    def wgs2gcj(wgsLon, wgsLat):
-        return wgs2gcj(wgsLon, wgsLat)
-
-    @staticmethod
-    def gcj2wgs(gcjLon, gcjLat):
-        return gcj2wgs(gcjLon, gcjLat)
-
-    @staticmethod
-    def gcj2bd(gcjLon, gcjLat):
-        return gcj2bd(gcjLon, gcjLat)
-
-    @staticmethod
-    def bd2gcj(bdLon, bdLat):
-        return bd2gcj(bdLon, bdLat)
-
-    @staticmethod
-    def wgs2bd(wgsLon, wgsLat):
-        return wgs2bd(wgsLon, wgsLat)
-
-    @staticmethod
-    def bd2wgs(bdLon, bdLat):
-        return bd2wgs(bdLon, bdLat)
-
-    @staticmethod
-    def lonlat2nipoint(lon, lat):
-        return lonlat_to_nipoint(lon, lat)
-
-    @staticmethod
-    def nipoint2lonlat(x, y):
-        return nipoint_to_lonlat(x, y)
+from collections import namedtuple
+from math import pi
+from math import sin, cos, sqrt, fabs, atan2
+
+import numpy as np
+
+from .coord_systems import BD09, COORD_SYSTEMS, GCJ02, NI_ITE, NI_ITE_MARS, WGS84
+
+# define ellipsoid
+a = 6378245.0
+f = 1 / 298.3
+b = a * (1 - f)
+ee = 1 - (b * b) / (a * a)
+
+
+def outOfChina(lng, lat):
+    """check weather lng and lat out of china
+
+    Arguments:
+        lng {float} -- longitude
+        lat {float} -- latitude
+
+    Returns:
+        Bollen -- True or False
+    """
+    return not (72.004 <= lng <= 137.8347 and 0.8293 <= lat <= 55.8271)
+
+
+def _clampToChina(lng, lat):
+    # the nearest point of the outOfChina box
+    return min(max(lng, 72.004), 137.8347), min(max(lat, 0.8293), 55.8271)
+
+
+def transformLat(x, y):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * sqrt(fabs(x))
+    ret = ret + (20.0 * sin(6.0 * x * pi) + 20.0 * sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret = ret + (20.0 * sin(y * pi) + 40.0 * sin(y / 3.0 * pi)) * 2.0 / 3.0
+    ret = ret + (160.0 * sin(y / 12.0 * pi) + 320.0 * sin(y * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def transformLon(x, y):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * sqrt(fabs(x))
+    ret = ret + (20.0 * sin(6.0 * x * pi) + 20.0 * sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret = ret + (20.0 * sin(x * pi) + 40.0 * sin(x / 3.0 * pi)) * 2.0 / 3.0
+    ret = ret + (150.0 * sin(x / 12.0 * pi) + 300.0 * sin(x * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def wgs2gcj(wgsLon, wgsLat):
+    """wgs coord to gcj
+
+    Arguments:
+        wgsLon {float} -- lon
+        wgsLat {float} -- lat
+
+    Returns:
+        tuple -- gcj coords
+    """
+
+    if outOfChina(wgsLon, wgsLat):
+        return wgsLon, wgsLat
+    dLat = transformLat(wgsLon - 105.0, wgsLat - 35.0)
+    dLon = transformLon(wgsLon - 105.0, wgsLat - 35.0)
+    radLat = wgsLat / 180.0 * pi
+    magic = sin(radLat)
+    magic = 1 - ee * magic * magic
+    sqrtMagic = sqrt(magic)
+    dLat = (dLat * 180.0) / ((a * (1 - ee)) / (magic * sqrtMagic) * pi)
+    dLon = (dLon * 180.0) / (a / sqrtMagic * cos(radLat) * pi)
+    gcjLat = wgsLat + dLat
+    gcjLon = wgsLon + dLon
+    return gcjLon, gcjLat
+
+
+def gcj2wgs(gcjLon, gcjLat, maxIterations=100):
+    """gcj coord to wgs by fixed-point iteration
+
+    Iterates starting in the outOfChina box are clamped onto it, past its edges the offsets jump to zero and the
+    next step would land back inside. Stops at the better of the last two iterates when an iterate does not lower
+    the residual, which happens within a few hundred meters of the west and south edges of the box where no exact
+    inverse exists.
+
+    Arguments:
+        gcjLon {float} -- lon
+        gcjLat {float} -- lat
+
+    Keyword Arguments:
+        maxIterations {int} -- iteration cap (default: {100})
+
+    Returns:
+        tuple -- wgs coords
+    """
+    wgsLon, wgsLat = gcjLon, gcjLat
+    g1Lon, g1Lat = wgs2gcj(wgsLon, wgsLat)
+    residual = max(abs(g1Lon - gcjLon), abs(g1Lat - gcjLat))
+    for _ in range(maxIterations):
+        # w1 = w0 - (g1 - g0)
+        w1Lon = wgsLon - (g1Lon - gcjLon)
+        w1Lat = wgsLat - (g1Lat - gcjLat)
+        if outOfChina(w1Lon, w1Lat) and not outOfChina(wgsLon, wgsLat):
+            w1Lon, w1Lat = _clampToChina(w1Lon, w1Lat)
+        # delta = w1 - w0
+        if abs(w1Lon - wgsLon) < 1e-6 and abs(w1Lat - wgsLat) < 1e-6:
+            return w1Lon, w1Lat
+        g1Lon, g1Lat = wgs2gcj(w1Lon, w1Lat)
+        r1 = max(abs(g1Lon - gcjLon), abs(g1Lat - gcjLat))
+        if r1 >= residual:
+            return wgsLon, wgsLat
+        wgsLon, wgsLat, residual = w1Lon, w1Lat, r1
+    return wgsLon, wgsLat
+
+
+def gcj2bd(gcjLon, gcjLat):
+    z = sqrt(gcjLon * gcjLon + gcjLat * gcjLat) + 0.00002 * sin(gcjLat * pi * 3000.0 / 180.0)
+    theta = atan2(gcjLat, gcjLon) + 0.000003 * cos(gcjLon * pi * 3000.0 / 180.0)
+    bdLon = z * cos(theta) + 0.0065
+    bdLat = z * sin(theta) + 0.006
+    return bdLon, bdLat
+
+
+def bd2gcj(bdLon, bdLat):
+    x = bdLon - 0.0065
+    y = bdLat - 0.006
+    z = sqrt(x * x + y * y) - 0.00002 * sin(y * pi * 3000.0 / 180.0)
+    theta = atan2(y, x) - 0.000003 * cos(x * pi * 3000.0 / 180.0)
+    gcjLon = z * cos(theta)
+    gcjLat = z * sin(theta)
+    return gcjLon, gcjLat
+
+
+def wgs2bd(wgsLon, wgsLat):
+    gcj = wgs2gcj(wgsLon, wgsLat)
+    return gcj2bd(gcj[0], gcj[1])
+
+
+def bd2wgs(bdLon, bdLat):
+    gcj = bd2gcj(bdLon, bdLat)
+    return gcj2wgs(gcj[0], gcj[1])
+
+
+def _as_arrays(lon, lat):
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    return np.broadcast_arrays(lon, lat)
+
+
+# numpy's own arctan2 may differ from the C library in the last bit, route it through math.atan2 so the
+# array transforms match the scalar ones exactly
+_atan2_ufunc = np.frompyfunc(atan2, 2, 1)
+
+
+def _atan2_array(y, x):
+    return np.asarray(_atan2_ufunc(y, x), dtype=np.float64)
+
+
+def _out_arrays(out, shape, dtype=np.float64):
+    if out is None:
+        return np.empty(shape, dtype=dtype), np.empty(shape, dtype=dtype)
+    outLon, outLat = out
+    if outLon.shape != shape or outLat.shape != shape:
+        raise ValueError('out arrays must have shape {}'.format(shape))
+    return outLon, outLat
+
+
+def outOfChina_array(lng, lat):
+    """element-wise version of outOfChina
+
+    Arguments:
+        lng {ndarray} -- longitudes
+        lat {ndarray} -- latitudes
+
+    Returns:
+        ndarray -- boolean mask, True where the point is out of china
+    """
+    lng, lat = _as_arrays(lng, lat)
+    return ~((72.004 <= lng) & (lng <= 137.8347) & (0.8293 <= lat) & (lat <= 55.8271))
+
+
+def _clampToChina_array(lng, lat):
+    return np.clip(lng, 72.004, 137.8347), np.clip(lat, 0.8293, 55.8271)
+
+
+def transformLat_array(x, y):
+    x, y = _as_arrays(x, y)
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.fabs(x))
+    ret = ret + (20.0 * np.sin(6.0 * x * pi) + 20.0 * np.sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret = ret + (20.0 * np.sin(y * pi) + 40.0 * np.sin(y / 3.0 * pi)) * 2.0 / 3.0
+    ret = ret + (160.0 * np.sin(y / 12.0 * pi) + 320.0 * np.sin(y * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def transformLon_array(x, y):
+    x, y = _as_arrays(x, y)
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.fabs(x))
+    ret = ret + (20.0 * np.sin(6.0 * x * pi) + 20.0 * np.sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret = ret + (20.0 * np.sin(x * pi) + 40.0 * np.sin(x / 3.0 * pi)) * 2.0 / 3.0
+    ret = ret + (150.0 * np.sin(x / 12.0 * pi) + 300.0 * np.sin(x * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def gcj_offsets_array(wgsLon, wgsLat):
+    """gcj - wgs offsets in degrees, evaluated everywhere without the out of china check
+
+    Arguments:
+        wgsLon {ndarray} -- lon
+        wgsLat {ndarray} -- lat
+
+    Returns:
+        tuple -- lon and lat offset arrays
+    """
+    wgsLon, wgsLat = _as_arrays(wgsLon, wgsLat)
+    dLat = transformLat_array(wgsLon - 105.0, wgsLat - 35.0)
+    dLon = transformLon_array(wgsLon - 105.0, wgsLat - 35.0)
+    radLat = wgsLat / 180.0 * pi
+    magic = np.sin(radLat)
+    magic = 1 - ee * magic * magic
+    sqrtMagic = np.sqrt(magic)
+    dLat = (dLat * 180.0) / ((a * (1 - ee)) / (magic * sqrtMagic) * pi)
+    dLon = (dLon * 180.0) / (a / sqrtMagic * np.cos(radLat) * pi)
+    return dLon, dLat
+
+
+def wgs2gcj_array(wgsLon, wgsLat, out=None):
+    """wgs coords to gcj, element by element
+
+    Points out of china are returned unchanged, exactly like wgs2gcj.
+
+    Arguments:
+        wgsLon {ndarray} -- lon
+        wgsLat {ndarray} -- lat
+
+    Keyword Arguments:
+        out {tuple} -- optional (lon, lat) arrays receiving the result, they may be the input arrays (default: {None})
+
+    Returns:
+        tuple -- gcj lon and lat arrays
+    """
+    wgsLon, wgsLat = _as_arrays(wgsLon, wgsLat)
+    inChina = ~outOfChina_array(wgsLon, wgsLat)
+    dLon, dLat = gcj_offsets_array(wgsLon, wgsLat)
+
+    gcjLon, gcjLat = _out_arrays(out, wgsLon.shape)
+    np.copyto(gcjLon, wgsLon)
+    np.copyto(gcjLat, wgsLat)
+    np.add(gcjLon, dLon, out=gcjLon, where=inChina)
+    np.add(gcjLat, dLat, out=gcjLat, where=inChina)
+    return gcjLon, gcjLat
+
+
+def _wgs2gcj_jacobian(wgsLon, wgsLat):
+    # partial derivatives of wgs2gcj, the latitude dependent scale factors are held constant
+    x = wgsLon - 105.0
+    y = wgsLat - 35.0
+    radLat = wgsLat / 180.0 * pi
+    magic = np.sin(radLat)
+    magic = 1 - ee * magic * magic
+    sqrtMagic = np.sqrt(magic)
+    kLat = 180.0 / ((a * (1 - ee)) / (magic * sqrtMagic) * pi)
+    kLon = 180.0 / (a / sqrtMagic * np.cos(radLat) * pi)
+
+    # the sqrt(fabs(x)) terms have a cusp at x == 0, keep their slope finite
+    dSqrt = np.sign(x) * 0.5 / np.sqrt(np.maximum(np.fabs(x), 1e-8))
+    common = (120.0 * pi * np.cos(6.0 * x * pi) + 40.0 * pi * np.cos(2.0 * x * pi)) * 2.0 / 3.0
+
+    dLatDx = 2.0 + 0.1 * y + 0.2 * dSqrt + common
+    dLatDy = 3.0 + 0.4 * y + 0.1 * x
+    dLatDy = dLatDy + (20.0 * pi * np.cos(y * pi) + 40.0 / 3.0 * pi * np.cos(y / 3.0 * pi)) * 2.0 / 3.0
+    dLatDy = dLatDy + (40.0 / 3.0 * pi * np.cos(y / 12.0 * pi) + 32.0 / 3.0 * pi * np.cos(y * pi / 30.0)) * 2.0 / 3.0
+    dLonDx = 1.0 + 0.2 * x + 0.1 * y + 0.1 * dSqrt + common
+    dLonDx = dLonDx + (20.0 * pi * np.cos(x * pi) + 40.0 / 3.0 * pi * np.cos(x / 3.0 * pi)) * 2.0 / 3.0
+    dLonDx = dLonDx + (12.5 * pi * np.cos(x / 12.0 * pi) + 10.0 * pi * np.cos(x * pi / 30.0)) * 2.0 / 3.0
+    dLonDy = 2.0 + 0.1 * x
+
+    inChina = ~outOfChina_array(wgsLon, wgsLat)
+    return (1.0 + inChina * kLon * dLonDx, inChina * kLon * dLonDy,
+            inChina * kLat * dLatDx, 1.0 + inChina * kLat * dLatDy)
+
+
+def _fixed_point_step(wgsLon, wgsLat, rLon, rLat):
+    # w1 = w0 - (g1 - g0)
+    return wgsLon - rLon, wgsLat - rLat
+
+
+def _newton_step(wgsLon, wgsLat, rLon, rLat, jacobian):
+    j11, j12, j21, j22 = jacobian
+    det = j11 * j22 - j12 * j21
+    return wgsLon - (j22 * rLon - j12 * rLat) / det, wgsLat - (j11 * rLat - j21 * rLon) / det
+
+
+InverseResult = namedtuple('InverseResult', ['lon', 'lat', 'iterations', 'residual'])
+
+
+def gcj2wgs_solve(gcjLon, gcjLat, tolerance=1e-6, maxIterations=100, method='fixed', out=None):
+    """batch inverse of wgs2gcj
+
+    Only the points that have not converged yet are iterated, a point is converged once its update drops
+    below tolerance in both lon and lat. The 'fixed' method is the fixed-point iteration of gcj2wgs and gives
+    identical results with the default tolerance. 'newton' solves with the jacobian of the offsets taken once at
+    the start point, it converges about ten times faster per iteration and usually saves one iteration.
+
+    Iterates starting in the outOfChina box are clamped onto it: past its edges the offsets jump to zero and the
+    next step would land back inside, so a point whose inverse lies just inside an edge would never get there. A
+    point also stops, at the better of its last two iterates, when an iterate does not lower the residual. Near the
+    west and south edges of the box there is no exact inverse for some points, the iterates would oscillate until
+    the cap.
+
+    Arguments:
+        gcjLon {ndarray} -- lon
+        gcjLat {ndarray} -- lat
+
+    Keyword Arguments:
+        tolerance {float} -- convergence threshold in degrees (default: {1e-6})
+        maxIterations {int} -- iteration cap, None for no cap (default: {100})
+        method {str} -- 'fixed' or 'newton' (default: {'fixed'})
+        out {tuple} -- optional (lon, lat) arrays receiving the result (default: {None})
+
+    Returns:
+        InverseResult -- wgs lon and lat arrays, the iterations spent on every point and the residual
+                         max(|wgs2gcj(wgs) - gcj|) in degrees
+    """
+    if method not in ('fixed', 'newton'):
+        raise ValueError('unknown inverse method: {}'.format(method))
+
+    gcjLon, gcjLat = _as_arrays(gcjLon, gcjLat)
+    shape = gcjLon.shape
+    g0Lon = gcjLon.ravel()
+    g0Lat = gcjLat.ravel()
+    wLon = g0Lon.copy()
+    wLat = g0Lat.copy()
+    iterations = np.zeros(g0Lon.shape, dtype=np.int32)
+    jacobian = _wgs2gcj_jacobian(g0Lon, g0Lat) if method == 'newton' else None
+
+    # residuals g1 - g0 of the current iterates
+    gLon, gLat = wgs2gcj_array(wLon, wLat)
+    rLon = gLon - g0Lon
+    rLat = gLat - g0Lat
+    residual = np.maximum(np.abs(rLon), np.abs(rLat))
+
+    active = np.arange(g0Lon.size)
+    iteration = 0
+    while active.size and (maxIterations is None or iteration < maxIterations):
+        iteration += 1
+        w0Lon = wLon[active]
+        w0Lat = wLat[active]
+        if jacobian is None:
+            w1Lon, w1Lat = _fixed_point_step(w0Lon, w0Lat, rLon[active], rLat[active])
+        else:
+            w1Lon, w1Lat = _newton_step(w0Lon, w0Lat, rLon[active], rLat[active], [j[active] for j in jacobian])
+        inside = ~outOfChina_array(w0Lon, w0Lat)
+        clampedLon, clampedLat = _clampToChina_array(w1Lon, w1Lat)
+        w1Lon = np.where(inside, clampedLon, w1Lon)
+        w1Lat = np.where(inside, clampedLat, w1Lat)
+        g1Lon, g1Lat = wgs2gcj_array(w1Lon, w1Lat)
+        r1Lon = g1Lon - g0Lon[active]
+        r1Lat = g1Lat - g0Lat[active]
+        r1 = np.maximum(np.abs(r1Lon), np.abs(r1Lat))
+        r0 = residual[active]
+
+        # delta = w1 - w0
+        converged = (np.abs(w1Lon - w0Lon) < tolerance) & (np.abs(w1Lat - w0Lat) < tolerance)
+        stalled = ~converged & (r1 >= r0)
+        accepted = ~stalled
+        moved = active[accepted]
+        wLon[moved] = w1Lon[accepted]
+        wLat[moved] = w1Lat[accepted]
+        rLon[moved] = r1Lon[accepted]
+        rLat[moved] = r1Lat[accepted]
+        residual[moved] = r1[accepted]
+        iterations[active] = iteration
+        active = active[~(converged | stalled)]
+
+    outLon, outLat = _out_arrays(out, shape)
+    np.copyto(outLon, wLon.reshape(shape))
+    np.copyto(outLat, wLat.reshape(shape))
+    return InverseResult(outLon, outLat, iterations.reshape(shape), residual.reshape(shape))
+
+
+def gcj2wgs_array(gcjLon, gcjLat, out=None):
+    """gcj coords to wgs, element by element
+
+    Runs the same fixed-point iteration as gcj2wgs with the same cap of 100 iterations, see gcj2wgs_solve for a
+    configurable solver.
+
+    Arguments:
+        gcjLon {ndarray} -- lon
+        gcjLat {ndarray} -- lat
+
+    Keyword Arguments:
+        out {tuple} -- optional (lon, lat) arrays receiving the result (default: {None})
+
+    Returns:
+        tuple -- wgs lon and lat arrays
+    """
+    result = gcj2wgs_solve(gcjLon, gcjLat, out=out)
+    return result.lon, result.lat
+
+
+def gcj2bd_array(gcjLon, gcjLat, out=None):
+    gcjLon, gcjLat = _as_arrays(gcjLon, gcjLat)
+    z = np.sqrt(gcjLon * gcjLon + gcjLat * gcjLat) + 0.00002 * np.sin(gcjLat * pi * 3000.0 / 180.0)
+    theta = _atan2_array(gcjLat, gcjLon) + 0.000003 * np.cos(gcjLon * pi * 3000.0 / 180.0)
+    bdLon, bdLat = _out_arrays(out, gcjLon.shape)
+    np.add(z * np.cos(theta), 0.0065, out=bdLon)
+    np.add(z * np.sin(theta), 0.006, out=bdLat)
+    return bdLon, bdLat
+
+
+def bd2gcj_array(bdLon, bdLat, out=None):
+    bdLon, bdLat = _as_arrays(bdLon, bdLat)
+    x = bdLon - 0.0065
+    y = bdLat - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * pi * 3000.0 / 180.0)
+    theta = _atan2_array(y, x) - 0.000003 * np.cos(x * pi * 3000.0 / 180.0)
+    gcjLon, gcjLat = _out_arrays(out, x.shape)
+    np.multiply(z, np.cos(theta), out=gcjLon)
+    np.multiply(z, np.sin(theta), out=gcjLat)
+    return gcjLon, gcjLat
+
+
+def wgs2bd_array(wgsLon, wgsLat, out=None):
+    gcj = wgs2gcj_array(wgsLon, wgsLat, out=out)
+    return gcj2bd_array(gcj[0], gcj[1], out=gcj)
+
+
+def bd2wgs_array(bdLon, bdLat, out=None):
+    gcj = bd2gcj_array(bdLon, bdLat, out=out)
+    return gcj2wgs_array(gcj[0], gcj[1], out=gcj)
+
+
+def bd2wgs_solve(bdLon, bdLat, tolerance=1e-6, maxIterations=100, method='fixed', out=None):
+    """batch inverse of wgs2bd, see gcj2wgs_solve"""
+    gcj = bd2gcj_array(bdLon, bdLat, out=out)
+    return gcj2wgs_solve(gcj[0], gcj[1], tolerance=tolerance, maxIterations=maxIterations, method=method, out=gcj)
+
+
+# nds coordinates split 90 degrees into 2^30 units, ni coordinates are in 1e-5 degrees
+NDS_UNIT = 90 / (2 ** 30)
+NI_SCALE = 90 * 100000
+NDS_MAX_LEVEL = 15
+
+
+def lonlat_to_nipoint(lon, lat):
+    # to nds point
+    x_coord = int(lon / NDS_UNIT)
+    y_coord = int(lat / NDS_UNIT)
+
+    x_coord = (x_coord * NI_SCALE) >> 30
+    y_coord = (y_coord * NI_SCALE) >> 30
+
+    return x_coord, y_coord
+
+
+def nipoint_to_lonlat(x, y):
+    x = (int(x) << 30) / NI_SCALE * NDS_UNIT
+    y = (int(y) << 30) / NI_SCALE * NDS_UNIT
+
+    return x, y
+
+
+def lonlat_to_nipoint_array(lon, lat, out=None):
+    """lon/lat arrays to ni points, same results as lonlat_to_nipoint
+
+    Arguments:
+        lon {ndarray} -- lon
+        lat {ndarray} -- lat
+
+    Keyword Arguments:
+        out {tuple} -- optional (x, y) int64 arrays receiving the result (default: {None})
+
+    Returns:
+        tuple -- int64 x and y arrays
+    """
+    lon, lat = _as_arrays(lon, lat)
+    x, y = _out_arrays(out, lon.shape, dtype=np.int64)
+    # the float to int64 cast truncates towards zero like int()
+    x[...] = lon / NDS_UNIT
+    y[...] = lat / NDS_UNIT
+    np.multiply(x, NI_SCALE, out=x)
+    np.multiply(y, NI_SCALE, out=y)
+    # arithmetic shift, rounds towards negative infinity like the python >>
+    np.right_shift(x, 30, out=x)
+    np.right_shift(y, 30, out=y)
+    return x, y
+
+
+def nipoint_to_lonlat_array(x, y, out=None):
+    """ni point arrays to lon/lat, same results as nipoint_to_lonlat
+
+    Arguments:
+        x {ndarray} -- x
+        y {ndarray} -- y
+
+    Keyword Arguments:
+        out {tuple} -- optional (lon, lat) arrays receiving the result (default: {None})
+
+    Returns:
+        tuple -- lon and lat arrays
+    """
+    x = np.asarray(x).astype(np.int64)
+    y = np.asarray(y).astype(np.int64)
+    x, y = np.broadcast_arrays(x, y)
+    lon, lat = _out_arrays(out, x.shape)
+    np.multiply(np.left_shift(x, 30) / NI_SCALE, NDS_UNIT, out=lon)
+    np.multiply(np.left_shift(y, 30) / NI_SCALE, NDS_UNIT, out=lat)
+    return lon, lat
+
+
+def _check_coord_system(system):
+    if system not in COORD_SYSTEMS:
+        raise ValueError('unknown coordinate system {}, expected one of {}'.format(system, ', '.join(COORD_SYSTEMS)))
+
+
+def to_wgs_array(x, y, system, grid=None):
+    """coordinate arrays of system to wgs lon/lat
+
+    Arguments:
+        x {ndarray} -- lon or ni x
+        y {ndarray} -- lat or ni y
+        system {str} -- one of COORD_SYSTEMS
+
+    Keyword Arguments:
+        grid {GcjOffsetGrid} -- interpolate the gcj offsets from this grid instead of solving (default: {None})
+
+    Returns:
+        tuple -- wgs lon and lat arrays
+    """
+    _check_coord_system(system)
+    gcj2wgs = gcj2wgs_array if grid is None else grid.gcj2wgs
+    if system == WGS84:
+        return _as_arrays(x, y)
+    if system == GCJ02:
+        return gcj2wgs(x, y)
+    if system == BD09:
+        gcj = bd2gcj_array(x, y)
+        return gcj2wgs(gcj[0], gcj[1], out=gcj)
+    lonlat = nipoint_to_lonlat_array(x, y)
+    if system == NI_ITE_MARS:
+        return gcj2wgs(lonlat[0], lonlat[1], out=lonlat)
+    return lonlat
+
+
+def from_wgs_array(lon, lat, system, grid=None):
+    """wgs lon/lat arrays to coordinates of system, see to_wgs_array"""
+    _check_coord_system(system)
+    wgs2gcj = wgs2gcj_array if grid is None else grid.wgs2gcj
+    if system == WGS84:
+        return _as_arrays(lon, lat)
+    if system == GCJ02:
+        return wgs2gcj(lon, lat)
+    if system == BD09:
+        gcj = wgs2gcj(lon, lat)
+        return gcj2bd_array(gcj[0], gcj[1], out=gcj)
+    if system == NI_ITE_MARS:
+        lon, lat = wgs2gcj(lon, lat)
+    x, y = lonlat_to_nipoint_array(lon, lat)
+    return x.astype(np.float64), y.astype(np.float64)
+
+
+def convert_array(x, y, source, target, grid=None):
+    """coordinate arrays of the source system to the target system, through wgs
+
+    Arguments:
+        x {ndarray} -- lon or ni x
+        y {ndarray} -- lat or ni y
+        source {str} -- one of COORD_SYSTEMS
+        target {str} -- one of COORD_SYSTEMS
+
+    Keyword Arguments:
+        grid {GcjOffsetGrid} -- interpolate the gcj offsets from this grid (default: {None})
+
+    Returns:
+        tuple -- x and y arrays in the target system
+    """
+    _check_coord_system(target)
+    if source == target:
+        x, y = _as_arrays(x, y)
+        return x.copy(), y.copy()
+    lon, lat = to_wgs_array(x, y, source, grid)
+    return from_wgs_array(lon, lat, target, grid)
+
+
+def _part1by1(v):
+    # spread the lower 16 bits of v to the even bits
+    v = v & 0x0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+def _compact1by1(v):
+    # gather the even bits of v back into the lower 16 bits
+    v = v & 0x55555555
+    v = (v | (v >> 1)) & 0x33333333
+    v = (v | (v >> 2)) & 0x0F0F0F0F
+    v = (v | (v >> 4)) & 0x00FF00FF
+    v = (v | (v >> 8)) & 0x0000FFFF
+    return v
+
+
+def _check_nds_level(level):
+    if not 0 <= level <= NDS_MAX_LEVEL:
+        raise ValueError('nds level must be within 0 and {}, got {}'.format(NDS_MAX_LEVEL, level))
+
+
+def nds_tile_id(lon, lat, level):
+    """packed nds tile id of the tile containing lon/lat
+
+    The tile number is the morton code of the level + 1 most significant bits of the 32 bit nds x and the
+    level most significant bits of the 31 bit nds y, the packed id sets bit 16 + level on top of it.
+
+    Arguments:
+        lon {float} -- lon
+        lat {float} -- lat
+        level {int} -- nds level, 0 to 15
+
+    Returns:
+        int -- packed tile id
+    """
+    _check_nds_level(level)
+    x = int(lon / NDS_UNIT) & 0xFFFFFFFF
+    y = int(lat / NDS_UNIT) & 0x7FFFFFFF
+    shift = 31 - level
+    return _part1by1(x >> shift) | (_part1by1(y >> shift) << 1) | (1 << (16 + level))
+
+
+def nds_tile_id_array(lon, lat, level, out=None):
+    """packed nds tile ids of lon/lat arrays, see nds_tile_id
+
+    Arguments:
+        lon {ndarray} -- lon
+        lat {ndarray} -- lat
+        level {int} -- nds level, 0 to 15
+
+    Keyword Arguments:
+        out {ndarray} -- optional int64 array receiving the result (default: {None})
+
+    Returns:
+        ndarray -- int64 packed tile ids
+    """
+    _check_nds_level(level)
+    lon, lat = _as_arrays(lon, lat)
+    if out is None:
+        out = np.empty(lon.shape, dtype=np.int64)
+    elif out.shape != lon.shape:
+        raise ValueError('out array must have shape {}'.format(lon.shape))
+    shift = 31 - level
+    out[...] = lon / NDS_UNIT
+    out &= 0xFFFFFFFF
+    out >>= shift
+    y = (lat / NDS_UNIT).astype(np.int64)
+    y &= 0x7FFFFFFF
+    y >>= shift
+    out[...] = _part1by1(out)
+    out |= _part1by1(y) << 1
+    out |= 1 << (16 + level)
+    return out
+
+
+def nds_tile_decode(tileId):
+    """split a packed nds tile id
+
+    Arguments:
+        tileId {int} -- packed tile id
+
+    Returns:
+        tuple -- level, tile x and tile y
+    """
+    level = int(tileId).bit_length() - 17
+    _check_nds_level(level)
+    tileNumber = tileId - (1 << (16 + level))
+    return level, _compact1by1(tileNumber), _compact1by1(tileNumber >> 1)
+
+
+def nds_tile_decode_array(tileIds):
+    """split packed nds tile ids, the ids may be of different levels
+
+    Arguments:
+        tileIds {ndarray} -- packed tile ids
+
+    Returns:
+        tuple -- int64 level, tile x and tile y arrays
+    """
+    tileIds = np.asarray(tileIds, dtype=np.int64)
+    # exponent of the float is the bit length of the id
+    level = np.frexp(tileIds.astype(np.float64))[1].astype(np.int64) - 17
+    if level.size and (level.min() < 0 or level.max() > NDS_MAX_LEVEL):
+        raise ValueError('nds tile ids must be of level 0 to {}'.format(NDS_MAX_LEVEL))
+    tileNumber = tileIds - np.left_shift(1, 16 + level)
+    return level, _compact1by1(tileNumber), _compact1by1(tileNumber >> 1)
+
+
+def nds_tile_bounds(tileId):
+    """lon/lat bounds of a packed nds tile id
+
+    Arguments:
+        tileId {int} -- packed tile id
+
+    Returns:
+        tuple -- min lon, min lat, max lon, max lat
+    """
+    level, tileX, tileY = nds_tile_decode(tileId)
+    shift = 31 - level
+    x = tileX << shift
+    y = tileY << shift
+    # back from the 32 bit and 31 bit two's complement
+    if x >= 1 << 31:
+        x -= 1 << 32
+    if y >= 1 << 30:
+        y -= 1 << 31
+    if level == 0:
+        # a level 0 tile spans all latitudes
+        y = -(1 << 30)
+    size = (1 << shift) * NDS_UNIT
+    return x * NDS_UNIT, y * NDS_UNIT, x * NDS_UNIT + size, y * NDS_UNIT + size
+
+
+def nds_tile_bounds_array(tileIds):
+    """lon/lat bounds of packed nds tile ids, see nds_tile_bounds
+
+    Arguments:
+        tileIds {ndarray} -- packed tile ids
+
+    Returns:
+        tuple -- min lon, min lat, max lon and max lat arrays
+    """
+    level, tileX, tileY = nds_tile_decode_array(tileIds)
+    shift = 31 - level
+    x = tileX << shift
+    y = tileY << shift
+    x = np.where(x >= 1 << 31, x - (1 << 32), x)
+    y = np.where(y >= 1 << 30, y - (1 << 31), y)
+    y = np.where(level == 0, -(1 << 30), y)
+    size = np.left_shift(1, shift) * NDS_UNIT
+    return x * NDS_UNIT, y * NDS_UNIT, x * NDS_UNIT + size, y * NDS_UNIT + size
+
+
+class Transform:
+    @staticmethod
+    def transformLat(x, y):
+        return transformLat(x, y)
+
+    @staticmethod
+    def transformLon(x, y):
+        return transformLon(x, y)
+
+    @staticmethod
+    def wgs2gcj(wgsLon, wgsLat):
+        return wgs2gcj(wgsLon, wgsLat)
+
+    @staticmethod
+    def gcj2wgs(gcjLon, gcjLat):
+        return gcj2wgs(gcjLon, gcjLat)
+
+    @staticmethod
+    def gcj2bd(gcjLon, gcjLat):
+        return gcj2bd(gcjLon, gcjLat)
+
+    @staticmethod
+    def bd2gcj(bdLon, bdLat):
+        return bd2gcj(bdLon, bdLat)
+
+    @staticmethod
+    def wgs2bd(wgsLon, wgsLat):
+        return wgs2bd(wgsLon, wgsLat)
+
+    @staticmethod
+    def bd2wgs(bdLon, bdLat):
+        return bd2wgs(bdLon, bdLat)
+
+    @staticmethod
+    def transformLat_array(x, y):
+        return transformLat_array(x, y)
+
+    @staticmethod
+    def transformLon_array(x, y):
+        return transformLon_array(x, y)
+
+    @staticmethod
+    def outOfChina_array(lng, lat):
+        return outOfChina_array(lng, lat)
+
+    @staticmethod
+    def gcj_offsets_array(wgsLon, wgsLat):
+        return gcj_offsets_array(wgsLon, wgsLat)
+
+    @staticmethod
+    def wgs2gcj_array(wgsLon, wgsLat, out=None):
+        return wgs2gcj_array(wgsLon, wgsLat, out=out)
+
+    @staticmethod
+    def gcj2wgs_array(gcjLon, gcjLat, out=None):
+        return gcj2wgs_array(gcjLon, gcjLat, out=out)
+
+    @staticmethod
+    def gcj2bd_array(gcjLon, gcjLat, out=None):
+        return gcj2bd_array(gcjLon, gcjLat, out=out)
+
+    @staticmethod
+    def bd2gcj_array(bdLon, bdLat, out=None):
+        return bd2gcj_array(bdLon, bdLat, out=out)
+
+    @staticmethod
+    def wgs2bd_array(wgsLon, wgsLat, out=None):
+        return wgs2bd_array(wgsLon, wgsLat, out=out)
+
+    @staticmethod
+    def bd2wgs_array(bdLon, bdLat, out=None):
+        return bd2wgs_array(bdLon, bdLat, out=out)
+
+    @staticmethod
+    def gcj2wgs_solve(gcjLon, gcjLat, tolerance=1e-6, maxIterations=100, method='fixed', out=None):
+        return gcj2wgs_solve(gcjLon, gcjLat, tolerance=tolerance, maxIterations=maxIterations, method=method,
+                             out=out)
+
+    @staticmethod
+    def bd2wgs_solve(bdLon, bdLat, tolerance=1e-6, maxIterations=100, method='fixed', out=None):
+        return bd2wgs_solve(bdLon, bdLat, tolerance=tolerance, maxIterations=maxIterations, method=method, out=out)
+
+    @staticmethod
+    def lonlat2nipoint(lon, lat):
+        return lonlat_to_nipoint(lon, lat)
+
+    @staticmethod
+    def nipoint2lonlat(x, y):
+        return nipoint_to_lonlat(x, y)
+
+    @staticmethod
+    def lonlat2nipoint_array(lon, lat, out=None):
+        return lonlat_to_nipoint_array(lon, lat, out=out)
+
+    @staticmethod
+    def nipoint2lonlat_array(x, y, out=None):
+        return nipoint_to_lonlat_array(x, y, out=out)
+
+    @staticmethod
+    def convert_array(x, y, source, target, grid=None):
+        return convert_array(x, y, source, target, grid)
+
+    @staticmethod
+    def lonlat2ndstile(lon, lat, level):
+        return nds_tile_id(lon, lat, level)
+
+    @staticmethod
+    def lonlat2ndstile_array(lon, lat, level, out=None):
+        return nds_tile_id_array(lon, lat, level, out=out)
+
+    @staticmethod
+    def ndstile2bounds(tileId):
+        return nds_tile_bounds(tileId)
+
+    @staticmethod
+    def ndstile2bounds_array(tileIds):
+        return nds_tile_bounds_array(tileIds)
@@ -1,192 +1,384 @@
-from collections import namedtuple
-
-from PyQt5.QtWidgets import QToolButton
-from qgis.PyQt.QtWidgets import QAction, QApplication
-from qgis.core import Qgis, QgsPointXY, QgsCoordinateTransform, QgsCsException, \
-    QgsCoordinateReferenceSystem, QgsRasterLayer, QgsRectangle
-from qgis.core import (
-    QgsProject,
-    QgsSettings
-)
-from qgis.gui import QgisInterface
-
-from .coord_transformer import Transform
-
-epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
-
-ZoomClass = namedtuple('ZoomClass', ['icon', 'name'])
-RasterCoord = namedtuple('RasterCoord', ['row', 'col', 'index'])
-
-
-class CoordinateZoom:
-    LayerCoord = ZoomClass('icons/zoom_layer.svg', 'Layer Coord')
-    ProjectCoord = ZoomClass('icons/zoom_project.svg', 'Project Coord')
-    WGS84Coord = ZoomClass('icons/zoom_wgs84.svg', 'WGS84 Coord')
-    RasterPixelCord = ZoomClass('icons/zoom_rast_coord.svg', 'RasterPixel Coord')
-    RasterPixelIndex = ZoomClass('icons/zoom_rast_idx.svg', 'RasterPixel Index')
-    NI_ITE = ZoomClass('icons/zoom_ni_ite.svg', 'NI_ITE Coord')
-    NI_ITE_MARS = ZoomClass('icons/zoom_ni_ite_mars.svg', 'NI_ITE_MARS Coord')
-
-    ZoomClasses = [LayerCoord, ProjectCoord, WGS84Coord, RasterPixelCord, RasterPixelIndex, NI_ITE, NI_ITE_MARS]
-
-    def __init__(self, iface):
-        self._iface = iface
-
-    @staticmethod
-    def parseCoordinateStr(coordStr: str):
-        try:
-            coordStr = coordStr.strip()
-            if coordStr.startswith("("):
-                coordStr = coordStr[1:]
-                coordStr = coordStr.strip()
-            if coordStr.endswith(")"):
-                coordStr = coordStr[:-1]
-                coordStr = coordStr.strip()
-            coords = coordStr.split(",")
-            if len(coords) == 1:
-                index = int(coords[0].strip())
-                return tuple([index])
-            elif len(coords) == 2:
-                x = float(coords[0].strip())
-                y = float(coords[1].strip())
-                return x, y
-            else:
-                return None
-        except Exception:
-            return None
-
-    def createZoomHandler(self, zoomType: ZoomClass, toolBtn: QToolButton, action: QAction, defaultZoomKey):
-        def handler():
-            iface = self._iface
-            clipboard = QApplication.clipboard()
-            if not clipboard.mimeData().hasText():
-                iface.messageBar().pushMessage("", "Clipboard is empty", level=Qgis.Warning, duration=3)
-                return
-
-            coordStr = unicode(clipboard.text())
-            if self.zoom(coordStr, zoomType):
-                QgsSettings().setValue(defaultZoomKey, zoomType.name)
-                toolBtn.setDefaultAction(action)
-
-        return handler
-
-    def zoom(self, coordStr, zoomType: ZoomClass):
-        iface = self._iface
-
-        coords = CoordinateZoom.parseCoordinateStr(coordStr)
-        if coords is None:
-            iface.messageBar().pushMessage("", "Failed parse coordinate string: {}".format(coordStr),
-                                           level=Qgis.Warning, duration=3)
-            return
-
-        if zoomType != CoordinateZoom.RasterPixelIndex and len(coords) == 1:
-            iface.messageBar().pushMessage("", "Failed parse coordinate string: {}".format(coordStr),
-                                           level=Qgis.Warning, duration=3)
-            return
-
-        return self._zoomToCoords(coords, zoomType)
-
-    def transformToProjectCoord(self, srcCrs, coord):
-        iface: QgisInterface = self._iface
-        projectCrs = iface.mapCanvas().mapSettings().destinationCrs()
-
-        if not srcCrs.isValid() or not projectCrs.isValid():
-            iface.messageBar().pushMessage("",
-                                           "Coordinate transform failed, still zooming as project crs: {}, {}".format(
-                                               coord[0], coord[1]), level=Qgis.Warning, duration=3)
-            return coord
-        transform = QgsCoordinateTransform(srcCrs, projectCrs, QgsProject.instance())
-        try:
-            pt = transform.transform(coord[0], coord[1])
-            return pt.x(), pt.y()
-        except QgsCsException:
-            iface.messageBar().pushMessage("", "Failed to transform coordinates: {}, {}".format(coord[0], coord[1]),
-                                           level=Qgis.Warning, duration=3)
-            return None
-
-    def layerCoordToProjectCoord(self, layer, coord):
-        iface: QgisInterface = self._iface
-
-        if layer is None:
-            iface.messageBar().pushMessage("", "No active layer to zoom to", level=Qgis.Warning, duration=3)
-            return None
-
-        return self.transformToProjectCoord(layer.crs(), coord)
-
-    def rasterCoordToLayerCoord(self, layer, rasterCoord):
-        iface: QgisInterface = self._iface
-
-        if isinstance(layer, QgsRasterLayer):
-            if len(rasterCoord) == 2:
-                # raster coord is (row, col)
-                row = int(rasterCoord[0])
-                col = int(rasterCoord[1])
-            elif len(rasterCoord) == 1:
-                # raster coord is cell index
-                row = int(rasterCoord[0] / layer.width())
-                col = int(rasterCoord[0] % layer.width())
-            else:
-                iface.messageBar().pushMessage("", "Invalid raster coordinate", level=Qgis.Warning, duration=3)
-                return None
-
-            if row < 0 or row >= layer.height() or col < 0 or col >= layer.width():
-                iface.messageBar().pushMessage("", "Raster coordinates out of bounds, row={}, col={}".format(row, col),
-                                               level=Qgis.Warning, duration=3)
-                return None
-
-            rasterExtent: QgsRectangle = layer.extent()
-            pixelXSize = layer.rasterUnitsPerPixelX()
-            pixelYSize = layer.rasterUnitsPerPixelY()
-
-            x = rasterExtent.xMinimum() + col * pixelXSize
-            y = rasterExtent.yMaximum() - row * pixelYSize
-
-            x += pixelXSize / 2
-            y -= pixelYSize / 2
-
-            return x, y
-
-        else:
-            iface.messageBar().pushMessage("", "Layer is not a raster layer", level=Qgis.Warning, duration=3)
-            return None
-
-    def _zoomToCoords(self, coord: tuple[float, float], zoomType: ZoomClass):
-        iface: QgisInterface = self._iface
-
-        projectCoord = coord
-
-        if zoomType.name == self.LayerCoord.name:
-            projectCoord = self.layerCoordToProjectCoord(iface.activeLayer(), coord)
-            if not projectCoord:
-                return
-        elif zoomType.name == self.WGS84Coord.name:
-            projectCoord = self.transformToProjectCoord(epsg4326, coord)
-            if not projectCoord:
-                return
-        elif zoomType.name == self.ProjectCoord.name:
-            pass
-        elif zoomType.name == self.RasterPixelCord.name:
-            projectCoord = self.rasterCoordToLayerCoord(iface.activeLayer(), coord)
-            if not projectCoord:
-                return
-        elif zoomType.name == self.RasterPixelIndex.name:
-            projectCoord = self.rasterCoordToLayerCoord(iface.activeLayer(), coord)
-            if not projectCoord:
-                return
-        elif zoomType.name == self.NI_ITE.name:
-            wgsCoord = Transform.nipoint2lonlat(coord[0], coord[1])
-            return self._zoomToCoords(wgsCoord, self.WGS84Coord)
-        elif zoomType.name == self.NI_ITE_MARS.name:
-            marsCoord = Transform.nipoint2lonlat(coord[0], coord[1])
-            wgsCoord = Transform.gcj2wgs(marsCoord[0], marsCoord[1])
-            return self._zoomToCoords(wgsCoord, self.WGS84Coord)
-        else:
-            iface.messageBar().pushMessage("", "Unknown zoom type {}".format(zoomType.name), level=Qgis.Warning,
-                                           duration=3)
-            return
-
-        canvas = self._iface.mapCanvas()
-        canvas.setCenter(QgsPointXY(projectCoord[0], projectCoord[1]))
-        canvas.refresh()
-
-        return True
+from collections import namedtuple
+
+import numpy as np
+from PyQt5.QtWidgets import QToolButton
+from qgis.PyQt.QtCore import QVariant
+from qgis.PyQt.QtWidgets import QAction, QApplication
+from qgis.core import Qgis, QgsPointXY, QgsCsException, QgsCoordinateReferenceSystem, QgsRasterLayer, QgsRectangle
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsLineString,
+    QgsMessageLog,
+    QgsProject,
+    QgsSettings,
+    QgsTask,
+    QgsVectorLayer
+)
+from qgis.gui import QgisInterface
+
+from . import coord_parser, gcj_grid, zoom_types
+from .coord_transformer import Transform
+from .perf_stats import perfStats
+from .pick_history import pickHistory
+from .raster_geotransform import geoTransformCache
+from .transform_cache import transformCache
+from .zoom_types import ZoomClass
+
+epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+RasterCoord = namedtuple('RasterCoord', ['row', 'col', 'index'])
+
+# grid path -> queued build task, the python side of the task, the task manager only owns the C++ side
+_gridBuilds = {}
+
+
+class GcjGridBuildTask(QgsTask):
+    """ writes the gcj offset grid file on a task manager thread, the zoom solves the inverse until it is done """
+
+    def __init__(self, grid):
+        super().__init__('Building the GCJ-02 offset grid', QgsTask.Flags())
+        self.grid = grid
+        self.error = None
+
+    def run(self):
+        try:
+            self.grid.load()
+        except Exception as e:
+            self.error = str(e)
+            return False
+        return True
+
+    def finished(self, result):
+        _gridBuilds.pop(self.grid.path, None)
+        if not result:
+            QgsMessageLog.logMessage('building the GCJ-02 offset grid failed: {}'.format(self.error),
+                                     'Coordinate Picker', Qgis.Warning)
+
+
+class CoordinateZoom:
+    LayerCoord = zoom_types.LayerCoord
+    ProjectCoord = zoom_types.ProjectCoord
+    WGS84Coord = zoom_types.WGS84Coord
+    RasterPixelCord = zoom_types.RasterPixelCord
+    RasterPixelIndex = zoom_types.RasterPixelIndex
+    NI_ITE = zoom_types.NI_ITE
+    NI_ITE_MARS = zoom_types.NI_ITE_MARS
+
+    AutoDetect = zoom_types.AutoDetect
+
+    ZoomClasses = zoom_types.ZoomClasses
+
+    # zoom class of every coordinate kind detected by coord_parser
+    DetectedZoomClasses = {
+        coord_parser.WGS84: WGS84Coord,
+        coord_parser.NI: NI_ITE,
+        coord_parser.RASTER_INDEX: RasterPixelIndex,
+        coord_parser.PROJECTED: ProjectCoord,
+    }
+
+    AddLayerKey = zoom_types.AddLayerKey
+    GcjGridKey = zoom_types.GcjGridKey
+    GcjGridLonCellsKey = gcj_grid.LON_CELLS_KEY
+    GcjGridLatCellsKey = gcj_grid.LAT_CELLS_KEY
+    # iteration cap of the gcj inverse on the GUI thread, points inside the box converge in at most 3
+    InverseIterations = 10
+
+    def __init__(self, iface):
+        self._iface = iface
+
+    @staticmethod
+    def parseCoordinateStr(coordStr: str):
+        try:
+            return coord_parser.parseCoordinate(coordStr)
+        except coord_parser.CoordinateParseError:
+            return None
+
+    @staticmethod
+    def parseCoordinateText(coordText: str):
+        """ parse one coordinate per line, see coord_parser.parseCoordinates
+
+        Raises:
+            CoordinateParseError: with the offending line when the text can not be parsed
+        """
+        return coord_parser.parseCoordinates(coordText)
+
+    def createZoomHandler(self, zoomType: ZoomClass, toolBtn: QToolButton, action: QAction, defaultZoomKey):
+        def handler():
+            self.zoomClipboard(zoomType, toolBtn, action, defaultZoomKey)
+
+        return handler
+
+    def zoomClipboard(self, zoomType: ZoomClass, toolBtn: QToolButton, action: QAction, defaultZoomKey):
+        """ zoom to the clipboard text, a successful zoom type becomes the default of the tool button """
+        iface = self._iface
+        clipboard = QApplication.clipboard()
+        if not clipboard.mimeData().hasText():
+            iface.messageBar().pushMessage("", "Clipboard is empty", level=Qgis.Warning, duration=3)
+            return
+
+        coordStr = clipboard.text()
+        if self.zoom(coordStr, zoomType):
+            QgsSettings().setValue(defaultZoomKey, zoomType.name)
+            toolBtn.setDefaultAction(action)
+
+    def zoom(self, coordStr, zoomType: ZoomClass):
+        with perfStats().operation('zoom'):
+            return self._zoom(coordStr, zoomType)
+
+    def _zoom(self, coordStr, zoomType: ZoomClass):
+        iface = self._iface
+
+        try:
+            with perfStats().stage('zoom.parse'):
+                parsed = CoordinateZoom.parseCoordinateText(coordStr)
+        except coord_parser.CoordinateParseError as e:
+            iface.messageBar().pushMessage("", "Failed parse coordinate string: {}".format(e), level=Qgis.Warning,
+                                           duration=3)
+            return
+
+        coords = parsed.coords
+        if zoomType == CoordinateZoom.AutoDetect:
+            zoomType = CoordinateZoom.DetectedZoomClasses[parsed.kind]
+            iface.messageBar().pushMessage("", "Zooming to {} as {}".format(
+                "{} coordinates".format(len(coords)) if len(coords) > 1 else "coordinate", zoomType.name),
+                level=Qgis.Info, duration=2)
+        elif parsed.swapped and zoomType != CoordinateZoom.WGS84Coord:
+            # only degrees are read as lat/lon, keep the order as written for the other zoom types
+            coords = coords[:, ::-1]
+
+        if zoomType != CoordinateZoom.RasterPixelIndex and coords.shape[1] == 1:
+            iface.messageBar().pushMessage("", "Failed parse coordinate string: {}".format(coordStr[:100]),
+                                           level=Qgis.Warning, duration=3)
+            return
+
+        return self._zoomToCoordArray(coords, zoomType)
+
+    def transformToProjectCoord(self, srcCrs, coord):
+        projectCoords = self.transformToProjectCoords(srcCrs, np.array([coord[0]]), np.array([coord[1]]))
+        if projectCoords is None:
+            return None
+        return projectCoords[0][0], projectCoords[1][0]
+
+    def transformToProjectCoords(self, srcCrs, xs, ys):
+        """ transform coordinate arrays to the project crs, all points in one call """
+        iface: QgisInterface = self._iface
+        projectCrs = iface.mapCanvas().mapSettings().destinationCrs()
+
+        if not srcCrs.isValid() or not projectCrs.isValid():
+            iface.messageBar().pushMessage("",
+                                           "Coordinate transform failed, still zooming as project crs: {}, {}".format(
+                                               xs[0], ys[0]), level=Qgis.Warning, duration=3)
+            return xs, ys
+        if srcCrs == projectCrs:
+            return xs, ys
+
+        transform = transformCache().transform(srcCrs, projectCrs)
+        # a line string transforms all of its vertices at once on the c++ side
+        points = QgsLineString(xs.tolist(), ys.tolist())
+        try:
+            points.transform(transform)
+        except QgsCsException:
+            iface.messageBar().pushMessage("", "Failed to transform coordinates: {}, {}".format(xs[0], ys[0]),
+                                           level=Qgis.Warning, duration=3)
+            return None
+        return np.array(points.xVector(), dtype=np.float64), np.array(points.yVector(), dtype=np.float64)
+
+    def layerCoordToProjectCoord(self, layer, coord):
+        projectCoords = self.layerCoordsToProjectCoords(layer, np.array([coord[0]]), np.array([coord[1]]))
+        if projectCoords is None:
+            return None
+        return projectCoords[0][0], projectCoords[1][0]
+
+    def layerCoordsToProjectCoords(self, layer, xs, ys):
+        iface: QgisInterface = self._iface
+
+        if layer is None:
+            iface.messageBar().pushMessage("", "No active layer to zoom to", level=Qgis.Warning, duration=3)
+            return None
+
+        return self.transformToProjectCoords(layer.crs(), xs, ys)
+
+    def rasterCoordToLayerCoord(self, layer, rasterCoord):
+        layerCoords = self.rasterCoordsToLayerCoords(layer, np.array([rasterCoord], dtype=np.float64))
+        if layerCoords is None:
+            return None
+        return layerCoords[0][0], layerCoords[1][0]
+
+    def rasterCoordsToLayerCoords(self, layer, rasterCoords):
+        """ cell centers of (n, 2) row/col or (n, 1) cell index arrays in layer coordinates """
+        iface: QgisInterface = self._iface
+
+        if isinstance(layer, QgsRasterLayer):
+            geoTransform = geoTransformCache().geoTransform(layer)
+            if rasterCoords.shape[1] == 2:
+                # raster coord is (row, col)
+                rows = rasterCoords[:, 0].astype(np.int64)
+                cols = rasterCoords[:, 1].astype(np.int64)
+            elif rasterCoords.shape[1] == 1:
+                # raster coord is cell index
+                rows, cols = np.divmod(rasterCoords[:, 0].astype(np.int64), geoTransform.width)
+            else:
+                iface.messageBar().pushMessage("", "Invalid raster coordinate", level=Qgis.Warning, duration=3)
+                return None
+
+            outOfBounds = (rows < 0) | (rows >= geoTransform.height) | (cols < 0) | (cols >= geoTransform.width)
+            if outOfBounds.any():
+                first = np.flatnonzero(outOfBounds)[0]
+                iface.messageBar().pushMessage("", "Raster coordinates out of bounds, row={}, col={}{}".format(
+                    rows[first], cols[first],
+                    " and {} more".format(outOfBounds.sum() - 1) if outOfBounds.sum() > 1 else ""),
+                    level=Qgis.Warning, duration=3)
+                return None
+
+            # a single affine product for all cells, rotated rasters included
+            xs, ys = geoTransform.cellCenters(rows, cols)
+
+            return xs, ys
+
+        else:
+            iface.messageBar().pushMessage("", "Layer is not a raster layer", level=Qgis.Warning, duration=3)
+            return None
+
+    @staticmethod
+    def gcjGrid():
+        """ the gcj offset grid of the current settings, None when grid mode is off
+
+        The grid file is cached in the QGIS profile folder and built on first use.
+        """
+        if not QgsSettings().value(CoordinateZoom.GcjGridKey, False, type=bool):
+            return None
+        return gcj_grid.settingsOffsetGrid()
+
+    @staticmethod
+    def buildGcjGrid():
+        """ queue a task building the grid file of the current settings unless it exists or is being built
+
+        Returns:
+            bool -- whether the grid can be loaded without building it on the calling thread
+        """
+        grid = gcj_grid.settingsOffsetGrid()
+        if grid.isLoaded() or grid.isBuilt():
+            return True
+        if grid.path not in _gridBuilds:
+            task = _gridBuilds[grid.path] = GcjGridBuildTask(grid)
+            QgsApplication.taskManager().addTask(task)
+        return False
+
+    @staticmethod
+    def gcj2wgsArray(gcjLon, gcjLat):
+        """ gcj to wgs arrays, interpolated from the offset grid in grid mode, solved with a capped inverse else
+
+        The grid file is built in the background, the capped inverse is used until it exists.
+        """
+        grid = CoordinateZoom.gcjGrid()
+        if grid is None or not CoordinateZoom.buildGcjGrid():
+            result = Transform.gcj2wgs_solve(gcjLon, gcjLat, maxIterations=CoordinateZoom.InverseIterations)
+            return result.lon, result.lat
+        return grid.gcj2wgs(gcjLon, gcjLat)
+
+    def projectCoords(self, coords, zoomType: ZoomClass):
+        """ transform (n, 2) coordinates or (n, 1) cell indices of zoomType to project coordinate arrays """
+        iface: QgisInterface = self._iface
+
+        if zoomType.name == self.LayerCoord.name:
+            return self.layerCoordsToProjectCoords(iface.activeLayer(), coords[:, 0], coords[:, 1])
+        elif zoomType.name == self.WGS84Coord.name:
+            return self.transformToProjectCoords(epsg4326, coords[:, 0], coords[:, 1])
+        elif zoomType.name == self.ProjectCoord.name:
+            return coords[:, 0], coords[:, 1]
+        elif zoomType.name == self.RasterPixelCord.name or zoomType.name == self.RasterPixelIndex.name:
+            layer = iface.activeLayer()
+            layerCoords = self.rasterCoordsToLayerCoords(layer, coords)
+            if layerCoords is None:
+                return None
+            return self.transformToProjectCoords(layer.crs(), layerCoords[0], layerCoords[1])
+        elif zoomType.name == self.NI_ITE.name:
+            wgsCoords = Transform.nipoint2lonlat_array(coords[:, 0], coords[:, 1])
+            return self.transformToProjectCoords(epsg4326, wgsCoords[0], wgsCoords[1])
+        elif zoomType.name == self.NI_ITE_MARS.name:
+            marsCoords = Transform.nipoint2lonlat_array(coords[:, 0], coords[:, 1])
+            with perfStats().stage('zoom.gcj'):
+                wgsCoords = self.gcj2wgsArray(marsCoords[0], marsCoords[1])
+            return self.transformToProjectCoords(epsg4326, wgsCoords[0], wgsCoords[1])
+        else:
+            iface.messageBar().pushMessage("", "Unknown zoom type {}".format(zoomType.name), level=Qgis.Warning,
+                                           duration=3)
+            return None
+
+    def _zoomToCoords(self, coord: tuple, zoomType: ZoomClass, record=True):
+        return self._zoomToCoordArray(np.array([coord], dtype=np.float64), zoomType, record)
+
+    def replay(self, record):
+        """ zoom back to a pick_history record without recording it again """
+        return self._zoomToCoords((record.lon, record.lat), CoordinateZoom.WGS84Coord, record=False)
+
+    def _zoomToCoordArray(self, coords, zoomType: ZoomClass, record=True):
+        """ center on a single point, zoom to the extent of several, and add them to the pick history """
+        stats = perfStats()
+        with stats.operation('zoom.coordinates'):
+            with stats.stage('zoom.transform'):
+                projectCoords = self.projectCoords(coords, zoomType)
+            if projectCoords is None:
+                return
+            xs, ys = projectCoords
+
+            # only the extent change is timed, the canvas renders later on its own
+            with stats.stage('zoom.canvas'):
+                canvas = self._iface.mapCanvas()
+                extent = QgsRectangle(xs.min(), ys.min(), xs.max(), ys.max())
+                if extent.width() == 0 and extent.height() == 0:
+                    canvas.setCenter(QgsPointXY(xs[0], ys[0]))
+                else:
+                    canvas.setExtent(extent.buffered(max(extent.width(), extent.height()) * 0.05))
+                canvas.refresh()
+
+            if len(xs) > 1 and QgsSettings().value(CoordinateZoom.AddLayerKey, False, type=bool):
+                with stats.stage('zoom.addLayer'):
+                    self.addPointsLayer(xs, ys, zoomType)
+
+            if record:
+                with stats.stage('zoom.history'):
+                    self.recordZoom(xs, ys, zoomType)
+
+            return True
+
+    def recordZoom(self, xs, ys, zoomType: ZoomClass):
+        """ queue project coordinate arrays for the pick history, which stores WGS84 """
+        history = pickHistory()
+        if history is None:
+            return
+        projectCrs = self._iface.mapCanvas().mapSettings().destinationCrs()
+        if projectCrs == epsg4326:
+            lons, lats = xs.tolist(), ys.tolist()
+        elif projectCrs.isValid():
+            points = QgsLineString(xs.tolist(), ys.tolist())
+            try:
+                points.transform(transformCache().transform(projectCrs, epsg4326))
+            except QgsCsException:
+                return
+            lons, lats = points.xVector(), points.yVector()
+        else:
+            return
+        history.addMany('zoom', lons, lats, None, zoomType.name)
+
+    def addPointsLayer(self, xs, ys, zoomType: ZoomClass):
+        """ add project coordinate arrays as a temporary point layer, all features in one insert """
+        layer = QgsVectorLayer('Point', 'Zoomed {}'.format(zoomType.name), 'memory')
+        layer.setCrs(self._iface.mapCanvas().mapSettings().destinationCrs())
+        provider = layer.dataProvider()
+        provider.addAttributes([QgsField('id', QVariant.Int)])
+        layer.updateFields()
+
+        features = []
+        for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            feature = QgsFeature(layer.fields())
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            feature.setAttributes([i + 1])
+            features.append(feature)
+        provider.addFeatures(features)
+        layer.updateExtents()
+
+        QgsProject.instance().addMapLayer(layer)
@@ -0,0 +1,179 @@
+import json
+import time
+from collections import deque
+
+from qgis.core import Qgis, QgsMessageLog, QgsSettings
+
+
+class StageHistogram:
+    """ rolling timings of one stage, percentiles are taken over the last WindowSize samples """
+
+    WindowSize = 1024
+
+    __slots__ = ('count', 'total', 'max', '_window')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._window = deque(maxlen=StageHistogram.WindowSize)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._window.append(seconds)
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        # nearest rank
+        return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+    def summary(self):
+        """ count, mean, p50, p95 and max in milliseconds """
+        ordered = sorted(self._window)
+        return {
+            'count': self.count,
+            'mean': self.total / self.count * 1000 if self.count else 0.0,
+            'p50': self._percentile(ordered, 0.5) * 1000 if ordered else 0.0,
+            'p95': self._percentile(ordered, 0.95) * 1000 if ordered else 0.0,
+            'max': self.max * 1000,
+        }
+
+
+class _Stage:
+    __slots__ = ('_stats', '_name', '_start')
+
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._stats.add(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class _Operation(_Stage):
+    """ a stage that also logs one line with the time of every stage run inside of it """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        self._stats._operationStages = []
+        return super().__enter__()
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self._start
+        stats = self._stats
+        stages, stats._operationStages = stats._operationStages, None
+        stats.add(self._name, seconds)
+        stats.logOperation(self._name, seconds, stages)
+        return False
+
+
+class _NullStage:
+    """ what stage() hands out while timing is off, entering and leaving it does nothing """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_nullStage = _NullStage()
+
+
+class PerfStats:
+    """ optional timings of the pick and zoom stages
+
+    Code under test wraps every stage in ``with perfStats().stage('pick.menu'):``, an operation wraps a whole pick
+    or zoom and logs its stages to the message log when it ends. Stages run lazily after their operation ended,
+    like a coordinate computed when its menu entry is copied, only go to the histograms. Nested stages are timed
+    inclusively. While timing is off stage() returns a shared do nothing context manager.
+    """
+
+    EnabledKey = 'CoordinatePicker/PerfStats'
+    LogTag = 'Coordinate Picker'
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = {}
+        self._operationStages = None
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+
+    def stage(self, name):
+        if not self.enabled:
+            return _nullStage
+        return _Stage(self, name)
+
+    def operation(self, name):
+        """ like stage, the outermost operation also logs its stages, inner ones are plain stages """
+        if not self.enabled:
+            return _nullStage
+        if self._operationStages is not None:
+            return _Stage(self, name)
+        return _Operation(self, name)
+
+    def add(self, name, seconds):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = StageHistogram()
+        histogram.add(seconds)
+        if self._operationStages is not None:
+            self._operationStages.append((name, seconds))
+
+    def logOperation(self, name, seconds, stages):
+        QgsMessageLog.logMessage('{} {:.2f} ms: {}'.format(
+            name, seconds * 1000, ', '.join('{} {:.2f} ms'.format(stage, s * 1000) for stage, s in stages) or '-'),
+            PerfStats.LogTag, Qgis.Info)
+
+    def summary(self):
+        """ summary of every stage by name, see StageHistogram.summary """
+        return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def logSummary(self):
+        summary = self.summary()
+        if not summary:
+            QgsMessageLog.logMessage('no timings recorded', PerfStats.LogTag, Qgis.Info)
+            return
+        lines = ['{:<32} {:>7} {:>9} {:>9} {:>9}'.format('stage', 'count', 'p50 ms', 'p95 ms', 'max ms')]
+        for name, s in summary.items():
+            lines.append('{:<32} {:>7} {:>9.3f} {:>9.3f} {:>9.3f}'.format(name, s['count'], s['p50'], s['p95'],
+                                                                           s['max']))
+        QgsMessageLog.logMessage('\n'.join(lines), PerfStats.LogTag, Qgis.Info)
+
+    def exportJson(self, fileName):
+        with open(fileName, 'w', encoding='utf-8') as f:
+            json.dump({'windowSize': StageHistogram.WindowSize, 'unit': 'ms', 'stages': self.summary()}, f,
+                      indent=2)
+            f.write('\n')
+
+    def clear(self):
+        self._histograms.clear()
+        self._operationStages = None
+
+
+_perfStats = None
+
+
+def perfStats():
+    """ the timings shared by the pick and zoom tools, switched by CoordinatePicker/PerfStats """
+    global _perfStats
+    if _perfStats is None:
+        _perfStats = PerfStats(QgsSettings().value(PerfStats.EnabledKey, False, type=bool))
+    return _perfStats
+
+
+def releasePerfStats():
+    global _perfStats
+    _perfStats = None
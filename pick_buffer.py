@@ -0,0 +1,194 @@
+import json
+
+import numpy as np
+
+from .coord_formatter import CoordFormater as Coordinate
+
+
+class PickBuffer:
+    """ Columnar storage of a pick session
+
+    Every coordinate kind has one typed array of (rows, width) values and a validity mask, the layer name of a pick
+    is stored as an index into a list of distinct names.
+    """
+
+    # coordinate kind -> (dtype, column names)
+    Columns = {
+        Coordinate.RasterPixelIndex: (np.int64, ('cell_index',)),
+        Coordinate.RasterPixelCord: (np.int64, ('col', 'row')),
+        Coordinate.LayerCoord: (np.float64, ('layer_x', 'layer_y')),
+        Coordinate.MapCoord: (np.float64, ('project_x', 'project_y')),
+        Coordinate.WGS84Coord: (np.float64, ('lon', 'lat')),
+        Coordinate.NI_ITE: (np.int64, ('ite_x', 'ite_y')),
+        Coordinate.NI_ITE_MARS: (np.int64, ('ite_mars_x', 'ite_mars_y')),
+        Coordinate.NDS_TILE: (np.int64, ('nds_tile',)),
+    }
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._capacity = capacity
+        self._layerNames = []
+        self._layerIndex = {}
+        self._layers = np.empty(capacity, dtype=np.int32)
+        self._values = {kind: np.empty((capacity, len(names)), dtype=dtype)
+                        for kind, (dtype, names) in PickBuffer.Columns.items()}
+        self._valid = {kind: np.zeros(capacity, dtype=bool) for kind in PickBuffer.Columns}
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        capacity = self._capacity * 2
+        self._layers = np.resize(self._layers, capacity)
+        for kind in PickBuffer.Columns:
+            self._values[kind] = np.resize(self._values[kind], (capacity, self._values[kind].shape[1]))
+            valid = np.zeros(capacity, dtype=bool)
+            valid[:self._size] = self._valid[kind][:self._size]
+            self._valid[kind] = valid
+        self._capacity = capacity
+
+    def append(self, values, layerName=None):
+        """ add one pick
+
+        Arguments:
+            values {dict} -- coordinate kind -> (x, y) value, None or missing kinds are stored as invalid
+            layerName {str} -- name of the picked layer
+        """
+        if self._size == self._capacity:
+            self._grow()
+
+        row = self._size
+        if layerName not in self._layerIndex:
+            self._layerIndex[layerName] = len(self._layerNames)
+            self._layerNames.append(layerName)
+        self._layers[row] = self._layerIndex[layerName]
+
+        for kind, columns in self._values.items():
+            value = values.get(kind)
+            if value is not None:
+                columns[row] = value[:columns.shape[1]]
+                self._valid[kind][row] = True
+        self._size += 1
+
+    def clear(self):
+        self._size = 0
+        self._layerNames = []
+        self._layerIndex = {}
+        for valid in self._valid.values():
+            valid[:] = False
+
+    def column(self, kind):
+        """ (values, valid) arrays of a coordinate kind, values has one row per pick """
+        return self._values[kind][:self._size], self._valid[kind][:self._size]
+
+    def layerNames(self):
+        names = np.array([name if name is not None else 'Map' for name in self._layerNames], dtype=object)
+        return names[self._layers[:self._size]]
+
+    def kinds(self):
+        """ coordinate kinds with at least one valid value """
+        return [kind for kind in PickBuffer.Columns if self._valid[kind][:self._size].any()]
+
+    def records(self):
+        """ column names and one list of python values per column, invalid values are None """
+        names = ['layer']
+        columns = [self.layerNames().tolist()]
+        for kind in self.kinds():
+            values, valid = self.column(kind)
+            for i, name in enumerate(PickBuffer.Columns[kind][1]):
+                column = values[:, i].astype(object)
+                column[~valid] = None
+                names.append(name)
+                columns.append(column.tolist())
+        return names, columns
+
+    def _formatColumns(self, rows, missing, finiteOnly=False):
+        """ names and string values of the columns of every kind with valid values, restricted to rows
+
+        Columns holding the same values in the same format, like the layer, map and WGS84 coordinates of a project
+        in WGS84, are formatted once. With finiteOnly nan and inf are written as missing too.
+        """
+        names = []
+        columns = []
+        formatted = []  # (values, format, strings before the missing values) of every formatted column
+        for kind in self.kinds():
+            values, valid = self.column(kind)
+            values = values[rows]
+            valid = valid[rows]
+            decimals = Coordinate.precision(kind)
+            if decimals is not None:
+                fmt = '{{:.{}f}}'.format(decimals)
+            elif values.dtype.kind == 'f':
+                # repr gives the shortest string that round trips, like str() of a python float
+                fmt = '{!r}'
+            else:
+                fmt = '{}'
+            for i, name in enumerate(PickBuffer.Columns[kind][1]):
+                column = values[:, i]
+                for previous, previousFmt, previousStrings in formatted:
+                    if previousFmt == fmt and previous.dtype == column.dtype and np.array_equal(previous, column):
+                        strings = previousStrings[:]
+                        break
+                else:
+                    strings = list(map({'{!r}': repr, '{}': str}.get(fmt, fmt.format), column.tolist()))
+                    formatted.append((column, fmt, strings[:]))
+                invalid = ~valid
+                if finiteOnly and column.dtype.kind == 'f':
+                    invalid |= ~np.isfinite(column)
+                for row in np.flatnonzero(invalid).tolist():
+                    strings[row] = missing
+                names.append(name)
+                columns.append(strings)
+        return names, columns
+
+    def _layerColumn(self, rows, quote):
+        names = [quote(name if name is not None else 'Map') for name in self._layerNames]
+        return [names[index] for index in self._layers[:self._size][rows].tolist()]
+
+    def toDelimited(self, delimiter='\t', header=True):
+        """ the whole buffer as delimited text, one line per pick
+
+        Invalid values are written as empty fields, layer names containing the delimiter are quoted.
+        """
+        def quote(name):
+            if delimiter in name or '"' in name or '\n' in name:
+                return '"{}"'.format(name.replace('"', '""'))
+            return name
+
+        rows = slice(0, self._size)
+        names, columns = self._formatColumns(rows, '')
+        lines = map(delimiter.join, zip(self._layerColumn(rows, quote), *columns))
+        if header:
+            return delimiter.join(['layer'] + names) + '\n' + '\n'.join(lines)
+        return '\n'.join(lines)
+
+    def toGeoJSON(self):
+        """ the picks having a finite WGS84 coordinate as a GeoJSON FeatureCollection of points
+
+        A feature is a fixed run of literal pieces and values. The pieces and the formatted columns are laid into
+        one list with a slice assignment each and the whole collection is joined once. Other non-finite values are
+        written as null, JSON has no nan or inf.
+        """
+        wgs84, valid = self.column(Coordinate.WGS84Coord)
+        rows = np.flatnonzero(valid & np.isfinite(wgs84).all(axis=1))
+        if not rows.size:
+            return '{"type": "FeatureCollection", "features": []}'
+        names, columns = self._formatColumns(rows, 'null', True)
+        columns = [columns[names.index('lon')], columns[names.index('lat')],
+                   self._layerColumn(rows, json.dumps)] + columns
+
+        # literal pieces before every value of a feature, the last one closes the feature
+        pieces = ['{"type": "Feature", "geometry": {"type": "Point", "coordinates": [', ', ',
+                  ']}, "properties": {"layer": ']
+        pieces += [', {}: '.format(json.dumps(name)) for name in names]
+        pieces.append('}}, ')
+
+        count = len(rows)
+        stride = 2 * len(columns) + 1
+        parts = [None] * (count * stride)
+        for i, column in enumerate(columns):
+            parts[2 * i::stride] = [pieces[i]] * count
+            parts[2 * i + 1::stride] = column
+        parts[-1::-stride] = [pieces[-1]] * count
+        parts[-1] = '}}'
+        return '{"type": "FeatureCollection", "features": [' + ''.join(parts) + ']}'
@@ -0,0 +1,202 @@
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from qgis.core import QgsApplication, QgsSettings
+except ImportError:
+    # the store itself does not need QGIS, the benchmarks use it without
+    QgsApplication = QgsSettings = None
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS picks (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    source TEXT NOT NULL,
+    lon REAL NOT NULL,
+    lat REAL NOT NULL,
+    layer TEXT,
+    description TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS picks_rtree USING rtree(id, minLon, maxLon, minLat, maxLat);
+CREATE TRIGGER IF NOT EXISTS picks_insert AFTER INSERT ON picks BEGIN
+    INSERT INTO picks_rtree VALUES (new.id, new.lon, new.lon, new.lat, new.lat);
+END;
+CREATE TRIGGER IF NOT EXISTS picks_delete AFTER DELETE ON picks BEGIN
+    DELETE FROM picks_rtree WHERE id = old.id;
+END;
+'''
+
+_COLUMNS = 'p.id, p.time, p.source, p.lon, p.lat, p.layer, p.description'
+
+
+class PickRecord(namedtuple('PickRecord', ['id', 'time', 'source', 'lon', 'lat', 'layer', 'description'])):
+    """ one stored pick or zoom target, lon and lat are WGS84 """
+
+    __slots__ = ()
+
+    def label(self):
+        return '{}  {}  {:.6f}, {:.6f}{}'.format(
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.time)), self.source, self.lon, self.lat,
+            '  {}'.format(self.layer) if self.layer else '')
+
+
+class PickHistory:
+    """ picks and zoom targets in a SQLite file with an R*Tree index on lon/lat
+
+    add() and addMany() only queue the rows. A writer thread with its own connection collects them for up to
+    BatchInterval seconds or BatchSize rows and writes each batch in one transaction, so the GUI thread never
+    waits for the disk. The database runs in WAL mode, lookups on the GUI thread read the last committed batch
+    while the writer appends the next one.
+    """
+
+    EnabledKey = 'CoordinatePicker/PickHistory'
+    BatchSize = 1000
+    BatchInterval = 0.25  # seconds
+    # matches of the R*Tree before a lookup switches to the newest-first scan, see inExtent
+    ExtentScanLimit = 256
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = self._connect()
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+        self.written = 0
+        self.error = None
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write, name='pick history writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def add(self, source, lon, lat, layer=None, description=None):
+        """ queue one WGS84 point, source is 'pick' or 'zoom' """
+        # sqlite stores nan as NULL, which fails the whole batch on the NOT NULL columns
+        if math.isfinite(lon) and math.isfinite(lat):
+            self._queue.put([(time.time(), source, lon, lat, layer, description)])
+
+    def addMany(self, source, lons, lats, layer=None, description=None):
+        """ queue WGS84 point sequences as one batch """
+        now = time.time()
+        self._queue.put([(now, source, lon, lat, layer, description) for lon, lat in zip(lons, lats)
+                         if math.isfinite(lon) and math.isfinite(lat)])
+
+    def _write(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            rows = []
+            deadline = time.monotonic() + PickHistory.BatchInterval
+            while True:
+                if items[-1] is None:
+                    stopping = True
+                    break
+                rows.extend(items[-1])
+                if len(rows) >= PickHistory.BatchSize:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany('INSERT INTO picks (time, source, lon, lat, layer, description) '
+                                               'VALUES (?, ?, ?, ?, ?, ?)', rows)
+                    self.written += len(rows)
+            except sqlite3.Error as e:
+                # keep the writer alive, a full disk or a locked file should not end the history for good
+                self.error = e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+        connection.close()
+
+    def flush(self):
+        """ wait until every queued row is written """
+        self._queue.join()
+
+    def _records(self, sql, parameters):
+        return [PickRecord(*row) for row in self._connection.execute(sql, parameters)]
+
+    def nearest(self, lon, lat, radius, limit=10):
+        """ records within radius degrees of a point, nearest first """
+        return self._records(
+            'SELECT {} FROM picks_rtree r JOIN picks p ON p.id = r.id '
+            'WHERE r.minLon <= ? AND r.maxLon >= ? AND r.minLat <= ? AND r.maxLat >= ? '
+            'AND (p.lon - ?) * (p.lon - ?) + (p.lat - ?) * (p.lat - ?) <= ? '
+            'ORDER BY (p.lon - ?) * (p.lon - ?) + (p.lat - ?) * (p.lat - ?) LIMIT ?'.format(_COLUMNS),
+            (lon + radius, lon - radius, lat + radius, lat - radius, lon, lon, lat, lat, radius * radius,
+             lon, lon, lat, lat, limit))
+
+    def inExtent(self, minLon, minLat, maxLon, maxLat, limit=20):
+        """ the newest records inside an extent, newest first
+
+        The R*Tree lists at most ExtentScanLimit matches. Fewer than that are sorted by id right away. More mean
+        the extent is dense, and scanning the table from the newest row reaches limit matches after a few rows.
+        """
+        ids = [row[0] for row in self._connection.execute(
+            'SELECT id FROM picks_rtree WHERE minLon <= ? AND maxLon >= ? AND minLat <= ? AND maxLat >= ? LIMIT ?',
+            (maxLon, minLon, maxLat, minLat, PickHistory.ExtentScanLimit))]
+        if len(ids) >= PickHistory.ExtentScanLimit:
+            ids = None
+        elif not ids:
+            return []
+        # the R*Tree stores float32 bounds, the exact test is on the table
+        return self._records(
+            'SELECT {} FROM picks p WHERE {}p.lon BETWEEN ? AND ? AND p.lat BETWEEN ? AND ? '
+            'ORDER BY p.id DESC LIMIT ?'.format(_COLUMNS, '' if ids is None else 'p.id IN ({}) AND '.format(
+                ','.join('?' * len(ids)))),
+            (ids or []) + [minLon, maxLon, minLat, maxLat, limit])
+
+    def recent(self, limit=20):
+        return self._records('SELECT {} FROM picks p ORDER BY p.id DESC LIMIT ?'.format(_COLUMNS), (limit,))
+
+    def count(self):
+        return self._connection.execute('SELECT count(*) FROM picks').fetchone()[0]
+
+    def clear(self):
+        """ delete every record, rows still queued are written afterwards """
+        self.flush()
+        with self._connection:
+            self._connection.execute('DELETE FROM picks')
+
+    def close(self):
+        """ write the queued rows and stop the writer """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._connection.close()
+
+
+_histories = {}
+
+
+def pickHistory():
+    """ the history in the QGIS profile folder, None when CoordinatePicker/PickHistory is off """
+    if QgsSettings is None or not QgsSettings().value(PickHistory.EnabledKey, True, type=bool):
+        return None
+    path = os.path.join(QgsApplication.qgisSettingsDirPath(), 'coordinate_picker', 'pick_history.sqlite')
+    history = _histories.get(path)
+    if history is None:
+        history = _histories[path] = PickHistory(path)
+    return history
+
+
+def releasePickHistories():
+    for history in _histories.values():
+        history.close()
+    _histories.clear()
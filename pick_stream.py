@@ -0,0 +1,297 @@
+""" newline delimited JSON stream of picks to a local socket
+
+The plugin connects to a consumer listening on a Unix domain socket or a loopback TCP port and writes one JSON
+object per pick. This file also runs on its own as a stand-in consumer, no QGIS needed:
+
+    python pick_stream.py tcp:127.0.0.1:47800
+    python pick_stream.py unix:/tmp/coordinate_picker.sock --quiet --delay 0.01
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+try:
+    from qgis.core import Qgis, QgsMessageLog, QgsSettings
+except ImportError:
+    # the publisher and the consumer do not need QGIS
+    Qgis = QgsMessageLog = QgsSettings = None
+
+DEFAULT_ADDRESS = 'tcp:127.0.0.1:47800'
+LOG_TAG = 'Coordinate Picker'
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def parseAddress(address):
+    """ socket family and address of 'unix:<path>' or 'tcp:<loopback host>:<port>'
+
+    Raises:
+        ValueError: for other schemes and for hosts that are not the local machine
+    """
+    scheme, _, target = address.partition(':')
+    if scheme == 'unix' and target:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('unix domain sockets are not available on this platform')
+        return socket.AF_UNIX, target
+    if scheme == 'tcp':
+        host, _, port = target.rpartition(':')
+        host = host.strip('[]')
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError('the pick stream only connects to the local machine, not {}'.format(host))
+        if not port.isdigit():
+            raise ValueError('invalid port in {}'.format(address))
+        return (socket.AF_INET6 if host == '::1' else socket.AF_INET), (host, int(port))
+    raise ValueError('invalid pick stream address {}, expected unix:<path> or tcp:<host>:<port>'.format(address))
+
+
+def _jsonValue(value):
+    # numpy scalars, like the cell of a raster, without importing numpy
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+class PickPublisher:
+    """ sends messages as newline delimited JSON on a sender thread
+
+    publish() never blocks: a message goes into a queue of QueueSize entries and is dropped and counted when the
+    queue is full, so a slow or absent consumer only costs messages, never canvas time. The sender takes every
+    queued message, up to BatchSize, serializes them and writes them with a single send. While the consumer is
+    unreachable the sender keeps its batch and retries every ReconnectInterval seconds.
+
+    A message that cannot be serialized is logged, counted in unencodable and skipped, the sender keeps running.
+    stats() reports it as dropped too.
+
+    The GUI thread only updates published and dropped, the sender only its own counters.
+    """
+
+    EnabledKey = 'CoordinatePicker/PickStream'
+    AddressKey = 'CoordinatePicker/PickStreamAddress'
+    QueueSize = 1024
+    BatchSize = 256
+    ReconnectInterval = 1.0  # seconds
+    SendTimeout = 5.0  # seconds
+
+    def __init__(self, address, queueSize=QueueSize):
+        self.address = address
+        self._family, self._target = parseAddress(address)
+        self._queue = queue.Queue(queueSize)
+        self._stop = threading.Event()
+        self._socket = None
+
+        self.published = 0
+        self.dropped = 0
+        self.unencodable = 0
+        self.sent = 0
+        self.batches = 0
+        self.bytes = 0
+        self.connects = 0
+        self.connected = False
+        self.error = None
+        self._started = time.monotonic()
+        self._rateMark = (self._started, 0)
+
+        self._sender = threading.Thread(target=self._run, name='pick stream sender', daemon=True)
+        self._sender.start()
+
+    def publish(self, message):
+        """ queue a JSON serializable message, False when it was dropped """
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=PickPublisher.ReconnectInterval)]
+            except queue.Empty:
+                continue
+            while len(batch) < PickPublisher.BatchSize:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for message in batch:
+                try:
+                    lines.append(json.dumps(message, separators=(',', ':'), default=_jsonValue) + '\n')
+                except (TypeError, ValueError) as e:
+                    self.unencodable += 1
+                    self._log('pick stream message dropped: {}'.format(e))
+            if not lines:
+                continue
+            data = ''.join(lines).encode('utf-8')
+            while not self._send(data):
+                if self._stop.wait(PickPublisher.ReconnectInterval):
+                    return
+            self.sent += len(lines)
+            self.batches += 1
+            self.bytes += len(data)
+        self._disconnect()
+
+    def _send(self, data):
+        try:
+            if self._socket is None:
+                sock = socket.socket(self._family, socket.SOCK_STREAM)
+                sock.settimeout(PickPublisher.SendTimeout)
+                try:
+                    sock.connect(self._target)
+                except OSError:
+                    sock.close()
+                    raise
+                self._socket = sock
+                self.connects += 1
+                self.connected = True
+            self._socket.sendall(data)
+            return True
+        except OSError as e:
+            # a batch cut short by a broken connection is sent again in full on the next connection
+            self.error = e
+            self._disconnect()
+            return False
+
+    @staticmethod
+    def _log(text):
+        if QgsMessageLog is not None:
+            QgsMessageLog.logMessage(text, LOG_TAG, Qgis.Warning)
+        else:
+            print(text, file=sys.stderr)
+
+    def _disconnect(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self.connected = False
+
+    def stats(self):
+        """ counters, the send rate since the previous call and over the whole lifetime """
+        now = time.monotonic()
+        markTime, markSent = self._rateMark
+        self._rateMark = (now, self.sent)
+        return {
+            'published': self.published,
+            'sent': self.sent,
+            'dropped': self.dropped + self.unencodable,
+            'unencodable': self.unencodable,
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'bytes': self.bytes,
+            'connected': self.connected,
+            'connects': self.connects,
+            'rate': (self.sent - markSent) / (now - markTime) if now > markTime else 0.0,
+            'averageRate': self.sent / (now - self._started) if now > self._started else 0.0,
+            'error': str(self.error) if self.error is not None else None,
+        }
+
+    def close(self, timeout=1.0):
+        """ stop the sender, messages still queued after timeout seconds are lost """
+        self._stop.set()
+        self._sender.join(timeout)
+
+
+_publisher = None
+
+
+def pickPublisher():
+    """ the publisher of CoordinatePicker/PickStreamAddress, None when CoordinatePicker/PickStream is off
+
+    Raises:
+        ValueError: when the address setting is invalid
+    """
+    global _publisher
+    if QgsSettings is None:
+        return None
+    settings = QgsSettings()
+    if not settings.value(PickPublisher.EnabledKey, False, type=bool):
+        return None
+    address = settings.value(PickPublisher.AddressKey, DEFAULT_ADDRESS)
+    if _publisher is not None and _publisher.address != address:
+        releasePickPublisher()
+    if _publisher is None:
+        _publisher = PickPublisher(address)
+    return _publisher
+
+
+def releasePickPublisher():
+    global _publisher
+    if _publisher is not None:
+        _publisher.close()
+        _publisher = None
+
+
+def consume(address, delay=0.0, quiet=False, out=sys.stdout, err=sys.stderr):
+    """ stand-in consumer, accepts one publisher at a time and prints its messages and a rate every second
+
+    Arguments:
+        address {str} -- see parseAddress
+
+    Keyword Arguments:
+        delay {float} -- seconds to sleep per message, simulates a slow consumer
+        quiet {bool} -- only print the rates
+    """
+    family, target = parseAddress(address)
+    server = socket.socket(family, socket.SOCK_STREAM)
+    if family == getattr(socket, 'AF_UNIX', None):
+        if os.path.exists(target):
+            os.remove(target)
+    else:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(target)
+    server.listen(1)
+    print('listening on {}'.format(address), file=err)
+
+    total = 0
+    try:
+        while True:
+            connection, _ = server.accept()
+            print('publisher connected', file=err)
+            received = 0
+            markTime = time.monotonic()
+            with connection, connection.makefile('rb') as stream:
+                for line in stream:
+                    message = json.loads(line)
+                    received += 1
+                    total += 1
+                    if not quiet:
+                        print(json.dumps(message), file=out)
+                    if delay:
+                        time.sleep(delay)
+                    now = time.monotonic()
+                    if now - markTime >= 1.0:
+                        print('{:.0f} messages/s, {} in total'.format(received / (now - markTime), total), file=err)
+                        received = 0
+                        markTime = now
+            print('publisher disconnected, {} messages in total'.format(total), file=err)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if family == getattr(socket, 'AF_UNIX', None) and os.path.exists(target):
+            os.remove(target)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stand-in consumer of the coordinate picker pick stream.')
+    parser.add_argument('address', nargs='?', default=DEFAULT_ADDRESS,
+                        help='unix:<path> or tcp:<host>:<port> (default: {})'.format(DEFAULT_ADDRESS))
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to sleep per message')
+    parser.add_argument('--quiet', action='store_true', help='only print the message rates')
+    args = parser.parse_args(argv)
+    try:
+        consume(args.address, args.delay, args.quiet)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
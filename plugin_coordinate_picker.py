@@ -1,18 +1,61 @@
+import sys
+import time
+from functools import partial
 from os import path
 
 from PyQt5.QtWidgets import QMenu, QToolButton
 from qgis.PyQt import QtGui, QtWidgets
-from qgis.core import QgsSettings
+from qgis.core import Qgis, QgsApplication, QgsCoordinateReferenceSystem, QgsCsException, QgsProject, QgsSettings
 
+from . import zoom_types
 from .coord_picker import CoordinatePicker
-from .coordinate_zoom import CoordinateZoom
+from .perf_stats import PerfStats, perfStats, releasePerfStats
+from .pick_history import PickHistory, pickHistory, releasePickHistories
+from .pick_stream import PickPublisher, pickPublisher, releasePickPublisher
+from .processing_provider import CoordinatePickerProvider, SystemNames
+from .raster_sampler import releaseRasterSampler
+from .transform_cache import releaseTransformCache, transformCache
+
+try:
+    from . import shifted_layer
+except ImportError:
+    # shifted layers need the python data providers of QGIS 3.16
+    shifted_layer = None
+
+epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+# icons by path, several actions share one icon
+_icons = {}
+
+
+def pluginIcon(iconPath):
+    icon = _icons.get(iconPath)
+    if icon is None:
+        icon = _icons[iconPath] = QtGui.QIcon(path.join(path.dirname(__file__), iconPath))
+    return icon
+
+
+def _releaseIfLoaded(moduleName, releaseName):
+    """ call a release function of a plugin module, a module that was never imported holds nothing to release """
+    module = sys.modules.get('{}.{}'.format(__package__, moduleName))
+    if module is not None:
+        getattr(module, releaseName)()
 
 
 class CoordinatePickZoomGUI:
+    """ toolbar and menu entries of the plugin
+
+    Only the actions are built when QGIS starts, the map tool and the zoom tool are created by their first use,
+    and with them numpy, the transformer and the parser are imported.
+    """
+
     DefaultZoomKey = 'CoordinatePicker/DefaultZoom'
+    HistoryMenuSize = 15
 
-    def __init__(self, iface):
+    def __init__(self, iface, importSeconds=0.0):
         self.iface = iface
+        self.importSeconds = importSeconds
+        self.initGuiSeconds = None
         self.mapCanvas = self.iface.mapCanvas()
 
         self.pluginMenuName = "Coordinate_PickZoom"
@@ -22,25 +65,66 @@ class CoordinatePickZoomGUI:
 
         self.pickTool = None
         self.actionPick = None
+        self.actionHover = None
+        self.actionCollect = None
+        self.actionPerfStats = None
+        self.actionExportPerfStats = None
+        self.actionPickStream = None
+        self.actionPickStreamStatus = None
 
         self.zoomTool = None
         self.zoomActions = {}
         self.zoomToolBtn = None
+        self.actionZoomAddLayer = None
+        self.actionGcjGrid = None
+        self.shiftedLayerActions = {}
+        self.historyMenu = None
+        self.actionHistory = None
+
+        self.processingProvider = None
 
     def initGui(self):
+        start = time.perf_counter()
+        self.processingProvider = CoordinatePickerProvider()
+        QgsApplication.processingRegistry().addProvider(self.processingProvider)
+        if shifted_layer is not None:
+            shifted_layer.registerShiftedLayerProvider()
+            QgsProject.instance().layersAdded.connect(shifted_layer.linkShiftedLayers)
+
         self.actionPick = self._createAction('icons/pick.svg', 'pick coordinate', self.enablePickTool, True)
-        self.pickTool = CoordinatePicker(self.iface)
-        self.pickTool.setAction(self.actionPick)
 
         self.toolbar.addAction(self.actionPick)
         self.iface.addPluginToMenu(self.pluginMenuName, self.actionPick)
 
+        self.actionHover = self._createAction('icons/pick.svg', 'live coordinate readout while picking',
+                                              self.toggleHover, True)
+        self.actionHover.setChecked(QgsSettings().value(CoordinatePicker.HoverModeKey, False, type=bool))
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionHover)
+
+        self.actionCollect = self._createAction('icons/pick.svg', 'collect picked coordinates (right click to export)',
+                                                self.toggleCollect, True)
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionCollect)
+
+        self.actionPerfStats = self._createAction('icons/pick.svg', 'record pick and zoom timings',
+                                                  self.togglePerfStats, True)
+        self.actionPerfStats.setChecked(perfStats().enabled)
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionPerfStats)
+        self.actionExportPerfStats = self._createAction('icons/pick.svg', 'export pick and zoom timings...',
+                                                        self.exportPerfStats)
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionExportPerfStats)
+
+        self.actionPickStream = self._createAction('icons/pick.svg', 'stream picks to a local socket',
+                                                   self.togglePickStream, True)
+        self.actionPickStream.setChecked(QgsSettings().value(PickPublisher.EnabledKey, False, type=bool))
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionPickStream)
+        self.actionPickStreamStatus = self._createAction('icons/pick.svg', 'pick stream status',
+                                                         self.showPickStreamStatus)
+        self.iface.addPluginToMenu(self.pluginMenuName, self.actionPickStreamStatus)
+
         self.zoomToolBtn = QToolButton()
-        self.zoomTool = CoordinateZoom(self.iface)
-        for zoomType in CoordinateZoom.ZoomClasses:
+        for zoomType in zoom_types.ZoomClasses:
             action = self._createAction(zoomType.icon, zoomType.name)
-            action.triggered.connect(self.zoomTool.createZoomHandler(zoomType, self.zoomToolBtn, action,
-                                                                     CoordinatePickZoomGUI.DefaultZoomKey))
+            action.triggered.connect(partial(self.zoomClipboard, zoomType, action))
             self.zoomActions[zoomType.name] = action
             self.iface.addPluginToMenu(self.pluginMenuName, action)
 
@@ -48,16 +132,61 @@ class CoordinatePickZoomGUI:
         for name, action in self.zoomActions.items():
             zoomMenu.addAction(action)
 
+        zoomMenu.addSeparator()
+        self.actionZoomAddLayer = self._createAction('icons/zoom_project.svg', 'add zoomed points as a layer',
+                                                     self.toggleZoomAddLayer, True)
+        self.actionZoomAddLayer.setChecked(QgsSettings().value(zoom_types.AddLayerKey, False, type=bool))
+        zoomMenu.addAction(self.actionZoomAddLayer)
+        self.actionGcjGrid = self._createAction('icons/zoom_ni_ite_mars.svg', 'interpolate GCJ-02 from an offset grid',
+                                                self.toggleGcjGrid, True)
+        self.actionGcjGrid.setChecked(QgsSettings().value(zoom_types.GcjGridKey, False, type=bool))
+        zoomMenu.addAction(self.actionGcjGrid)
+        for system in shifted_layer.SHIFTED_SYSTEMS if shifted_layer is not None else ():
+            action = self._createAction('icons/zoom_ni_ite_mars.svg',
+                                        'add {} shifted view of the active layer'.format(SystemNames[system]))
+            action.triggered.connect(partial(self.addShiftedLayer, system))
+            self.shiftedLayerActions[system] = action
+            zoomMenu.addAction(action)
+
+        zoomMenu.addSeparator()
+        self.historyMenu = zoomMenu.addMenu('Pick history')
+        self.historyMenu.aboutToShow.connect(self.updateHistoryMenu)
+        self.actionHistory = self._createAction('icons/pick.svg', 'record picks and zooms in the pick history',
+                                                self.toggleHistory, True)
+        self.actionHistory.setChecked(QgsSettings().value(PickHistory.EnabledKey, True, type=bool))
+        zoomMenu.addAction(self.actionHistory)
+
         self.zoomToolBtn.setMenu(zoomMenu)
-        defaultZoom = QgsSettings().value(CoordinatePickZoomGUI.DefaultZoomKey, CoordinateZoom.WGS84Coord.name)
+        defaultZoom = QgsSettings().value(CoordinatePickZoomGUI.DefaultZoomKey, zoom_types.WGS84Coord.name)
         self.zoomToolBtn.setDefaultAction(self.zoomActions[defaultZoom])
         self.zoomToolBtn.setPopupMode(QToolButton.MenuButtonPopup)
 
         self.toolbar.addWidget(self.zoomToolBtn)
 
+        self.initGuiSeconds = time.perf_counter() - start
+        self.reportStartup()
+
+    def reportStartup(self):
+        """ log the import and initGui times of the plugin when pick and zoom timings are on """
+        stats = perfStats()
+        if not stats.enabled:
+            return
+        stages = [('startup.import', self.importSeconds), ('startup.initGui', self.initGuiSeconds)]
+        for name, seconds in stages:
+            stats.add(name, seconds)
+        stats.logOperation('startup', self.importSeconds + self.initGuiSeconds, stages)
+
     def unload(self):
         # remove the plugin menu item and icon
         self.iface.removePluginMenu(self.pluginMenuName, self.actionPick)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionHover)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionCollect)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionPerfStats)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionExportPerfStats)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionPickStream)
+        self.iface.removePluginMenu(self.pluginMenuName, self.actionPickStreamStatus)
+        if self.pickTool is not None:
+            self.pickTool.setHoverEnabled(False)
         for name, action in self.zoomActions.items():
             self.iface.removePluginMenu(self.pluginMenuName, action)
             self.iface.removeToolBarIcon(action)
@@ -65,13 +194,37 @@ class CoordinatePickZoomGUI:
         self.toolbar = None
         self.pickTool = None
         self.actionPick = None
+        self.actionHover = None
+        self.actionCollect = None
+        self.actionPerfStats = None
+        self.actionExportPerfStats = None
+        self.actionPickStream = None
+        self.actionPickStreamStatus = None
         self.zoomTool = None
         self.zoomActions = {}
         self.zoomToolBtn = None
+        self.actionZoomAddLayer = None
+        self.actionGcjGrid = None
+        self.shiftedLayerActions = {}
+        self.historyMenu = None
+        self.actionHistory = None
+
+        if shifted_layer is not None:
+            QgsProject.instance().layersAdded.disconnect(shifted_layer.linkShiftedLayers)
+        QgsApplication.processingRegistry().removeProvider(self.processingProvider)
+        self.processingProvider = None
+
+        releaseTransformCache()
+        _releaseIfLoaded('gcj_grid', 'releaseOffsetGrids')
+        _releaseIfLoaded('raster_geotransform', 'releaseGeoTransformCache')
+        releaseRasterSampler()
+        releasePerfStats()
+        releasePickHistories()
+        releasePickPublisher()
+        _icons.clear()
 
     def _createAction(self, iconPath, text, callback=None, checkable=False, enabled=True):
-        icon = QtGui.QIcon(path.join(path.dirname(__file__), iconPath))
-        action = QtWidgets.QAction(icon, text, self.iface.mainWindow())
+        action = QtWidgets.QAction(pluginIcon(iconPath), text, self.iface.mainWindow())
         action.setCheckable(checkable)
         action.setEnabled(enabled)
         if callback:
@@ -79,8 +232,154 @@ class CoordinatePickZoomGUI:
 
         return action
 
+    def pickToolInstance(self):
+        """ the pick map tool, created on its first activation """
+        if self.pickTool is None:
+            self.pickTool = CoordinatePicker(self.iface)
+            self.pickTool.setAction(self.actionPick)
+        return self.pickTool
+
+    def zoomToolInstance(self):
+        """ the zoom tool, coordinate_zoom is imported by the first zoom """
+        if self.zoomTool is None:
+            from .coordinate_zoom import CoordinateZoom
+            self.zoomTool = CoordinateZoom(self.iface)
+        return self.zoomTool
+
     def enablePickTool(self):
-        if self.mapCanvas.mapTool() == self.pickTool:
-            self.mapCanvas.unsetMapTool(self.pickTool)
+        pickTool = self.pickToolInstance()
+        if self.mapCanvas.mapTool() == pickTool:
+            self.mapCanvas.unsetMapTool(pickTool)
         else:
-            self.mapCanvas.setMapTool(self.pickTool)
+            self.mapCanvas.setMapTool(pickTool)
+
+    def zoomClipboard(self, zoomType, action, *args):
+        self.zoomToolInstance().zoomClipboard(zoomType, self.zoomToolBtn, action, CoordinatePickZoomGUI.DefaultZoomKey)
+
+    def toggleHover(self, checked):
+        QgsSettings().setValue(CoordinatePicker.HoverModeKey, checked)
+        if self.pickTool is not None:
+            self.pickTool.setHoverEnabled(checked)
+
+    def toggleCollect(self, checked):
+        pickTool = self.pickToolInstance()
+        pickTool.setCollecting(checked)
+        if checked and self.mapCanvas.mapTool() != pickTool:
+            self.mapCanvas.setMapTool(pickTool)
+
+    def toggleZoomAddLayer(self, checked):
+        QgsSettings().setValue(zoom_types.AddLayerKey, checked)
+
+    def toggleGcjGrid(self, checked):
+        QgsSettings().setValue(zoom_types.GcjGridKey, checked)
+        if checked:
+            # the grid file takes seconds to write, build it before the first zoom needs it
+            from .coordinate_zoom import CoordinateZoom
+            CoordinateZoom.buildGcjGrid()
+        else:
+            _releaseIfLoaded('gcj_grid', 'releaseOffsetGrids')
+
+    def addShiftedLayer(self, system, *args):
+        """ add a view of the active WGS84 vector layer drawn shifted to system """
+        try:
+            layer = shifted_layer.createShiftedLayer(self.iface.activeLayer(), system)
+        except ValueError as e:
+            self.iface.messageBar().pushMessage("", str(e), level=Qgis.Warning, duration=3)
+            return
+        QgsProject.instance().addMapLayer(layer)
+
+    def toggleHistory(self, checked):
+        QgsSettings().setValue(PickHistory.EnabledKey, checked)
+        if not checked:
+            releasePickHistories()
+
+    def updateHistoryMenu(self):
+        """ fill the history menu with the newest records in the canvas extent and the newest records overall """
+        self.historyMenu.clear()
+        history = pickHistory()
+        if history is None:
+            self.historyMenu.addAction('Pick history is off').setEnabled(False)
+            return
+
+        inView = []
+        mapSettings = self.mapCanvas.mapSettings()
+        try:
+            extent = mapSettings.visibleExtent()
+            if mapSettings.destinationCrs() != epsg4326:
+                extent = transformCache().transform(mapSettings.destinationCrs(), epsg4326).transformBoundingBox(
+                    extent)
+        except QgsCsException:
+            extent = None
+        if extent is not None:
+            inView = history.inExtent(extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum(),
+                                      CoordinatePickZoomGUI.HistoryMenuSize)
+
+        self.historyMenu.addSection('In view')
+        self._addHistoryActions(inView)
+        self.historyMenu.addSection('Recent')
+        self._addHistoryActions(history.recent(CoordinatePickZoomGUI.HistoryMenuSize))
+        self.historyMenu.addSeparator()
+        self.historyMenu.addAction('Clear pick history').triggered.connect(self.clearHistory)
+
+    def _addHistoryActions(self, records):
+        if not records:
+            self.historyMenu.addAction('none').setEnabled(False)
+        for record in records:
+            action = self.historyMenu.addAction(record.label())
+            action.triggered.connect(partial(self.replayHistory, record))
+
+    def replayHistory(self, record, *args):
+        self.zoomToolInstance().replay(record)
+
+    def clearHistory(self):
+        history = pickHistory()
+        if history is not None:
+            history.clear()
+
+    def togglePickStream(self, checked):
+        QgsSettings().setValue(PickPublisher.EnabledKey, checked)
+        if not checked:
+            releasePickPublisher()
+            return
+        try:
+            pickPublisher()
+        except ValueError as e:
+            QgsSettings().setValue(PickPublisher.EnabledKey, False)
+            self.actionPickStream.setChecked(False)
+            self.iface.messageBar().pushMessage("", str(e), level=Qgis.Warning, duration=3)
+
+    def showPickStreamStatus(self):
+        try:
+            publisher = pickPublisher()
+        except ValueError as e:
+            self.iface.messageBar().pushMessage("", str(e), level=Qgis.Warning, duration=3)
+            return
+        if publisher is None:
+            self.iface.messageBar().pushMessage("", "Pick stream is off", level=Qgis.Info, duration=3)
+            return
+        stats = publisher.stats()
+        state = 'connected' if stats['connected'] else 'not connected'
+        if not stats['connected'] and stats['error']:
+            state += ' ({})'.format(stats['error'])
+        self.iface.messageBar().pushMessage("", "{}: {}, {} sent ({:.1f}/s), {} dropped, {} queued".format(
+            publisher.address, state, stats['sent'], stats['rate'], stats['dropped'], stats['queued']),
+            level=Qgis.Info, duration=5)
+
+    def togglePerfStats(self, checked):
+        QgsSettings().setValue(PerfStats.EnabledKey, checked)
+        perfStats().setEnabled(checked)
+        if not checked:
+            perfStats().logSummary()
+
+    def exportPerfStats(self):
+        stats = perfStats()
+        stats.logSummary()
+        fileName, _ = QtWidgets.QFileDialog.getSaveFileName(self.iface.mainWindow(), 'Export pick and zoom timings',
+                                                            '', 'JSON (*.json)')
+        if not fileName:
+            return
+        try:
+            stats.exportJson(fileName)
+        except OSError as e:
+            self.iface.messageBar().pushMessage("", "Failed to export timings: {}".format(e), level=Qgis.Warning,
+                                                duration=3)
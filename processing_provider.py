@@ -0,0 +1,268 @@
+import threading
+from collections import deque
+from os import path
+
+from qgis.PyQt.QtCore import QThread
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsGeometry,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsProcessingProvider,
+    QgsTask
+)
+
+from .coord_systems import BD09, COORD_SYSTEMS, GCJ02, NI_ITE, NI_ITE_MARS, WGS84
+
+SystemNames = {
+    WGS84: 'WGS84',
+    GCJ02: 'GCJ-02',
+    BD09: 'BD-09',
+    NI_ITE: 'NI_ITE',
+    NI_ITE_MARS: 'NI_ITE_MARS',
+}
+
+epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+# python side of queued tasks, the task manager only owns the C++ side
+_runningTasks = set()
+
+
+class ConvertChunkJob:
+    """ vertex conversion of one chunk of wkb geometries
+
+    A job runs at most once, either on a task manager thread or on the thread waiting for it when no worker
+    has picked it up yet, so a busy task pool can never stall the algorithm. The run time is bounded, the inverse
+    of convert_array for GCJ-02, BD-09 and NI_ITE_MARS input stops after at most 100 iterations per vertex.
+    """
+
+    __slots__ = ('wkbs', 'source', 'target', 'grid', 'result', 'error', '_claimed', '_lock', '_done')
+
+    def __init__(self, wkbs, source, target, grid=None):
+        self.wkbs = wkbs
+        self.source = source
+        self.target = target
+        self.grid = grid
+        self.result = None
+        self.error = None
+        self._claimed = False
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _claim(self):
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self):
+        """ convert the chunk unless it is already taken, returns False in that case """
+        if not self._claim():
+            return False
+        # numpy and the transformer are only loaded once an algorithm runs
+        from .coord_transformer import convert_array
+        from .wkb_coords import WkbCoordinates
+        try:
+            coords = WkbCoordinates(self.wkbs)
+            if len(coords):
+                x, y = coords.xy()
+                coords.setXY(*convert_array(x, y, self.source, self.target, self.grid))
+            self.result = coords.geometries()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.wkbs = None
+            self._done.set()
+        return True
+
+    def cancel(self):
+        if self._claim():
+            self.wkbs = None
+            self._done.set()
+
+    def wait(self, timeout):
+        return self._done.wait(timeout)
+
+
+class ConvertChunkTask(QgsTask):
+    def __init__(self, job: ConvertChunkJob):
+        super().__init__('Converting coordinates', QgsTask.Flags())
+        self.job = job
+
+    def run(self):
+        self.job.run()
+        return True
+
+    def finished(self, result):
+        _runningTasks.discard(self)
+
+
+class ConvertCoordinatesAlgorithm(QgsProcessingAlgorithm):
+    """ convert all vertices of a vector layer into one coordinate system
+
+    Features are read in chunks on the algorithm thread, the vertices of every chunk are converted as arrays
+    on task manager threads and the chunks are written back in input order. At most one chunk per worker
+    thread is in flight, so memory does not grow with the layer size.
+    """
+
+    INPUT = 'INPUT'
+    SOURCE_SYSTEM = 'SOURCE_SYSTEM'
+    USE_GRID = 'USE_GRID'
+    CHUNK_SIZE = 'CHUNK_SIZE'
+    OUTPUT = 'OUTPUT'
+
+    DefaultChunkSize = 10000
+    WaitInterval = 0.1
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+
+    def createInstance(self):
+        return ConvertCoordinatesAlgorithm(self.target)
+
+    def name(self):
+        return 'convertto{}'.format(self.target.lower())
+
+    def displayName(self):
+        return 'Convert layer to {}'.format(SystemNames[self.target])
+
+    def group(self):
+        return 'Coordinate conversion'
+
+    def groupId(self):
+        return 'coordinateconversion'
+
+    def shortHelpString(self):
+        return ('Converts every vertex of a vector layer from the chosen coordinate system to {}. WGS84 input is '
+                'reprojected to EPSG:4326 first, GCJ-02, BD-09 and NI input is read as stored. NI coordinates are '
+                'integer 1e-5 degree units.').format(SystemNames[self.target])
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(self.INPUT, 'Input layer'))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.SOURCE_SYSTEM, 'Input coordinate system', options=[SystemNames[s] for s in COORD_SYSTEMS],
+            defaultValue=COORD_SYSTEMS.index(GCJ02 if self.target == WGS84 else WGS84)))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.USE_GRID, 'Interpolate GCJ-02 offsets from the offset grid', defaultValue=False))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.CHUNK_SIZE, 'Features per chunk', QgsProcessingParameterNumber.Integer,
+            defaultValue=self.DefaultChunkSize, minValue=1))
+        self.addParameter(QgsProcessingParameterFeatureSink(self.OUTPUT, 'Converted'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        sourceSystem = COORD_SYSTEMS[self.parameterAsEnum(parameters, self.SOURCE_SYSTEM, context)]
+        chunkSize = self.parameterAsInt(parameters, self.CHUNK_SIZE, context)
+        grid = None
+        if self.parameterAsBool(parameters, self.USE_GRID, context):
+            from .gcj_grid import settingsOffsetGrid
+            grid = settingsOffsetGrid()
+            if not grid.isLoaded() and not path.exists(grid.path):
+                feedback.pushInfo('Building the GCJ-02 offset grid {}, this runs once'.format(grid.path))
+            # build or map the grid file once here rather than racing for it on the workers
+            grid.load()
+
+        request = QgsFeatureRequest()
+        if sourceSystem == WGS84 and source.sourceCrs() != epsg4326:
+            request.setDestinationCrs(epsg4326, context.transformContext())
+        targetCrs = QgsCoordinateReferenceSystem() if self.target in (NI_ITE, NI_ITE_MARS) else epsg4326
+
+        sink, destId = self.parameterAsSink(parameters, self.OUTPUT, context, source.fields(), source.wkbType(),
+                                            targetCrs)
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        total = source.featureCount()
+        step = 100.0 / total if total > 0 else 0
+        maxPending = max(1, QThread.idealThreadCount())
+        pending = deque()
+        written = 0
+
+        def submit(features):
+            wkbs = [bytes(feature.geometry().asWkb()) if feature.hasGeometry() else None for feature in features]
+            job = ConvertChunkJob(wkbs, sourceSystem, self.target, grid)
+            task = ConvertChunkTask(job)
+            _runningTasks.add(task)
+            QgsApplication.taskManager().addTask(task)
+            pending.append((features, job))
+
+        def write(features, job):
+            if feedback.isCanceled():
+                job.cancel()
+                return False
+            job.run()
+            while not job.wait(self.WaitInterval):
+                if feedback.isCanceled():
+                    return False
+            if job.error is not None:
+                raise QgsProcessingException('Failed to convert coordinates: {}'.format(job.error))
+            converted = []
+            for feature, wkb in zip(features, job.result):
+                out = QgsFeature(feature)
+                if wkb is not None:
+                    geometry = QgsGeometry()
+                    geometry.fromWkb(wkb)
+                    out.setGeometry(geometry)
+                converted.append(out)
+            sink.addFeatures(converted, QgsFeatureSink.FastInsert)
+            return True
+
+        try:
+            chunk = []
+            for feature in source.getFeatures(request):
+                if feedback.isCanceled():
+                    break
+                chunk.append(feature)
+                if len(chunk) < chunkSize:
+                    continue
+                submit(chunk)
+                chunk = []
+                while len(pending) >= maxPending:
+                    features, job = pending.popleft()
+                    if not write(features, job):
+                        break
+                    written += len(features)
+                    feedback.setProgress(written * step)
+            if chunk and not feedback.isCanceled():
+                submit(chunk)
+            while pending and not feedback.isCanceled():
+                features, job = pending.popleft()
+                if not write(features, job):
+                    break
+                written += len(features)
+                feedback.setProgress(written * step)
+        finally:
+            for features, job in pending:
+                job.cancel()
+            pending.clear()
+
+        return {self.OUTPUT: destId}
+
+
+class CoordinatePickerProvider(QgsProcessingProvider):
+    def loadAlgorithms(self):
+        for target in COORD_SYSTEMS:
+            self.addAlgorithm(ConvertCoordinatesAlgorithm(target))
+
+    def id(self):
+        return 'coordinatepicker'
+
+    def name(self):
+        return 'Coordinate Picker'
+
+    def icon(self):
+        return QIcon(path.join(path.dirname(__file__), 'icons/pick.svg'))
@@ -0,0 +1,230 @@
+from functools import partial
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+if TYPE_CHECKING:
+    # annotations only, the transform math runs and is tested without QGIS
+    from qgis.core import QgsRasterLayer
+
+
+class GeoTransform:
+    """ affine pixel <-> map transform of a raster, GDAL style
+
+        x = gt[0] + col * gt[1] + row * gt[2]
+        y = gt[3] + col * gt[4] + row * gt[5]
+
+    col and row are fractional pixel coordinates, the center of cell (row, col) is at (col + 0.5, row + 0.5).
+    Rotated and sheared rasters have non zero gt[2] or gt[4].
+    """
+
+    __slots__ = ('gt', 'width', 'height', 'matrix', 'inverse')
+
+    def __init__(self, gt, width, height):
+        """
+        Arguments:
+            gt {tuple} -- the six GDAL geotransform coefficients
+            width {int} -- raster columns
+            height {int} -- raster rows
+        """
+        det = gt[1] * gt[5] - gt[2] * gt[4]
+        if det == 0:
+            raise ValueError('degenerate geotransform {}'.format(gt))
+        self.gt = tuple(float(v) for v in gt)
+        self.width = int(width)
+        self.height = int(height)
+        # 2x3 matrices acting on (col, row, 1) and (x, y, 1)
+        self.matrix = np.array([[gt[1], gt[2], gt[0]], [gt[4], gt[5], gt[3]]], dtype=np.float64)
+        inverse = np.array([[gt[5], -gt[2]], [-gt[4], gt[1]]], dtype=np.float64) / det
+        self.inverse = np.column_stack([inverse, -inverse @ self.matrix[:, 2]])
+
+    @staticmethod
+    def fromExtent(xMinimum, yMaximum, pixelXSize, pixelYSize, width, height):
+        """ north up transform from the top left corner and the pixel size """
+        return GeoTransform((xMinimum, pixelXSize, 0.0, yMaximum, 0.0, -pixelYSize), width, height)
+
+    def isNorthUp(self):
+        return self.gt[2] == 0 and self.gt[4] == 0
+
+    def isProviderGrid(self):
+        """ whether rows run north to south and columns west to east, like the grid raster providers read """
+        return self.isNorthUp() and self.gt[1] > 0 and self.gt[5] < 0
+
+    def pixelToMap(self, pixels):
+        """ (n, 2) fractional (col, row) to (n, 2) map (x, y) """
+        pixels = np.asarray(pixels, dtype=np.float64)
+        return pixels @ self.matrix[:, :2].T + self.matrix[:, 2]
+
+    def mapToPixel(self, points):
+        """ (n, 2) map (x, y) to (n, 2) fractional (col, row) """
+        points = np.asarray(points, dtype=np.float64)
+        return points @ self.inverse[:, :2].T + self.inverse[:, 2]
+
+    def cellCenters(self, rows, cols):
+        """ map coordinates of cell centers
+
+        Returns:
+            tuple -- x and y arrays
+        """
+        pixels = np.column_stack([np.asarray(cols, dtype=np.float64) + 0.5, np.asarray(rows, dtype=np.float64) + 0.5])
+        points = self.pixelToMap(pixels)
+        return points[:, 0], points[:, 1]
+
+    def cellIndexCenters(self, indices):
+        """ map coordinates of the centers of row-major cell indices, see cellCenters """
+        rows, cols = np.divmod(np.asarray(indices, dtype=np.int64), self.width)
+        return self.cellCenters(rows, cols)
+
+    def cellsAt(self, xs, ys):
+        """ cells containing map coordinates
+
+        Returns:
+            tuple -- int64 col and row arrays, bool array of the points inside the raster
+        """
+        pixels = np.floor(self.mapToPixel(np.column_stack([xs, ys])))
+        cols = pixels[:, 0].astype(np.int64)
+        rows = pixels[:, 1].astype(np.int64)
+        inside = (cols >= 0) & (cols < self.width) & (rows >= 0) & (rows < self.height)
+        return cols, rows, inside
+
+    def cellAt(self, x, y):
+        """ (col, row) of the cell containing a single map coordinate, None outside the raster
+
+        Plain float math, a single pick does not pay for building arrays.
+        """
+        inv = self.inverse
+        col = inv[0, 0] * x + inv[0, 1] * y + inv[0, 2]
+        row = inv[1, 0] * x + inv[1, 1] * y + inv[1, 2]
+        if not (0 <= col < self.width and 0 <= row < self.height):
+            return None
+        return int(col), int(row)
+
+
+def layerGeoTransform(layer: 'QgsRasterLayer'):
+    """ geotransform of a raster layer
+
+    GDAL rasters use the geotransform of the file, so rotated rasters keep their own rows and columns even though
+    QGIS renders them through a warped north up grid. Other providers, and files GDAL can not open, fall back to
+    the north up layer extent.
+    """
+    if gdal is not None and layer.providerType() == 'gdal':
+        try:
+            dataset = gdal.Open(layer.source())
+        except Exception:
+            dataset = None
+        if dataset is not None:
+            gt = dataset.GetGeoTransform(can_return_null=True)
+            if gt is not None:
+                try:
+                    return GeoTransform(gt, dataset.RasterXSize, dataset.RasterYSize)
+                except ValueError:
+                    pass
+
+    return layerGridTransform(layer)
+
+
+def layerGridTransform(layer: 'QgsRasterLayer'):
+    """ north up transform of the grid the provider of a raster layer reads blocks from, from the layer extent """
+    extent = layer.extent()
+    return GeoTransform.fromExtent(extent.xMinimum(), extent.yMaximum(), layer.rasterUnitsPerPixelX(),
+                                   layer.rasterUnitsPerPixelY(), layer.width(), layer.height())
+
+
+class GeoTransformCache:
+    """ geotransforms of raster layers keyed by layer id
+
+    An entry is dropped when its layer signals a new data source, changed data or its deletion.
+    """
+
+    def __init__(self):
+        self._transforms = {}
+        self._grids = {}
+        self._connections = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def geoTransform(self, layer: 'QgsRasterLayer'):
+        key = layer.id()
+        transform = self._transforms.get(key)
+        if transform is not None:
+            self.hits += 1
+            return transform
+
+        self.misses += 1
+        transform = layerGeoTransform(layer)
+        self._transforms[key] = transform
+        self._watch(layer)
+        return transform
+
+    def gridTransform(self, layer: 'QgsRasterLayer'):
+        """ transform of the north up grid the layer provider reads blocks from
+
+        The geotransform itself for north up rasters, the layer extent grid for rotated ones, which QGIS warps.
+        """
+        key = layer.id()
+        transform = self._grids.get(key)
+        if transform is not None:
+            self.hits += 1
+            return transform
+
+        self.misses += 1
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = self._transforms[key] = layerGeoTransform(layer)
+        if not transform.isProviderGrid():
+            transform = layerGridTransform(layer)
+        self._grids[key] = transform
+        self._watch(layer)
+        return transform
+
+    def _watch(self, layer):
+        key = layer.id()
+        if key not in self._connections:
+            slot = partial(self.invalidate, key)
+            layer.dataSourceChanged.connect(slot)
+            layer.dataChanged.connect(slot)
+            layer.willBeDeleted.connect(slot)
+            self._connections[key] = (layer, slot)
+
+    def invalidate(self, layerId, *args):
+        self._transforms.pop(layerId, None)
+        self._grids.pop(layerId, None)
+        connection = self._connections.pop(layerId, None)
+        if connection is not None:
+            layer, slot = connection
+            layer.dataSourceChanged.disconnect(slot)
+            layer.dataChanged.disconnect(slot)
+            layer.willBeDeleted.disconnect(slot)
+
+    def clear(self):
+        for layerId in list(self._connections):
+            self.invalidate(layerId)
+        self._transforms.clear()
+        self._grids.clear()
+
+    def stats(self):
+        return {'size': len(self._transforms), 'grids': len(self._grids), 'hits': self.hits, 'misses': self.misses}
+
+
+_geoTransformCache = None
+
+
+def geoTransformCache():
+    """ the cache shared by the pick and zoom tools """
+    global _geoTransformCache
+    if _geoTransformCache is None:
+        _geoTransformCache = GeoTransformCache()
+    return _geoTransformCache
+
+
+def releaseGeoTransformCache():
+    global _geoTransformCache
+    if _geoTransformCache is not None:
+        _geoTransformCache.clear()
+        _geoTransformCache = None
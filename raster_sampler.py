@@ -0,0 +1,300 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from qgis.core import QgsApplication, QgsRasterBlock, QgsRasterBlockFeedback, QgsRasterDataProvider, QgsRasterLayer, \
+    QgsRectangle, QgsSettings, QgsTask
+
+# python side of queued tasks, the task manager only owns the C++ side
+_runningTasks = set()
+
+
+class RasterBlockCache:
+    """ LRU cache of raster tiles bounded by their size in bytes
+
+    Keys are (layer id, band, tile col, tile row). Tiles are inserted by the read task and looked up by the GUI
+    thread, so every access holds a lock.
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._blocks = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def blockBytes(block: QgsRasterBlock):
+        return block.width() * block.height() * QgsRasterBlock.typeSize(block.dataType())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._blocks.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._blocks.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, block: QgsRasterBlock):
+        size = self.blockBytes(block)
+        with self._lock:
+            previous = self._blocks.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.maxBytes:
+                return
+            self._blocks[key] = (block, size)
+            self._bytes += size
+            while self._bytes > self.maxBytes:
+                _, (_, evicted) = self._blocks.popitem(last=False)
+                self._bytes -= evicted
+
+    def invalidateLayer(self, layerId):
+        with self._lock:
+            for key in [key for key in self._blocks if key[0] == layerId]:
+                self._bytes -= self._blocks.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'blocks': len(self._blocks), 'bytes': self._bytes, 'maxBytes': self.maxBytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class RasterSample:
+    """ band values of one raster cell, filled in when the tiles are read
+
+    values holds one entry per band, None for no data, and stays None until the sample is done.
+    """
+
+    __slots__ = ('layerName', 'bandNames', 'col', 'row', 'values', 'error', 'done', '_listeners')
+
+    def __init__(self, layerName, bandNames, col, row):
+        self.layerName = layerName
+        self.bandNames = bandNames
+        self.col = col
+        self.row = row
+        self.values = None
+        self.error = None
+        self.done = False
+        self._listeners = []
+
+    def onDone(self, callback):
+        """ call callback(sample) once the values are known, right away when they already are """
+        if self.done:
+            callback(self)
+        else:
+            self._listeners.append(callback)
+
+    def resolve(self, values, error=None):
+        self.values = values
+        self.error = error
+        self.done = True
+        listeners, self._listeners = self._listeners, []
+        for callback in listeners:
+            callback(self)
+
+    @staticmethod
+    def formatValue(value):
+        if value is None:
+            return 'no data'
+        if float(value).is_integer():
+            return str(int(value))
+        return '{:.10g}'.format(value)
+
+
+class RasterTileReadTask(QgsTask):
+    """ reads missing tiles on a task manager thread through a clone of the layer's provider """
+
+    def __init__(self, provider: QgsRasterDataProvider, requests):
+        """
+        Arguments:
+            provider {QgsRasterDataProvider} -- provider clone owned by this task
+            requests {list} -- (key, band, extent, width, height) of every tile to read
+        """
+        super().__init__('Reading raster values', QgsTask.CanCancel)
+        self.provider = provider
+        self.requests = requests
+        self.feedback = QgsRasterBlockFeedback()
+        self.blocks = {}
+        self.error = None
+        self.onFinished = None
+
+    def run(self):
+        try:
+            for key, band, extent, width, height in self.requests:
+                if self.isCanceled():
+                    return False
+                block = self.provider.block(band, extent, width, height, self.feedback)
+                if block is None or not block.isValid():
+                    self.error = 'failed to read band {}'.format(band)
+                    return False
+                self.blocks[key] = block
+        except Exception as e:
+            self.error = str(e)
+            return False
+        return True
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def finished(self, result):
+        _runningTasks.discard(self)
+        if self.onFinished is not None:
+            self.onFinished(self, result)
+
+
+class RasterSampler:
+    """ band values of raster layers at map points
+
+    Values are read in TileSize x TileSize tiles of the provider grid and cached, repeated samples in the same
+    area never touch the provider again. Missing tiles are read by a RasterTileReadTask, the GUI thread only
+    slices cached blocks.
+    """
+
+    TileSize = 256
+    CacheSizeKey = 'CoordinatePicker/RasterBlockCacheMB'
+    DefaultCacheSize = 64
+
+    def __init__(self, maxBytes=DefaultCacheSize * 1024 * 1024):
+        self.cache = RasterBlockCache(maxBytes)
+        self._task = None
+        self._connections = {}
+
+    @staticmethod
+    def _tileRequest(layerId, grid, band, tileCol, tileRow):
+        size = RasterSampler.TileSize
+        xMinimum, pixelXSize, _, yMaximum, _, pixelYSize = grid.gt
+        width = min(size, grid.width - tileCol * size)
+        height = min(size, grid.height - tileRow * size)
+        xMinimum += tileCol * size * pixelXSize
+        yMaximum += tileRow * size * pixelYSize
+        tileExtent = QgsRectangle(xMinimum, yMaximum + height * pixelYSize, xMinimum + width * pixelXSize, yMaximum)
+        return (layerId, band, tileCol, tileRow), band, tileExtent, width, height
+
+    def sample(self, layer: QgsRasterLayer, x, y):
+        """ start sampling all bands at a layer coordinate
+
+        Returns:
+            RasterSample -- already done when every tile is cached, None when the point is outside of the raster
+                            or the provider has no fixed grid to tile
+        """
+        from .raster_geotransform import geoTransformCache
+
+        provider = layer.dataProvider()
+        if provider is None or not provider.capabilities() & QgsRasterDataProvider.Size:
+            return None
+        # the cell and the tile extents come from the cached grid, not from the layer extent of every pick
+        grid = geoTransformCache().gridTransform(layer)
+        cell = grid.cellAt(x, y)
+        if cell is None:
+            return None
+        self._watch(layer)
+
+        col, row = cell
+        size = RasterSampler.TileSize
+        tileCol, tileRow = col // size, row // size
+        layerId = layer.id()
+        bands = range(1, layer.bandCount() + 1)
+        sample = RasterSample(layer.name(), [layer.bandName(band) for band in bands], col, row)
+
+        blocks = {}
+        requests = []
+        for band in bands:
+            key = (layerId, band, tileCol, tileRow)
+            block = self.cache.get(key)
+            if block is None:
+                requests.append(self._tileRequest(layerId, grid, band, tileCol, tileRow))
+            else:
+                blocks[key] = block
+        if not requests:
+            sample.resolve(self._values(blocks, layerId, bands, col, row))
+            return sample
+
+        # a new pick supersedes the previous one, do not keep a slow read of a point nobody looks at anymore
+        if self._task is not None:
+            self._task.cancel()
+        task = RasterTileReadTask(provider.clone(), requests)
+        task.onFinished = partial(self._readFinished, sample, blocks, layerId, bands, col, row)
+        self._task = task
+        _runningTasks.add(task)
+        QgsApplication.taskManager().addTask(task)
+        return sample
+
+    def _readFinished(self, sample, blocks, layerId, bands, col, row, task, result):
+        if self._task is task:
+            self._task = None
+        if not result:
+            sample.resolve(None, task.error or 'canceled')
+            return
+        for key, block in task.blocks.items():
+            self.cache.put(key, block)
+        blocks.update(task.blocks)
+        sample.resolve(self._values(blocks, layerId, bands, col, row))
+
+    @staticmethod
+    def _values(blocks, layerId, bands, col, row):
+        size = RasterSampler.TileSize
+        tileCol, tileRow = col // size, row // size
+        blockCol, blockRow = col - tileCol * size, row - tileRow * size
+        values = []
+        for band in bands:
+            block = blocks[(layerId, band, tileCol, tileRow)]
+            values.append(None if block.isNoData(blockRow, blockCol) else block.value(blockRow, blockCol))
+        return values
+
+    def _watch(self, layer):
+        layerId = layer.id()
+        if layerId in self._connections:
+            return
+        slot = partial(self.invalidateLayer, layerId)
+        layer.dataSourceChanged.connect(slot)
+        layer.dataChanged.connect(slot)
+        layer.willBeDeleted.connect(slot)
+        self._connections[layerId] = (layer, slot)
+
+    def invalidateLayer(self, layerId, *args):
+        self.cache.invalidateLayer(layerId)
+        connection = self._connections.pop(layerId, None)
+        if connection is not None:
+            layer, slot = connection
+            layer.dataSourceChanged.disconnect(slot)
+            layer.dataChanged.disconnect(slot)
+            layer.willBeDeleted.disconnect(slot)
+
+    def release(self):
+        if self._task is not None:
+            self._task.onFinished = None
+            self._task.cancel()
+            self._task = None
+        for layerId in list(self._connections):
+            self.invalidateLayer(layerId)
+        self.cache.clear()
+
+
+_rasterSampler = None
+
+
+def rasterSampler():
+    """ the sampler shared by the pick tool, sized by CoordinatePicker/RasterBlockCacheMB """
+    global _rasterSampler
+    if _rasterSampler is None:
+        megabytes = QgsSettings().value(RasterSampler.CacheSizeKey, RasterSampler.DefaultCacheSize, type=int)
+        _rasterSampler = RasterSampler(max(1, megabytes) * 1024 * 1024)
+    return _rasterSampler
+
+
+def releaseRasterSampler():
+    global _rasterSampler
+    if _rasterSampler is not None:
+        _rasterSampler.release()
+        _rasterSampler = None
@@ -0,0 +1,442 @@
+""" WGS84 vector layers drawn shifted to GCJ-02 or BD-09 on the fly
+
+A shifted layer is a QgsVectorLayer of the ShiftedLayerProvider, a read only python data provider in front of a
+WGS84 source layer. Only the features of the requested extent are read from the source, their vertices are
+shifted in batches and the shifted geometries are kept by feature id, so panning and zooming reuse them.
+"""
+import threading
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode
+
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import QObject
+from qgis.core import (
+    QgsAbstractFeatureIterator,
+    QgsAbstractFeatureSource,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsDataProvider,
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFeatureRequest,
+    QgsFields,
+    QgsGeometry,
+    QgsProject,
+    QgsProviderMetadata,
+    QgsProviderRegistry,
+    QgsRectangle,
+    QgsSettings,
+    QgsVectorDataProvider,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+    QgsWkbTypes
+)
+
+from .coord_systems import BD09, GCJ02, WGS84
+from .zoom_types import GcjGridKey
+
+SHIFTED_SYSTEMS = (GCJ02, BD09)
+
+epsg4326 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+
+class ShiftedGeometryCache:
+    """ shifted geometries by feature id, the least recently used are dropped beyond maxBytes
+
+    Feature sources snapshot the source layer on the main thread and are read on render threads. Every
+    invalidation starts a new generation, a geometry shifted from a snapshot older than that is not stored, so a
+    render running during an edit never leaves the old geometry behind.
+    """
+
+    # rough size of a QgsGeometry on top of its vertices
+    GeometryOverhead = 64
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._geometries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._geometries)
+
+    def get(self, fid):
+        with self._lock:
+            entry = self._geometries.get(fid)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._geometries.move_to_end(fid)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, fid, geometry, size, generation):
+        """ store the geometry of fid shifted from a snapshot of the given generation """
+        size += ShiftedGeometryCache.GeometryOverhead
+        with self._lock:
+            if generation != self.generation or size > self.maxBytes:
+                return
+            previous = self._geometries.pop(fid, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._geometries[fid] = (geometry, size)
+            self.bytes += size
+            while self.bytes > self.maxBytes:
+                _, (_, dropped) = self._geometries.popitem(last=False)
+                self.bytes -= dropped
+
+    def discard(self, fid):
+        with self._lock:
+            self.generation += 1
+            entry = self._geometries.pop(fid, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._geometries.clear()
+            self.bytes = 0
+
+
+class ShiftedFeatureSource(QgsAbstractFeatureSource):
+    """ snapshot of the source layer and the shift settings, created on the main thread """
+
+    def __init__(self, provider):
+        super().__init__()
+        self.fields = provider.fields()
+        self.crs = provider.crs()
+        self.system = provider.system
+        self.cache = provider.cache
+        self.grid = provider.gcjGrid()
+        self.generation = self.cache.generation
+        layer = provider.sourceLayer()
+        self.sourceFeatures = QgsVectorLayerFeatureSource(layer) if layer is not None else None
+
+    def getFeatures(self, request):
+        return QgsFeatureIterator(ShiftedFeatureIterator(self, request))
+
+    def shift(self, features):
+        """ set the shifted geometry of every feature, the vertices missing from the cache are shifted together """
+        cache = self.cache
+        missing = []
+        for feature in features:
+            if not feature.hasGeometry():
+                continue
+            geometry = cache.get(feature.id())
+            if geometry is None:
+                missing.append(feature)
+            else:
+                feature.setGeometry(geometry)
+        if not missing:
+            return
+
+        from .coord_transformer import convert_array
+        from .wkb_coords import WkbCoordinates
+        coords = WkbCoordinates([bytes(feature.geometry().asWkb()) for feature in missing])
+        if len(coords):
+            x, y = coords.xy()
+            coords.setXY(*convert_array(x, y, WGS84, self.system, self.grid))
+        for feature, wkb in zip(missing, coords.geometries()):
+            geometry = QgsGeometry()
+            geometry.fromWkb(wkb)
+            feature.setGeometry(geometry)
+            cache.put(feature.id(), geometry, len(wkb), self.generation)
+
+
+class ShiftedFeatureIterator(QgsAbstractFeatureIterator):
+    """ reads the source in batches of BatchSize features and shifts every batch at once
+
+    The request rectangle is in shifted coordinates. The source is queried with the rectangle grown by the largest
+    possible shift and every shifted geometry is tested against the rectangle itself. Expression filters, the
+    order and the limit are left to the base class, so they see the shifted geometries.
+    """
+
+    BatchSize = 1000
+
+    def __init__(self, source, request):
+        super().__init__(request)
+        self._source = source
+        self._pending = deque()
+        self._features = None
+        self._filterRect = QgsRectangle()
+        self._exact = bool(request.flags() & QgsFeatureRequest.ExactIntersect)
+        self._noGeometry = bool(request.flags() & QgsFeatureRequest.NoGeometry)
+
+        self._transform = QgsCoordinateTransform()
+        if request.destinationCrs().isValid() and request.destinationCrs() != source.crs:
+            self._transform = QgsCoordinateTransform(source.crs, request.destinationCrs(),
+                                                     request.transformContext())
+        try:
+            self._filterRect = self.filterRectToSourceCrs(self._transform)
+        except QgsCsException:
+            # the rectangle is outside of the area of the destination crs, nothing to return
+            return
+        if source.sourceFeatures is not None:
+            self._sourceRequest = self._createSourceRequest(request)
+            self._features = source.sourceFeatures.getFeatures(self._sourceRequest)
+
+    def _createSourceRequest(self, request):
+        sourceRequest = QgsFeatureRequest()
+        if request.filterType() == QgsFeatureRequest.FilterFid:
+            sourceRequest.setFilterFid(request.filterFid())
+        elif request.filterType() == QgsFeatureRequest.FilterFids:
+            sourceRequest.setFilterFids(request.filterFids())
+        if not self._filterRect.isNull():
+            sourceRequest.setFilterRect(self._filterRect.buffered(ShiftedLayerProvider.ExtentMargin))
+        elif self._noGeometry:
+            sourceRequest.setFlags(QgsFeatureRequest.NoGeometry)
+        # an expression filter may use any attribute
+        if request.flags() & QgsFeatureRequest.SubsetOfAttributes and \
+                request.filterType() != QgsFeatureRequest.FilterExpression:
+            sourceRequest.setSubsetOfAttributes(request.subsetOfAttributes())
+        return sourceRequest
+
+    def _fetchBatch(self):
+        features = list(islice(self._features, ShiftedFeatureIterator.BatchSize))
+        if not features:
+            return False
+        if not self._noGeometry or not self._filterRect.isNull():
+            self._source.shift(features)
+        for feature in features:
+            if not self._filterRect.isNull():
+                if not feature.hasGeometry() or not feature.geometry().boundingBox().intersects(self._filterRect):
+                    continue
+                if self._exact and not feature.geometry().intersects(self._filterRect):
+                    continue
+            if self._noGeometry:
+                feature.clearGeometry()
+            else:
+                self.geometryToDestinationCrs(feature, self._transform)
+            self._pending.append(feature)
+        return True
+
+    def fetchFeature(self, f):
+        if self._features is None:
+            return False
+        while not self._pending:
+            if not self._fetchBatch():
+                return False
+        feature = self._pending.popleft()
+        f.setId(feature.id())
+        f.setFields(self._source.fields, False)
+        f.setAttributes(feature.attributes())
+        if feature.hasGeometry():
+            f.setGeometry(feature.geometry())
+        else:
+            f.clearGeometry()
+        f.setValid(True)
+        return True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        feature = QgsFeature()
+        if not self.nextFeature(feature):
+            raise StopIteration
+        return feature
+
+    def rewind(self):
+        if self._features is None:
+            return False
+        self._pending.clear()
+        self._features = self._source.sourceFeatures.getFeatures(self._sourceRequest)
+        return True
+
+    def close(self):
+        self._pending.clear()
+        self._features = None
+        return True
+
+
+class ShiftedLayerProvider(QgsVectorDataProvider):
+    """ read only provider of a WGS84 vector layer shifted to one of SHIFTED_SYSTEMS
+
+    The uri names the source layer of the current project and the target system, see shiftedLayerUri. Edits of the
+    source drop the cached geometries they touch, a commit, a rollback or a reload of the source drops them all.
+    """
+
+    ProviderKey = 'coordinate_picker_shifted'
+    Description = 'Coordinate Picker shifted layer'
+    CacheSizeKey = 'CoordinatePicker/ShiftedCacheSize'
+    DefaultCacheSize = 64  # MB
+    # degrees, more than the gcj-02 and bd-09 offsets combined anywhere in China
+    ExtentMargin = 0.02
+
+    @classmethod
+    def createProvider(cls, uri, providerOptions, flags=QgsDataProvider.ReadFlags()):
+        return ShiftedLayerProvider(uri, providerOptions, flags)
+
+    def __init__(self, uri='', providerOptions=QgsDataProvider.ProviderOptions(), flags=QgsDataProvider.ReadFlags()):
+        super().__init__(uri, providerOptions, flags)
+        parameters = dict(parse_qsl(uri))
+        self.sourceId = parameters.get('source')
+        self.system = parameters.get('system')
+        self.cache = ShiftedGeometryCache(QgsSettings().value(
+            ShiftedLayerProvider.CacheSizeKey, ShiftedLayerProvider.DefaultCacheSize, type=int) * 1024 * 1024)
+        self._gridMode = None
+        self._connections = []
+
+        self._sourceLayer = QgsProject.instance().mapLayer(self.sourceId) if self.sourceId else None
+        if not isinstance(self._sourceLayer, QgsVectorLayer):
+            self._sourceLayer = None
+            return
+        layer = self._sourceLayer
+        connections = self._connections
+        connections.append(layer.geometryChanged.connect(self._geometryChanged))
+        connections.append(layer.featureDeleted.connect(self.cache.discard))
+        connections.append(layer.afterCommitChanges.connect(self._sourceChanged))
+        connections.append(layer.afterRollBack.connect(self._sourceChanged))
+        if layer.dataProvider() is not None:
+            connections.append(layer.dataProvider().dataChanged.connect(self._sourceChanged))
+        connections.append(layer.willBeDeleted.connect(self._sourceDeleted))
+        # the source outlives a removed shifted layer, its signals must not reach the dead provider
+        self.destroyed.connect(partial(_disconnectAll, connections))
+
+    def teardown(self):
+        """ stop following the source layer """
+        _disconnectAll(self._connections)
+
+    def sourceLayer(self):
+        if self._sourceLayer is not None and sip.isdeleted(self._sourceLayer):
+            self._sourceLayer = None
+        return self._sourceLayer
+
+    def _geometryChanged(self, fid, geometry):
+        self.cache.discard(fid)
+
+    def _sourceChanged(self):
+        self.cache.clear()
+        self.dataChanged.emit()
+
+    def _sourceDeleted(self):
+        self.teardown()
+        self._sourceLayer = None
+        self.cache.clear()
+
+    def gcjGrid(self):
+        """ the offset grid in grid mode, switching the mode drops the cached geometries """
+        gridMode = QgsSettings().value(GcjGridKey, False, type=bool)
+        if gridMode != self._gridMode:
+            if self._gridMode is not None:
+                self.cache.clear()
+            self._gridMode = gridMode
+        if not gridMode:
+            return None
+        from .gcj_grid import settingsOffsetGrid
+        grid = settingsOffsetGrid()
+        # build or map the grid file here on the main thread, render threads would race for the same temporary file
+        grid.load()
+        return grid
+
+    def featureSource(self):
+        return ShiftedFeatureSource(self)
+
+    def getFeatures(self, request=QgsFeatureRequest()):
+        return QgsFeatureIterator(ShiftedFeatureIterator(ShiftedFeatureSource(self), request))
+
+    def name(self):
+        return ShiftedLayerProvider.ProviderKey
+
+    def description(self):
+        return ShiftedLayerProvider.Description
+
+    def dataSourceUri(self, expandAuthConfig=True):
+        return shiftedLayerUri(self.sourceId, self.system)
+
+    def storageType(self):
+        return 'Shifted view of a layer'
+
+    def isValid(self):
+        layer = self.sourceLayer()
+        return layer is not None and self.system in SHIFTED_SYSTEMS and layer.crs() == epsg4326
+
+    def capabilities(self):
+        return QgsVectorDataProvider.SelectAtId
+
+    def wkbType(self):
+        layer = self.sourceLayer()
+        return layer.wkbType() if layer is not None else QgsWkbTypes.NoGeometry
+
+    def fields(self):
+        layer = self.sourceLayer()
+        return layer.fields() if layer is not None else QgsFields()
+
+    def featureCount(self):
+        layer = self.sourceLayer()
+        return layer.featureCount() if layer is not None else 0
+
+    def crs(self):
+        return epsg4326
+
+    def extent(self):
+        layer = self.sourceLayer()
+        if layer is None or layer.extent().isNull():
+            return QgsRectangle()
+        return layer.extent().buffered(ShiftedLayerProvider.ExtentMargin)
+
+    def updateExtents(self):
+        pass
+
+
+def _disconnectAll(connections):
+    for connection in connections:
+        QObject.disconnect(connection)
+    del connections[:]
+
+
+def shiftedLayerUri(sourceId, system):
+    return urlencode([('source', sourceId or ''), ('system', system or '')])
+
+
+def registerShiftedLayerProvider():
+    """ register the provider once per QGIS session, providers can not be unregistered """
+    registry = QgsProviderRegistry.instance()
+    if ShiftedLayerProvider.ProviderKey in registry.providerList():
+        return
+    registry.registerProvider(QgsProviderMetadata(ShiftedLayerProvider.ProviderKey, ShiftedLayerProvider.Description,
+                                                  ShiftedLayerProvider.createProvider))
+
+
+def linkShiftedLayers(layers):
+    """ repaint the shifted layers among layers whenever their source layer repaints, like after an edit """
+    for layer in layers:
+        if not isinstance(layer, QgsVectorLayer) or layer.providerType() != ShiftedLayerProvider.ProviderKey:
+            continue
+        source = QgsProject.instance().mapLayer(dict(parse_qsl(layer.source())).get('source', ''))
+        if source is not None:
+            source.repaintRequested.connect(layer.triggerRepaint)
+
+
+def createShiftedLayer(sourceLayer, system):
+    """ a shifted view of a WGS84 vector layer of the current project, styled like it
+
+    Raises:
+        ValueError: when the layer is not a WGS84 vector layer or system is not one of SHIFTED_SYSTEMS
+    """
+    if not isinstance(sourceLayer, QgsVectorLayer):
+        raise ValueError('{} is not a vector layer'.format(sourceLayer.name() if sourceLayer is not None else 'None'))
+    if QgsProject.instance().mapLayer(sourceLayer.id()) is None:
+        raise ValueError('{} is not a layer of the project'.format(sourceLayer.name()))
+    if sourceLayer.crs() != epsg4326:
+        raise ValueError('{} is not a WGS84 layer'.format(sourceLayer.name()))
+    if system not in SHIFTED_SYSTEMS:
+        raise ValueError('layers can not be shifted to {}'.format(system))
+    registerShiftedLayerProvider()
+    layer = QgsVectorLayer(shiftedLayerUri(sourceLayer.id(), system), '{} ({})'.format(sourceLayer.name(), system),
+                           ShiftedLayerProvider.ProviderKey)
+    if not layer.isValid():
+        raise ValueError('failed to create the shifted layer of {}'.format(sourceLayer.name()))
+    if sourceLayer.renderer() is not None:
+        layer.setRenderer(sourceLayer.renderer().clone())
+    if sourceLayer.labeling() is not None:
+        layer.setLabeling(sourceLayer.labeling().clone())
+        layer.setLabelsEnabled(sourceLayer.labelsEnabled())
+    return layer
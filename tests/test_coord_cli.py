@@ -0,0 +1,62 @@
+import csv
+import io
+
+import pytest
+
+from coordinate_picker import coord_cli
+from coordinate_picker import coord_transformer as ct
+
+
+def options(source='GCJ02', target='WGS84', delimiter=',', precision=None):
+    return {'source': source, 'target': target, 'xColumn': 0, 'yColumn': 1, 'delimiter': delimiter,
+            'precision': precision, 'gridDirectory': None}
+
+
+def test_readChunks_sizes_and_blank_lines():
+    stream = io.StringIO('1,2\r\n\n3,4\n5,6\n')
+    assert list(coord_cli._readChunks(stream, 2)) == [['1,2', '3,4'], ['5,6']]
+
+
+def test_readChunks_keeps_quoted_line_breaks_in_one_record():
+    text = '1,2,"first\nsecond"\n3,4,"a\n\nb"\n5,6,plain\n'
+    chunks = list(coord_cli._readChunks(io.StringIO(text), 1))
+    assert chunks == [['1,2,"first\nsecond"'], ['3,4,"a\n\nb"'], ['5,6,plain']]
+    assert [row[2] for chunk in chunks for row in csv.reader(chunk)] == ['first\nsecond', 'a\n\nb', 'plain']
+
+
+def test_readChunks_without_quoting():
+    assert list(coord_cli._readChunks(io.StringIO('1 2 "x\n3 4\n'), 10, quoting=False)) == [['1 2 "x', '3 4']]
+
+
+def test_readChunks_unterminated_quote():
+    assert list(coord_cli._readChunks(io.StringIO('1,2\n3,4,"open\n5,6\n'), 10)) == [['1,2', '3,4,"open\n5,6']]
+
+
+def test_convertLines_box_edge_row():
+    # used to block the worker forever in the uncapped inverse
+    text, converted, skipped = coord_cli.convertLines(['72.004,40.0', '116.404,39.915', 'x,y'], options())
+    rows = [line.split(',') for line in text.splitlines()]
+    assert (converted, skipped) == (2, 1)
+    assert abs(float(rows[0][0]) - 72.004) < 0.01 and abs(float(rows[0][1]) - 40.0) < 0.01
+    expected = ct.gcj2wgs(116.404, 39.915)
+    assert (float(rows[1][0]), float(rows[1][1])) == pytest.approx(expected, abs=1e-12)
+    assert rows[2] == ['x', 'y']
+
+
+def test_convertLines_quoted_multiline_field():
+    lines = list(coord_cli._readChunks(io.StringIO('116.404,39.915,"two\nlines"\n'), 10))[0]
+    text, converted, skipped = coord_cli.convertLines(lines, options(precision=6))
+    assert converted == 1
+    assert list(csv.reader(io.StringIO(text)))[0][2] == 'two\nlines'
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_convertStream_keeps_order_with_edge_rows(jobs):
+    lines = ['72.004,40.0', '110.0,0.829315'] + ['{},{}'.format(100 + i * 0.01, 30) for i in range(50)]
+    out = io.StringIO()
+    converted, skipped = coord_cli.convertStream(io.StringIO('\n'.join(lines) + '\n'), out, options(), jobs=jobs,
+                                                 chunkLines=7)
+    assert (converted, skipped) == (len(lines), 0)
+    rows = [line.split(',') for line in out.getvalue().splitlines()]
+    assert len(rows) == len(lines)
+    assert float(rows[-1][0]) == pytest.approx(ct.gcj2wgs(100.49, 30)[0], abs=1e-12)
@@ -0,0 +1,79 @@
+import pytest
+
+from coordinate_picker import coord_parser
+from coordinate_picker.coord_parser import CoordinateParseError, parseCoordinate, parseCoordinates
+
+
+@pytest.mark.parametrize('text', ['116.4E, 39.9', '116.4E 39.9N', '39.9N, 116.4E', '39.9n 116.4e', '116.4 E, 39.9 N'])
+def test_hemisphere_suffixes(text):
+    assert parseCoordinate(text) == pytest.approx((116.4, 39.9))
+
+
+def test_exponents_stay_on_the_plain_path():
+    assert coord_parser._isPlainNumbers('1.164e2, 3.99E+1')
+    assert not coord_parser._isPlainNumbers('116.4E, 39.9')
+    assert parseCoordinate('1.164e2, 3.99E+1') == pytest.approx((116.4, 39.9))
+
+
+@pytest.mark.parametrize('text', ['POINT Z (116.4 39.9 3)', 'POINT M(116.4 39.9 7)', 'point zm (116.4 39.9 3 7)',
+                                  'POINT(116.4 39.9)'])
+def test_wkt_points_drop_z_and_m(text):
+    assert parseCoordinate(text) == pytest.approx((116.4, 39.9))
+
+
+def test_wkt_points_mixed_dimensions():
+    result = parseCoordinates('POINT Z (116.4 39.9 3)\nPOINT(116.5 40)\n')
+    assert result.coords.tolist() == [[116.4, 39.9], [116.5, 40.0]]
+
+
+@pytest.mark.parametrize('header', ['lon,lat', 'x;y', 'longitude latitude', '  Lon\tLat  '])
+def test_header_line_is_skipped(header):
+    result = parseCoordinates('{}\n116.4,39.9\n116.5,40\n'.format(header))
+    assert result.coords.tolist() == [[116.4, 39.9], [116.5, 40.0]]
+    assert result.kind == coord_parser.WGS84
+
+
+def test_errors_after_a_header_keep_their_line_number():
+    with pytest.raises(CoordinateParseError) as error:
+        parseCoordinates('lon,lat\n116.4,39.9\n116.5,\n')
+    assert error.value.lineNumber == 3
+
+
+def test_mixed_plain_and_dms_lines():
+    text = 'lon lat\n116.4 39.9\n39°54\'26.4"N 116°23\'28.8"E\n116.5, 40\n40.1N, 116.6E\n'
+    result = parseCoordinates(text)
+    expected = [116.4, 39.9, 116.3913333, 39.9073333, 116.5, 40.0, 116.6, 40.1]
+    assert result.coords.ravel().tolist() == pytest.approx(expected)
+    assert result.kind == coord_parser.WGS84
+
+
+def test_plain_text_detection():
+    result = parseCoordinates('39.9, 116.4\n40.0, 116.5')
+    assert result.swapped
+    assert result.coords.tolist() == [[116.4, 39.9], [116.5, 40.0]]
+    assert parseCoordinates('12\n13').kind == coord_parser.RASTER_INDEX
+    assert parseCoordinates('11640000 3990000').kind == coord_parser.NI
+
+
+def test_invalid_values():
+    with pytest.raises(CoordinateParseError):
+        parseCoordinates('116.4 39.9 1')
+    with pytest.raises(CoordinateParseError):
+        parseCoordinates('')
+    with pytest.raises(CoordinateParseError):
+        parseCoordinate('116.4,39.9\n116.5,40')
+
+
+@pytest.mark.parametrize('text, lineNumber', [('1e400 5', 1), ('116.4 39.9\n\n-1e999, 3', 3), ('12\n1e999', 2),
+                                              ('116.4E 39.9N\n{}E, 1N'.format('9' * 400), 2),
+                                              ('lon lat\n116.4 39.9\n1e400, 39.9N', 3)])
+def test_values_out_of_the_float_range(text, lineNumber):
+    with pytest.raises(CoordinateParseError) as error:
+        parseCoordinates(text)
+    assert error.value.lineNumber == lineNumber
+
+
+@pytest.mark.parametrize('text', ['inf 39.9', '116.4, nan', 'POINT(inf 1)'])
+def test_non_finite_tokens(text):
+    with pytest.raises(CoordinateParseError):
+        parseCoordinates(text)
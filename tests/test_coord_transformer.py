@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from coordinate_picker import coord_transformer as ct
+
+# gcj points just inside the west and south edges of the outOfChina box, their iterates used to oscillate forever
+EDGE_POINTS = [(72.004, 40.0), (110.0, 0.829315)]
+
+
+def edgeSamples():
+    west = (np.linspace(72.0, 72.05, 2001), np.full(2001, 40.0))
+    south = (np.full(2001, 110.0), np.linspace(0.82, 0.85, 2001))
+    return [west, south]
+
+
+def interiorPoints(count=2000):
+    rng = np.random.default_rng(3)
+    return ct.wgs2gcj_array(rng.uniform(73, 135, count), rng.uniform(18, 53, count))
+
+
+@pytest.mark.parametrize('lon, lat', EDGE_POINTS)
+def test_gcj2wgs_stops_at_box_edges(lon, lat):
+    wgsLon, wgsLat = ct.gcj2wgs(lon, lat)
+    assert abs(wgsLon - lon) < 0.01 and abs(wgsLat - lat) < 0.01
+
+
+@pytest.mark.parametrize('method', ['fixed', 'newton'])
+def test_gcj2wgs_solve_stops_at_box_edges(method):
+    for lon, lat in edgeSamples():
+        result = ct.gcj2wgs_solve(lon, lat, method=method)
+        assert result.iterations.max() <= 5
+        # no exact inverse exists there, the answer stays within the size of the offsets
+        assert result.residual.max() < 0.01
+
+
+def test_gcj2wgs_array_matches_scalar():
+    gcjLon, gcjLat = interiorPoints()
+    lon, lat = ct.gcj2wgs_array(gcjLon, gcjLat)
+    expected = np.array([ct.gcj2wgs(x, y) for x, y in zip(gcjLon, gcjLat)])
+    np.testing.assert_array_equal(lon, expected[:, 0])
+    np.testing.assert_array_equal(lat, expected[:, 1])
+    for edgeLon, edgeLat in edgeSamples():
+        lon, lat = ct.gcj2wgs_array(edgeLon, edgeLat)
+        expected = np.array([ct.gcj2wgs(x, y) for x, y in zip(edgeLon, edgeLat)])
+        np.testing.assert_array_equal(lon, expected[:, 0])
+        np.testing.assert_array_equal(lat, expected[:, 1])
+
+
+@pytest.mark.parametrize('method', ['fixed', 'newton'])
+def test_gcj2wgs_solve_round_trip(method):
+    rng = np.random.default_rng(4)
+    wgsLon, wgsLat = rng.uniform(73, 135, 2000), rng.uniform(18, 53, 2000)
+    result = ct.gcj2wgs_solve(*ct.wgs2gcj_array(wgsLon, wgsLat), method=method)
+    assert np.abs(result.lon - wgsLon).max() < 1e-6
+    assert np.abs(result.lat - wgsLat).max() < 1e-6
+    assert result.residual.max() < 1e-6
+
+
+def test_gcj2wgs_solve_honours_the_cap():
+    result = ct.gcj2wgs_solve(*interiorPoints(), maxIterations=1)
+    assert result.iterations.max() == 1
+
+
+def test_bd2wgs_at_box_edge():
+    bdLon, bdLat = ct.gcj2bd(72.004, 40.0)
+    lon, lat = ct.bd2wgs_array([bdLon], [bdLat])
+    assert abs(lon[0] - 72.004) < 0.01 and abs(lat[0] - 40.0) < 0.01
+
+
+@pytest.mark.parametrize('method', ['fixed', 'newton'])
+def test_gcj2wgs_inverse_just_inside_the_box(method):
+    # the first step of these lands a hair outside the west edge, where the offsets are zero
+    wgsLon = np.array([72.00400740318, 72.00400710586834, 72.0045, 110.0])
+    wgsLat = np.array([15.262198484742186, 6.175778476213972, 30.0, 0.8296])
+    gcjLon, gcjLat = ct.wgs2gcj_array(wgsLon, wgsLat)
+    inside = ~ct.outOfChina_array(gcjLon, gcjLat)
+    result = ct.gcj2wgs_solve(gcjLon[inside], gcjLat[inside], method=method)
+    assert np.abs(result.lon - wgsLon[inside]).max() < 1e-6
+    assert np.abs(result.lat - wgsLat[inside]).max() < 1e-6
+    scalar = np.array([ct.gcj2wgs(x, y) for x, y in zip(gcjLon[inside], gcjLat[inside])])
+    assert np.abs(scalar - np.column_stack([wgsLon[inside], wgsLat[inside]])).max() < 1e-6
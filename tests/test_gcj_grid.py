@@ -0,0 +1,82 @@
+import threading
+
+import numpy as np
+import pytest
+
+from coordinate_picker import coord_transformer as ct
+from coordinate_picker.gcj_grid import GcjOffsetGrid
+
+# a coarse grid builds in a fraction of a second, its interpolation error stays below 3e-5 degrees
+TOLERANCE = 3e-5
+
+
+@pytest.fixture(scope='module')
+def grid(tmp_path_factory):
+    return GcjOffsetGrid(str(tmp_path_factory.mktemp('gcj_grid')), 24, 4)
+
+
+def edgePoints(count=20000):
+    """ wgs points within about 1 km inside the edges of the outOfChina box """
+    rng = np.random.default_rng(12)
+    lon = rng.uniform(72.004, 137.8347, count)
+    lat = rng.uniform(0.8293, 55.8271, count)
+    depth = rng.uniform(0, 0.009, count)
+    side = rng.integers(0, 4, count)
+    lon = np.where(side == 0, 72.004 + depth, np.where(side == 1, 137.8347 - depth, lon))
+    lat = np.where(side == 2, 0.8293 + depth, np.where(side == 3, 55.8271 - depth, lat))
+    return lon, lat
+
+
+def test_forward_and_inverse_in_the_interior(grid):
+    rng = np.random.default_rng(3)
+    wgsLon, wgsLat = rng.uniform(73, 135, 5000), rng.uniform(18, 53, 5000)
+    gcjLon, gcjLat = ct.wgs2gcj_array(wgsLon, wgsLat)
+    lon, lat = grid.wgs2gcj(wgsLon, wgsLat)
+    assert max(np.abs(lon - gcjLon).max(), np.abs(lat - gcjLat).max()) < TOLERANCE
+    lon, lat = grid.gcj2wgs(gcjLon, gcjLat)
+    assert max(np.abs(lon - wgsLon).max(), np.abs(lat - wgsLat).max()) < TOLERANCE
+
+
+def test_inverse_near_the_box_edges_matches_the_solver(grid):
+    wgsLon, wgsLat = edgePoints()
+    # points a hair inside the south edge, their iterates used to jump out of the box and back
+    wgsLon = np.concatenate([wgsLon, [74.85232830786582, 117.17104516588391, 96.65053581316052, 118.89582603914604]])
+    wgsLat = np.concatenate([wgsLat, [0.8293009936678297, 0.8293000427170681, 0.8293033802334289, 0.8293001539947177]])
+    gcjLon, gcjLat = ct.wgs2gcj_array(wgsLon, wgsLat)
+    lon, lat = grid.gcj2wgs(gcjLon, gcjLat)
+    expectedLon, expectedLat = ct.gcj2wgs_array(gcjLon, gcjLat)
+    assert max(np.abs(lon - expectedLon).max(), np.abs(lat - expectedLat).max()) < TOLERANCE
+
+
+def test_inverse_keeps_points_out_of_the_box(grid):
+    gcjLon = np.array([10.0, 72.0039, 140.0, 116.4])
+    gcjLat = np.array([40.0, 30.0, 40.0, 60.0])
+    lon, lat = grid.gcj2wgs(gcjLon, gcjLat)
+    np.testing.assert_array_equal(lon, gcjLon)
+    np.testing.assert_array_equal(lat, gcjLat)
+
+
+def test_build_keeps_the_rename_error_and_removes_the_partial_file(tmp_path, monkeypatch):
+    def fail(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr('coordinate_picker.gcj_grid.os.replace', fail)
+    grid = GcjOffsetGrid(str(tmp_path), 4, 1)
+    with pytest.raises(OSError, match='disk full'):
+        grid.build()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_loads_build_the_file_once(tmp_path, monkeypatch):
+    grid = GcjOffsetGrid(str(tmp_path), 4, 1)
+    builds = []
+    build = grid.build
+    monkeypatch.setattr(GcjOffsetGrid, 'build', lambda self: builds.append(build()))
+    assert not grid.isBuilt()
+    threads = [threading.Thread(target=grid.load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert grid.isBuilt() and grid.isLoaded()
+    assert len(builds) == 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from coordinate_picker import coord_transformer as ct
+from coordinate_picker.coord_formatter import CoordFormater as Coordinate
+
+
+def randomPoints(count=2000):
+    rng = np.random.default_rng(9)
+    return rng.uniform(-179.9, 179.9, count), rng.uniform(-89.9, 89.9, count)
+
+
+def test_level_0_splits_the_world_at_the_prime_meridian():
+    assert ct.nds_tile_id(116.4, 39.9, 0) == 1 << 16
+    assert ct.nds_tile_id(116.4, -39.9, 0) == 1 << 16
+    assert ct.nds_tile_id(-116.4, 39.9, 0) == (1 << 16) | 1
+    assert ct.nds_tile_bounds(1 << 16) == (0.0, -90.0, 180.0, 90.0)
+    assert ct.nds_tile_bounds((1 << 16) | 1) == (-180.0, -90.0, 0.0, 90.0)
+
+
+@pytest.mark.parametrize('level', [1, 5, 13, 15])
+def test_tiles_contain_their_points(level):
+    size = 180.0 / (1 << level)
+    for lon, lat in zip(*randomPoints(500)):
+        tileId = ct.nds_tile_id(lon, lat, level)
+        assert ct.nds_tile_decode(tileId)[0] == level
+        minLon, minLat, maxLon, maxLat = ct.nds_tile_bounds(tileId)
+        assert maxLon - minLon == pytest.approx(size) and maxLat - minLat == pytest.approx(size)
+        assert minLon <= lon < maxLon and minLat <= lat < maxLat
+
+
+@pytest.mark.parametrize('level', range(ct.NDS_MAX_LEVEL + 1))
+def test_array_functions_match_scalar(level):
+    lon, lat = randomPoints()
+    tileIds = ct.nds_tile_id_array(lon, lat, level)
+    expected = [ct.nds_tile_id(x, y, level) for x, y in zip(lon.tolist(), lat.tolist())]
+    assert tileIds.tolist() == expected
+
+    decoded = ct.nds_tile_decode_array(tileIds)
+    assert np.column_stack(decoded).tolist() == [list(ct.nds_tile_decode(tileId)) for tileId in expected]
+    bounds = ct.nds_tile_bounds_array(tileIds)
+    assert np.column_stack(bounds).tolist() == [list(ct.nds_tile_bounds(tileId)) for tileId in expected]
+
+
+def test_decode_array_of_mixed_levels():
+    lon, lat = randomPoints(16)
+    tileIds = [ct.nds_tile_id(x, y, level) for level, (x, y) in enumerate(zip(lon.tolist(), lat.tolist()))]
+    level, tileX, tileY = ct.nds_tile_decode_array(tileIds)
+    assert level.tolist() == list(range(16))
+    assert list(zip(level.tolist(), tileX.tolist(), tileY.tolist())) == [ct.nds_tile_decode(t) for t in tileIds]
+
+
+def test_invalid_levels_and_ids():
+    with pytest.raises(ValueError):
+        ct.nds_tile_id(116.4, 39.9, ct.NDS_MAX_LEVEL + 1)
+    with pytest.raises(ValueError):
+        ct.nds_tile_id_array([116.4], [39.9], -1)
+    with pytest.raises(ValueError):
+        ct.nds_tile_decode(1 << 10)
+    with pytest.raises(ValueError):
+        ct.nds_tile_decode_array([1 << 16, 1 << 40])
+    with pytest.raises(ValueError):
+        ct.nds_tile_id_array([116.4, 116.5], [39.9, 40.0], 13, out=np.empty(3, dtype=np.int64))
+
+
+def test_formatter_shows_the_level():
+    tileId = ct.nds_tile_id(116.4, 39.9, 13)
+    coordinate = Coordinate(Coordinate.NDS_TILE, tileId, 13, 'roads')
+    assert coordinate.coordinate_str() == str(tileId)
+    assert repr(coordinate) == 'NDS Tile L13:\troads\t{}'.format(tileId)
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from coordinate_picker.coord_formatter import CoordFormater as Coordinate
+from coordinate_picker.pick_buffer import PickBuffer
+
+
+def sampleBuffer():
+    buffer = PickBuffer(capacity=2)
+    buffer.append({Coordinate.WGS84Coord: (116.4, 39.9), Coordinate.MapCoord: (116.4, 39.9),
+                   Coordinate.NI_ITE: (11640000, 3990000)}, 'roads, "main"')
+    buffer.append({Coordinate.MapCoord: (1.0, 2.0)}, 'no wgs84')
+    buffer.append({Coordinate.WGS84Coord: (121.5, 31.25), Coordinate.MapCoord: (13525000.5, 3664000.25)})
+    return buffer
+
+
+def test_geojson_features():
+    collection = json.loads(sampleBuffer().toGeoJSON())
+    assert collection['type'] == 'FeatureCollection'
+    assert [feature['geometry']['coordinates'] for feature in collection['features']] == [[116.4, 39.9],
+                                                                                          [121.5, 31.25]]
+    assert [feature['properties'] for feature in collection['features']] == [
+        {'layer': 'roads, "main"', 'project_x': 116.4, 'project_y': 39.9, 'lon': 116.4, 'lat': 39.9,
+         'ite_x': 11640000, 'ite_y': 3990000},
+        {'layer': 'Map', 'project_x': 13525000.5, 'project_y': 3664000.25, 'lon': 121.5, 'lat': 31.25,
+         'ite_x': None, 'ite_y': None},
+    ]
+
+
+def test_geojson_without_wgs84():
+    buffer = PickBuffer()
+    assert json.loads(buffer.toGeoJSON()) == {'type': 'FeatureCollection', 'features': []}
+    buffer.append({Coordinate.MapCoord: (1.0, 2.0)})
+    assert json.loads(buffer.toGeoJSON())['features'] == []
+
+
+def test_delimited_keeps_equal_columns_and_missing_values():
+    lines = sampleBuffer().toDelimited(',').split('\n')
+    assert lines[0] == 'layer,project_x,project_y,lon,lat,ite_x,ite_y'
+    assert lines[1:] == ['"roads, ""main""",116.4,39.9,116.4,39.9,11640000,3990000',
+                         'no wgs84,1.0,2.0,,,,',
+                         'Map,13525000.5,3664000.25,121.5,31.25,,']
+
+
+def test_geojson_writes_non_finite_values_as_null():
+    buffer = PickBuffer()
+    buffer.append({Coordinate.WGS84Coord: (116.4, 39.9), Coordinate.MapCoord: (float('nan'), float('inf'))})
+    buffer.append({Coordinate.WGS84Coord: (float('nan'), 39.9), Coordinate.MapCoord: (1.0, 2.0)})
+    collection = json.loads(buffer.toGeoJSON(), parse_constant=lambda name: pytest.fail('{} in GeoJSON'.format(name)))
+    assert [feature['geometry']['coordinates'] for feature in collection['features']] == [[116.4, 39.9]]
+    assert collection['features'][0]['properties']['project_x'] is None
+    assert collection['features'][0]['properties']['project_y'] is None
@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+from coordinate_picker.pick_history import PickHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = PickHistory(str(tmp_path / 'history' / 'pick_history.sqlite'))
+    yield history
+    history.close()
+
+
+def test_add_and_recent(history):
+    history.add('pick', 116.4, 39.9, 'roads', 'first')
+    history.add('zoom', 121.5, 31.2)
+    history.flush()
+    records = history.recent()
+    assert [(r.source, r.lon, r.lat, r.layer, r.description) for r in records] == [
+        ('zoom', 121.5, 31.2, None, None), ('pick', 116.4, 39.9, 'roads', 'first')]
+    assert history.count() == 2
+    assert '116.400000, 39.900000  roads' in records[1].label()
+
+
+def test_non_finite_points_are_skipped(history):
+    history.addMany('zoom', [116.4, math.nan, 117.0, math.inf], [39.9, 40.0, -math.inf, 41.0])
+    history.add('pick', math.nan, 39.9)
+    history.add('pick', 118.0, 42.0)
+    history.flush()
+    assert history.error is None
+    assert sorted((r.lon, r.lat) for r in history.recent()) == [(116.4, 39.9), (118.0, 42.0)]
+
+
+def test_nearest(history):
+    history.addMany('pick', [116.40, 116.41, 116.45, 120.0], [39.90, 39.90, 39.90, 30.0])
+    history.flush()
+    assert [r.lon for r in history.nearest(116.402, 39.9, 0.02)] == [116.40, 116.41]
+    assert [r.lon for r in history.nearest(116.402, 39.9, 0.1, limit=1)] == [116.40]
+    assert history.nearest(0.0, 0.0, 1.0) == []
+
+
+def test_inExtent_newest_first(history):
+    history.addMany('pick', [116.0 + i * 0.001 for i in range(10)], [40.0] * 10)
+    history.add('pick', 10.0, 10.0)
+    history.flush()
+    assert [r.lon for r in history.inExtent(116.0, 39.0, 116.0035, 41.0)] == [116.003, 116.002, 116.001, 116.0]
+    assert len(history.inExtent(100.0, 30.0, 130.0, 50.0, limit=3)) == 3
+    assert history.inExtent(0.0, 0.0, 1.0, 1.0) == []
+
+
+def test_inExtent_dense_extent_scans_from_the_newest(history, monkeypatch):
+    monkeypatch.setattr(PickHistory, 'ExtentScanLimit', 4)
+    history.addMany('pick', [116.0 + i * 0.001 for i in range(20)], [40.0] * 20)
+    history.flush()
+    assert [r.lon for r in history.inExtent(116.0, 39.0, 117.0, 41.0, limit=3)] == [116.019, 116.018, 116.017]
+
+
+def test_clear_and_reopen(tmp_path):
+    path = str(tmp_path / 'pick_history.sqlite')
+    history = PickHistory(path)
+    history.addMany('pick', [116.4, 116.5], [39.9, 40.0])
+    history.close()
+
+    history = PickHistory(path)
+    try:
+        assert history.count() == 2
+        history.clear()
+        assert history.count() == 0
+        assert history.inExtent(100.0, 30.0, 130.0, 50.0) == []
+        history.add('zoom', 116.4, 39.9)
+        history.flush()
+        assert [r.source for r in history.recent()] == ['zoom']
+    finally:
+        history.close()
@@ -0,0 +1,56 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from coordinate_picker import pick_stream
+
+
+def listen():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    received = []
+
+    def accept():
+        connection, _ = server.accept()
+        with connection, connection.makefile('rb') as stream:
+            for line in stream:
+                received.append(json.loads(line))
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server, received
+
+
+def waitFor(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_unencodable_messages_are_dropped_and_the_sender_keeps_running():
+    server, received = listen()
+    publisher = pick_stream.PickPublisher('tcp:127.0.0.1:{}'.format(server.getsockname()[1]))
+    try:
+        publisher.publish({'kind': 'first'})
+        publisher.publish({'kind': object()})
+        assert waitFor(lambda: publisher.unencodable == 1 and publisher.sent == 1)
+        publisher.publish({'kind': {1, 2}})
+        publisher.publish({'kind': 'last'})
+        assert waitFor(lambda: len(received) == 2)
+        assert received == [{'kind': 'first'}, {'kind': 'last'}]
+        stats = publisher.stats()
+        assert stats['unencodable'] == 2
+        assert stats['dropped'] == 2
+        assert publisher._sender.is_alive()
+    finally:
+        publisher.close()
+        server.close()
+
+
+def test_parseAddress_rejects_remote_hosts():
+    with pytest.raises(ValueError):
+        pick_stream.parseAddress('tcp:10.0.0.1:47800')
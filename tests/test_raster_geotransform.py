@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from coordinate_picker.raster_geotransform import GeoTransform, GeoTransformCache
+
+# 30 degree rotation, 2 x 3 map units per pixel
+ROTATED = (1000.0, 2 * np.cos(np.pi / 6), 3 * np.sin(np.pi / 6), 5000.0, 2 * np.sin(np.pi / 6), -3 * np.cos(np.pi / 6))
+
+
+class _Signal:
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def disconnect(self, slot):
+        self.slots.remove(slot)
+
+
+class _Layer:
+    """ the parts of a QgsRasterLayer the cache reads, a north up 10 x 5 extent grid of 2 x 3 units """
+
+    def __init__(self, layerId):
+        self._id = layerId
+        self.dataSourceChanged = _Signal()
+        self.dataChanged = _Signal()
+        self.willBeDeleted = _Signal()
+
+    def id(self):
+        return self._id
+
+    def providerType(self):
+        return 'memory'
+
+    def extent(self):
+        return self
+
+    def xMinimum(self):
+        return 100.0
+
+    def yMaximum(self):
+        return 50.0
+
+    def rasterUnitsPerPixelX(self):
+        return 2.0
+
+    def rasterUnitsPerPixelY(self):
+        return 3.0
+
+    def width(self):
+        return 10
+
+    def height(self):
+        return 5
+
+
+def test_rotated_round_trip():
+    transform = GeoTransform(ROTATED, 200, 100)
+    assert not transform.isNorthUp()
+    pixels = np.random.default_rng(4).uniform(0, 100, (1000, 2))
+    points = transform.pixelToMap(pixels)
+    np.testing.assert_allclose(transform.mapToPixel(points), pixels, atol=1e-9)
+    x, y = points[0]
+    col, row = pixels[0]
+    assert x == pytest.approx(ROTATED[0] + col * ROTATED[1] + row * ROTATED[2])
+    assert y == pytest.approx(ROTATED[3] + col * ROTATED[4] + row * ROTATED[5])
+
+
+def test_cell_at_the_edges():
+    # pixel sizes of powers of two have an exact inverse, so points exactly on the edges fall on one side
+    transform = GeoTransform.fromExtent(100.0, 50.0, 2.0, 4.0, 10, 5)
+    assert transform.cellAt(100.0, 50.0) == (0, 0)
+    assert transform.cellAt(119.999, 30.001) == (9, 4)
+    # the right and bottom edges belong to the next cells, outside of the raster
+    assert transform.cellAt(120.0, 40.0) is None
+    assert transform.cellAt(110.0, 30.0) is None
+    assert transform.cellAt(99.999, 40.0) is None
+    assert transform.cellAt(110.0, 50.001) is None
+    cols, rows, inside = transform.cellsAt([100.0, 119.999, 120.0], [50.0, 30.001, 40.0])
+    assert cols[:2].tolist() == [0, 9] and rows[:2].tolist() == [0, 4]
+    assert inside.tolist() == [True, True, False]
+
+
+def test_cell_at_agrees_with_the_cell_centers():
+    transform = GeoTransform(ROTATED, 20, 10)
+    rows, cols = np.divmod(np.arange(200), 20)
+    xs, ys = transform.cellCenters(rows, cols)
+    assert [transform.cellAt(x, y) for x, y in zip(xs.tolist(), ys.tolist())] == list(zip(cols.tolist(),
+                                                                                        rows.tolist()))
+
+
+def test_degenerate_transform():
+    with pytest.raises(ValueError, match='degenerate'):
+        GeoTransform((0.0, 1.0, 2.0, 0.0, 0.5, 1.0), 10, 10)
+    with pytest.raises(ValueError):
+        GeoTransform.fromExtent(0.0, 0.0, 0.0, 1.0, 10, 10)
+
+
+def test_cache_counts_grid_lookups_once():
+    cache = GeoTransformCache()
+    layer = _Layer('raster')
+    grid = cache.gridTransform(layer)
+    assert grid.isProviderGrid() and grid.cellAt(100.0, 50.0) == (0, 0)
+    assert cache.gridTransform(layer) is grid
+    assert cache.geoTransform(layer) is grid
+    assert cache.stats() == {'size': 1, 'grids': 1, 'hits': 2, 'misses': 1}
+
+    layer.dataChanged.slots[0]()
+    assert cache.stats()['size'] == 0 and cache.stats()['grids'] == 0
+    assert not layer.dataChanged.slots
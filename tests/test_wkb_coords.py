@@ -0,0 +1,71 @@
+import struct
+
+import numpy as np
+import pytest
+
+from coordinate_picker import coord_transformer as ct
+from coordinate_picker.wkb_coords import WkbCoordinates, wkbCoordinateRuns
+
+
+def point(x, y, bigEndian=False):
+    order = '>' if bigEndian else '<'
+    return struct.pack(order + 'BIdd', 0 if bigEndian else 1, 1, x, y)
+
+
+def lineString(coords, typeCode=2, dims=2):
+    return struct.pack('<BII', 1, typeCode, len(coords)) + b''.join(struct.pack('<' + 'd' * dims, *c) for c in coords)
+
+
+def polygon(rings):
+    data = struct.pack('<BII', 1, 3, len(rings))
+    for ring in rings:
+        data += struct.pack('<I', len(ring)) + b''.join(struct.pack('<dd', *c) for c in ring)
+    return data
+
+
+def multi(typeCode, parts):
+    return struct.pack('<BII', 1, typeCode, len(parts)) + b''.join(parts)
+
+
+def test_runs_of_nested_geometries():
+    ring = [(0, 0), (1, 0), (1, 1), (0, 0)]
+    wkb = multi(6, [polygon([ring, ring]), polygon([ring])])
+    end, runs = wkbCoordinateRuns(wkb)
+    assert end == len(wkb)
+    assert [(count, dims) for _, count, dims, _ in runs] == [(4, 2)] * 3
+
+
+def test_xy_round_trip_mixed_byte_orders_and_empty_geometries():
+    wkbs = [point(1.5, 2.5), None, point(3.0, 4.0, bigEndian=True), lineString([(5, 6), (7, 8)]), b'']
+    coords = WkbCoordinates(wkbs)
+    x, y = coords.xy()
+    np.testing.assert_array_equal(x, [1.5, 3.0, 5, 7])
+    np.testing.assert_array_equal(y, [2.5, 4.0, 6, 8])
+    coords.setXY(x + 1, y - 1)
+    out = coords.geometries()
+    assert out[1] is None and out[4] is None
+    assert struct.unpack('>dd', out[2][5:]) == (4.0, 3.0)
+    assert struct.unpack('<dd', out[0][5:]) == (2.5, 1.5)
+
+
+def test_z_values_are_left_alone():
+    # ISO LineString Z
+    wkb = lineString([(1, 2, 30), (3, 4, 40)], typeCode=1002, dims=3)
+    coords = WkbCoordinates([wkb])
+    coords.setXY(np.array([10.0, 20.0]), np.array([11.0, 21.0]))
+    values = struct.unpack('<dddddd', coords.geometries()[0][9:])
+    assert values == (10.0, 11.0, 30.0, 20.0, 21.0, 40.0)
+
+
+def test_unsupported_type():
+    with pytest.raises(ValueError):
+        WkbCoordinates([struct.pack('<BII', 1, 99, 0)])
+
+
+def test_gcj_chunk_with_box_edge_vertex():
+    # the conversion of a processing chunk, one vertex sits just inside the west edge of the box
+    coords = WkbCoordinates([lineString([(72.004, 40.0), (116.404, 39.915)]), point(110.0, 0.829315)])
+    x, y = coords.xy()
+    lon, lat = ct.convert_array(x, y, 'GCJ02', 'WGS84')
+    assert np.abs(lon - x).max() < 0.01 and np.abs(lat - y).max() < 0.01
+    assert (lon[1], lat[1]) == ct.gcj2wgs(116.404, 39.915)
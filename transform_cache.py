@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+from qgis.core import QgsCoordinateTransform, QgsProject
+
+
+class CoordinateTransformCache:
+    """ A small LRU cache of QgsCoordinateTransform objects
+
+    Transforms are keyed by source crs, destination crs and the project transform context, the context is not
+    part of the dictionary key, instead the whole cache is flushed whenever the project signals a change of its
+    crs or transform context.
+    """
+
+    def __init__(self, project=None, maxSize=16):
+        self._project = project if project is not None else QgsProject.instance()
+        self._maxSize = maxSize
+        self._transforms = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._project.crsChanged.connect(self.clear)
+        self._project.transformContextChanged.connect(self.clear)
+        self._project.cleared.connect(self.clear)
+
+    @staticmethod
+    def crsKey(crs):
+        # custom crs have no auth id
+        return crs.authid() or crs.toWkt()
+
+    def transform(self, srcCrs, dstCrs):
+        key = (self.crsKey(srcCrs), self.crsKey(dstCrs))
+        transform = self._transforms.get(key)
+        if transform is not None:
+            self.hits += 1
+            self._transforms.move_to_end(key)
+            return transform
+
+        self.misses += 1
+        transform = QgsCoordinateTransform(srcCrs, dstCrs, self._project.transformContext())
+        self._transforms[key] = transform
+        if len(self._transforms) > self._maxSize:
+            self._transforms.popitem(last=False)
+        return transform
+
+    def clear(self, *args):
+        self._transforms.clear()
+
+    def stats(self):
+        return {'size': len(self._transforms), 'hits': self.hits, 'misses': self.misses}
+
+    def release(self):
+        self._project.crsChanged.disconnect(self.clear)
+        self._project.transformContextChanged.disconnect(self.clear)
+        self._project.cleared.disconnect(self.clear)
+        self.clear()
+
+
+_transformCache = None
+
+
+def transformCache():
+    """ the cache shared by the pick and zoom tools """
+    global _transformCache
+    if _transformCache is None:
+        _transformCache = CoordinateTransformCache()
+    return _transformCache
+
+
+def releaseTransformCache():
+    global _transformCache
+    if _transformCache is not None:
+        _transformCache.release()
+        _transformCache = None
@@ -0,0 +1,139 @@
+from struct import unpack_from
+
+import numpy as np
+
+# wkb geometry types by their nesting, curved and surface types share the layouts of the simple ones
+_POINT_TYPES = {1}
+_SEQUENCE_TYPES = {2, 8}
+_RING_TYPES = {3, 17}
+_COLLECTION_TYPES = {4, 5, 6, 7, 9, 10, 11, 12, 15, 16}
+
+_EWKB_Z = 0x80000000
+_EWKB_M = 0x40000000
+_EWKB_SRID = 0x20000000
+
+_DOUBLE_BYTES = np.arange(8)
+_SWAPPED_DOUBLE_BYTES = _DOUBLE_BYTES[::-1].copy()
+
+
+def _geometryType(typeCode):
+    """ split an ISO or EWKB type code into the base type and the number of doubles per vertex """
+    dims = 2
+    if typeCode & (_EWKB_Z | _EWKB_M | _EWKB_SRID):
+        dims += bool(typeCode & _EWKB_Z) + bool(typeCode & _EWKB_M)
+        return typeCode & 0xffff, dims, bool(typeCode & _EWKB_SRID)
+    flavour, baseType = divmod(typeCode, 1000)
+    if flavour == 1 or flavour == 2:
+        dims = 3
+    elif flavour == 3:
+        dims = 4
+    return baseType, dims, False
+
+
+def wkbCoordinateRuns(wkb, offset=0, runs=None):
+    """ find the coordinate runs of a wkb geometry
+
+    A run is a sequence of vertices stored back to back, the coordinates themselves are not read.
+
+    Arguments:
+        wkb {bytes} -- wkb or ewkb geometry
+
+    Keyword Arguments:
+        offset {int} -- position of the geometry in wkb (default: {0})
+        runs {list} -- list the runs are appended to (default: {None})
+
+    Returns:
+        tuple -- end position of the geometry, list of (offset, count, dims, bigEndian) runs
+    """
+    if runs is None:
+        runs = []
+    bigEndian = wkb[offset] == 0
+    order = '>' if bigEndian else '<'
+    typeCode, = unpack_from(order + 'I', wkb, offset + 1)
+    baseType, dims, hasSrid = _geometryType(typeCode)
+    offset += 9 if hasSrid else 5
+
+    if baseType in _POINT_TYPES:
+        runs.append((offset, 1, dims, bigEndian))
+        return offset + 8 * dims, runs
+    count, = unpack_from(order + 'I', wkb, offset)
+    offset += 4
+    if baseType in _SEQUENCE_TYPES:
+        runs.append((offset, count, dims, bigEndian))
+        return offset + 8 * dims * count, runs
+    if baseType in _RING_TYPES:
+        for _ in range(count):
+            points, = unpack_from(order + 'I', wkb, offset)
+            offset += 4
+            runs.append((offset, points, dims, bigEndian))
+            offset += 8 * dims * points
+        return offset, runs
+    if baseType in _COLLECTION_TYPES:
+        for _ in range(count):
+            offset, runs = wkbCoordinateRuns(wkb, offset, runs)
+        return offset, runs
+    raise ValueError('unsupported wkb geometry type {}'.format(typeCode))
+
+
+class WkbCoordinates:
+    """ x/y arrays of all vertices of a batch of wkb geometries
+
+    The geometries are concatenated into one buffer, the vertices are read and written back with a single
+    fancy-index operation each, so the cost per vertex does not depend on how the vertices are split into
+    geometries, parts and rings. z and m values are left untouched.
+    """
+
+    __slots__ = ('_buffer', '_bounds', '_xIndex', '_yIndex')
+
+    def __init__(self, wkbs):
+        """
+        Arguments:
+            wkbs {list} -- wkb geometries as bytes, None or b'' for features without geometry
+        """
+        data = b''.join(wkb or b'' for wkb in wkbs)
+        bounds = [0]
+        runs = []
+        position = 0
+        for wkb in wkbs:
+            if wkb:
+                position, runs = wkbCoordinateRuns(data, position, runs)
+            bounds.append(position)
+        self._buffer = np.frombuffer(data, dtype=np.uint8).copy()
+        self._bounds = bounds
+
+        if runs:
+            starts, counts, dims, bigEndian = (np.array(column) for column in zip(*runs))
+        else:
+            starts = counts = dims = bigEndian = np.zeros(0, dtype=np.int64)
+        total = int(counts.sum())
+        runStart = np.repeat(counts.cumsum() - counts, counts)
+        vertexStart = np.repeat(starts, counts) + (np.arange(total) - runStart) * np.repeat(dims * 8, counts)
+        byteOrder = np.where(np.repeat(bigEndian.astype(bool), counts)[:, None], _SWAPPED_DOUBLE_BYTES,
+                             _DOUBLE_BYTES)
+        self._xIndex = vertexStart[:, None] + byteOrder
+        self._yIndex = self._xIndex + 8
+
+    def __len__(self):
+        return len(self._xIndex)
+
+    def xy(self):
+        """
+        Returns:
+            tuple -- float64 x and y arrays of every vertex in wkb order
+        """
+        return (np.ascontiguousarray(self._buffer[self._xIndex]).view('<f8').ravel(),
+                np.ascontiguousarray(self._buffer[self._yIndex]).view('<f8').ravel())
+
+    def setXY(self, x, y):
+        """ overwrite the x and y of every vertex, in the order returned by xy() """
+        self._buffer[self._xIndex] = np.ascontiguousarray(x, dtype='<f8').view(np.uint8).reshape(-1, 8)
+        self._buffer[self._yIndex] = np.ascontiguousarray(y, dtype='<f8').view(np.uint8).reshape(-1, 8)
+
+    def geometries(self):
+        """
+        Returns:
+            list -- wkb bytes of every geometry, None for geometries that were empty on input
+        """
+        data = self._buffer.tobytes()
+        bounds = self._bounds
+        return [data[bounds[i]:bounds[i + 1]] or None for i in range(len(bounds) - 1)]
@@ -0,0 +1,24 @@
+""" zoom types and settings of the zoom tool
+
+The plugin builds its zoom menu from these at startup, coordinate_zoom and numpy are only imported by the first
+zoom.
+"""
+from collections import namedtuple
+
+ZoomClass = namedtuple('ZoomClass', ['icon', 'name'])
+
+LayerCoord = ZoomClass('icons/zoom_layer.svg', 'Layer Coord')
+ProjectCoord = ZoomClass('icons/zoom_project.svg', 'Project Coord')
+WGS84Coord = ZoomClass('icons/zoom_wgs84.svg', 'WGS84 Coord')
+RasterPixelCord = ZoomClass('icons/zoom_rast_coord.svg', 'RasterPixel Coord')
+RasterPixelIndex = ZoomClass('icons/zoom_rast_idx.svg', 'RasterPixel Index')
+NI_ITE = ZoomClass('icons/zoom_ni_ite.svg', 'NI_ITE Coord')
+NI_ITE_MARS = ZoomClass('icons/zoom_ni_ite_mars.svg', 'NI_ITE_MARS Coord')
+
+AutoDetect = ZoomClass('icons/zoom_auto.svg', 'Auto Detect')
+
+ZoomClasses = [LayerCoord, ProjectCoord, WGS84Coord, RasterPixelCord, RasterPixelIndex, NI_ITE, NI_ITE_MARS,
+               AutoDetect]
+
+AddLayerKey = 'CoordinatePicker/ZoomAddLayer'
+GcjGridKey = 'CoordinatePicker/GcjGrid'